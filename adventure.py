@@ -1,21 +1,34 @@
 """Adventure and story content for the D&D-style game."""
 
-import random
-from dice import DiceRoller
+from dice import DiceRoller, WeightedTable
+from rng import spawn_rng
 from enemies import generate_random_encounter, get_boss_encounter, create_enemy
-from combat import Combat
-from items import Shop, display_inventory, CONSUMABLES
+from combat import Combat, PacedPrinter
+from enemy_ai import ExpectimaxPolicy
+from items import Shop, display_inventory, VICTORY_LOOT, TREASURE_LOOT, roll_loot
+from player_stats import PlayerStats
+
+# Wilderness events: Adventure method to run and its relative odds
+WILDERNESS_EVENTS = WeightedTable([
+    ('combat_encounter', 6),
+    ('treasure_event', 2),
+    ('safe_travel', 2),
+])
 
 class Adventure:
     """Manage the game's adventure and story progression."""
     
-    def __init__(self, player):
+    def __init__(self, player, rng=None):
         self.player = player
+        # Independent random stream for this session
+        self.rng = rng if rng is not None else spawn_rng()
         self.current_location = 'town'
         self.story_progress = 0
         self.encounters_completed = 0
         self.boss_defeated = False
         self.shop = Shop()
+        # How the player's fights have gone, to adapt encounter difficulty
+        self.stats = PlayerStats()
     
     def get_status(self):
         """Get current game status."""
@@ -159,25 +172,26 @@ class Adventure:
         print("\nYou venture into the dangerous wilderness...")
         
         # Random event
-        event = random.randint(1, 10)
-        
-        if event <= 6:
-            # Combat encounter
-            return self.combat_encounter()
-        elif event <= 8:
-            # Find treasure
-            self.find_treasure()
-            return 'town'
-        else:
-            # Safe travel
-            print("\nYou travel safely through the wilderness.")
-            print("Nothing eventful happens.")
-            input("\nPress Enter to return to town...")
-            return 'town'
+        event = WILDERNESS_EVENTS.draw(self.rng)
+        return getattr(self, event)()
+    
+    def treasure_event(self):
+        """Find treasure, then head back to town."""
+        self.find_treasure()
+        return 'town'
+    
+    def safe_travel(self):
+        """Nothing happens on the road."""
+        print("\nYou travel safely through the wilderness.")
+        print("Nothing eventful happens.")
+        input("\nPress Enter to return to town...")
+        return 'town'
     
     def combat_encounter(self):
         """Random combat encounter."""
-        enemies = generate_random_encounter(self.player.level, self.player.get_gear_level())
+        enemies = generate_random_encounter(self.player.level, self.player.get_gear_level(), rng=self.rng,
+                                            char_class=self.player.char_class.name,
+                                            bias=self.stats.difficulty())
         
         print("\n*** ENCOUNTER! ***")
         print("You are attacked by:")
@@ -187,7 +201,7 @@ class Adventure:
         
         input("Press Enter to begin combat...")
         
-        combat = Combat(self.player, enemies)
+        combat = Combat(self.player, enemies, rng=self.rng, sink=self.stats.watch(self.player, PacedPrinter()))
         result = combat.run_combat()
         
         if result == 'victory':
@@ -226,8 +240,8 @@ class Adventure:
             print(f"HP increased to {self.player.max_hp}!")
         
         # Chance to find item
-        if random.randint(1, 100) <= 30:
-            item = CONSUMABLES['health_potion'].to_dict()
+        item = roll_loot(VICTORY_LOOT, self.rng)
+        if item:
             self.player.add_item(item)
             print(f"\nYou found a {item['name']}!")
     
@@ -235,14 +249,13 @@ class Adventure:
         """Find random treasure."""
         print("\n*** TREASURE FOUND! ***")
         
-        gold = random.randint(50, 200)
+        gold = self.rng.randint(50, 200)
         self.player.gold += gold
         print(f"You found {gold} gold!")
         
         # Chance to find item
-        if random.randint(1, 100) <= 50:
-            items = [CONSUMABLES['health_potion'], CONSUMABLES['greater_health_potion']]
-            item = random.choice(items).to_dict()
+        item = roll_loot(TREASURE_LOOT, self.rng)
+        if item:
             self.player.add_item(item)
             print(f"You found a {item['name']}!")
         
@@ -268,7 +281,8 @@ class Adventure:
         
         input("Press Enter to begin combat...")
         
-        combat = Combat(self.player, boss)
+        combat = Combat(self.player, boss, rng=self.rng, sink=self.stats.watch(self.player, PacedPrinter()),
+                        enemy_policy=ExpectimaxPolicy())
         result = combat.run_combat()
         
         if result == 'victory':
@@ -291,8 +305,10 @@ class Adventure:
 class UpsideDownAdventure:
     """Upside Down adventure mode - Serve Vecna and rise to power."""
     
-    def __init__(self, player):
+    def __init__(self, player, rng=None):
         self.player = player
+        # Independent random stream for this session
+        self.rng = rng if rng is not None else spawn_rng()
         self.current_location = 'upside_down'
         self.missions_completed = 0
         self.vecna_power = 0  # Power level: 0-100, reach 100 to surpass Vecna
@@ -301,6 +317,8 @@ class UpsideDownAdventure:
         self.hawkins_resources = 0
         self.boss_defeated = False
         self.shop = Shop()
+        # How the player's fights have gone, to adapt encounter difficulty
+        self.stats = PlayerStats()
     
     def get_status(self):
         """Get current game status."""
@@ -421,7 +439,7 @@ class UpsideDownAdventure:
         
         # Random chance of success based on difficulty
         success_chance = max(30, 90 - (mission['difficulty'] * 15))
-        roll = random.randint(1, 100)
+        roll = self.rng.randint(1, 100)
         
         input("\nPress Enter to attempt the mission...")
         
@@ -447,7 +465,7 @@ class UpsideDownAdventure:
         else:
             print(f"\n✗ FAILED!")
             print("The mission went awry. You barely escaped.")
-            damage = random.randint(10, 30)
+            damage = self.rng.randint(10, 30)
             self.player.take_damage(damage)
             print(f"You took {damage} damage!")
             self.vecna_favor -= 5
@@ -464,11 +482,11 @@ class UpsideDownAdventure:
         print("\nYou train in the dark energies of the Upside Down...")
         
         # Train and gain stats
-        power_gain = random.randint(10, 25)
+        power_gain = self.rng.randint(10, 25)
         self.vecna_power += power_gain
         
         # Heal while training
-        healing = random.randint(20, 40)
+        healing = self.rng.randint(20, 40)
         self.player.heal(healing)
         
         print(f"\nPower gained: +{power_gain}")
@@ -476,7 +494,7 @@ class UpsideDownAdventure:
         print(f"Current Power: {self.vecna_power}/100")
         
         # Chance to gain special item
-        if random.randint(1, 100) <= 30:
+        if self.rng.randint(1, 100) <= 30:
             print("\nYou discovered a dark artifact!")
             self.player.gold += 50
         
@@ -509,7 +527,8 @@ class UpsideDownAdventure:
         print(f"You face {vecna_boss.name}!")
         print(f"{vecna_boss}")
         
-        combat = Combat(self.player, [vecna_boss])
+        combat = Combat(self.player, [vecna_boss], rng=self.rng, sink=self.stats.watch(self.player, PacedPrinter()),
+                        enemy_policy=ExpectimaxPolicy())
         result = combat.run_combat()
         
         if result == 'victory':
@@ -0,0 +1,153 @@
+"""Auto-battle player policy for the D&D-style game."""
+
+import copy
+import time
+
+from combat import Combat, AttackPolicy, ScriptedPolicy, NULL_SINK
+from probability import duel_tables
+from rng import default_rng
+
+# Wall-clock seconds one decision may take
+DECISION_BUDGET = 0.05
+
+# Most rollouts played per candidate action in one decision
+ROLLOUTS = 100
+
+# Rough seconds to solve one duel state (player HP x enemy HP x potions
+# left); a table is only built if this says it fits in what is left of the
+# budget, since one build cannot be interrupted
+STATE_SECONDS = 30e-6
+
+# Worth of escaping a fight, between losing (0) and winning (1)
+FLEE_VALUE = 0.5
+
+# Thresholds (fractions of max HP) tried for drinking a potion and for fleeing
+HEAL_THRESHOLDS = (None, 0.25, 0.5)
+FLEE_THRESHOLDS = (None, 0.15, 0.3)
+
+class AutoBattlePolicy:
+    """
+    Player policy that picks attack, item or flee on its own.
+
+    Against a single enemy it scores every AttackPolicy threshold pair in
+    HEAL_THRESHOLDS x FLEE_THRESHOLDS exactly with probability.duel_tables
+    (win + FLEE_VALUE * flee from the current state, in the fight's actual
+    turn order) and does what the best pair would do now. The tables cover
+    the whole fight and are cached, so later turns only look values up.
+
+    With several enemies (or players) it plays rollouts instead: each
+    candidate action is tried on copies of the fight, which then continue
+    with AttackPolicy, and the action with the best average score wins.
+    Rollouts re-roll initiative and use the default enemy behaviour.
+
+    A table too big for what is left of the budget (STATE_SECONDS per
+    state) is not started; that decision uses rollouts for the remaining
+    time, and the tables built so far carry over, so a big duel turns
+    exact after a few turns. Either way a decision stops when the budget
+    runs out; with nothing evaluated it falls back to the fallback policy
+    (plain attacking).
+    """
+
+    def __init__(self, budget=DECISION_BUDGET, rollouts=ROLLOUTS, flee_value=FLEE_VALUE, rng=None,
+                 fallback=None):
+        self.budget = budget
+        self.rollouts = rollouts
+        self.flee_value = flee_value
+        # Random stream for rollouts, kept apart from the fight's own rolls
+        self.rng = rng
+        self.fallback = fallback or AttackPolicy()
+        # Slowest seconds per state seen building a table, and the tables
+        # (duel_tables arguments) this policy has built
+        self.state_seconds = STATE_SECONDS
+        self._solved = set()
+
+    def choose_action(self, combat):
+        deadline = time.perf_counter() + self.budget
+        enemies = combat.living_enemies()
+        choice = None
+        if len(enemies) == 1 and len(getattr(combat, 'players', ())) <= 1:
+            choice = self._exact_choice(combat, enemies[0], deadline)
+        if choice is None:
+            choice = self._rollout_choice(combat, deadline)
+        return choice or self.fallback.choose_action(combat)
+
+    def choose_target(self, combat, targets):
+        return self.fallback.choose_target(combat, targets)
+
+    def choose_item(self, combat, items):
+        return self.fallback.choose_item(combat, items)
+
+    def _exact_choice(self, combat, enemy, deadline):
+        """Action of the best-scoring threshold policy, or None if the tables don't fit in time."""
+        player = combat.player
+        potions = tuple(sorted((item['healing'] for item in combat.healing_items()), reverse=True))
+        player_first = not combat.turn_order or combat.turn_order[0][0] is player
+        stats = (player.max_hp, player.get_attack_bonus(), player.armor_class, str(player.get_attack_damage()),
+                 enemy.max_hp, enemy.get_attack_bonus(), enemy.armor_class, str(enemy.get_attack_damage()))
+
+        best = None
+        for heal_below in HEAL_THRESHOLDS:
+            # Without a heal threshold the potions never change the fight
+            held = potions if heal_below is not None else ()
+            for flee_below in FLEE_THRESHOLDS:
+                args = (*stats, held, heal_below, flee_below, player_first)
+                solved = args in self._solved
+                states = (len(held) + 1) * player.max_hp * enemy.max_hp
+                start = time.perf_counter()
+                if not solved and start + states * self.state_seconds > deadline:
+                    return None
+                round_start, mid_round = duel_tables(*args)
+                if not solved:
+                    # Only ever raised: a table cached by another policy comes back instantly
+                    self.state_seconds = max(self.state_seconds, (time.perf_counter() - start) / states)
+                    self._solved.add(args)
+                # The player's turn starts a round, or follows the enemy's
+                table = round_start if player_first else mid_round
+                win, flee, _ = table[len(held)][player.current_hp][enemy.current_hp]
+                score = win + self.flee_value * flee
+                if best is None or score > best[0]:
+                    best = (score, heal_below, flee_below)
+
+        return AttackPolicy(best[1], best[2]).choose_action(combat)
+
+    def _rollout_choice(self, combat, deadline):
+        """Action with the best average rollout score, or None if out of time."""
+        actions = ['attack', 'flee']
+        if combat.healing_items():
+            actions.insert(1, 'item')
+        scores = {action: [0.0, 0] for action in actions}
+        rng = self.rng or default_rng()
+        outcome_value = {'victory': 1.0, 'fled': self.flee_value, 'defeat': 0.0}
+
+        while time.perf_counter() < deadline:
+            for action in actions:
+                if scores[action][1] >= self.rollouts or time.perf_counter() > deadline:
+                    continue
+                rollout = self._rollout_combat(combat, action, rng)
+                scores[action][0] += outcome_value[rollout.run_combat()]
+                scores[action][1] += 1
+            if all(count >= self.rollouts for _, count in scores.values()):
+                break
+
+        played = [(total / count, action) for action, (total, count) in scores.items() if count]
+        if len(played) < len(actions):
+            return None
+        return max(played)[1]
+
+    def _rollout_combat(self, combat, action, rng):
+        """
+        A copy of the fight that opens with action, then plays on with the
+        fallback. Status effects are re-applied with the rounds they have
+        left, since the copies' effect timers start empty.
+        """
+        player, enemies = copy.deepcopy((combat.player, combat.living_enemies()))
+        rollout = Combat(player, enemies, rng=rng, policy=ScriptedPolicy([action], self.fallback),
+                         sink=NULL_SINK, log_size=0)
+        for combatant in [player] + enemies:
+            effects = list(combatant.status_effects.values())
+            combatant.status_effects.clear()
+            for effect in effects:
+                rounds = None if effect.ends is None else effect.ends - combat.round_number
+                if rounds is None or rounds > 0:
+                    rollout.add_effect(combatant, effect.name, rounds, effect.potency)
+        return rollout
@@ -0,0 +1,247 @@
+"""
+Lockstep batch resolver for many independent 1-vs-1 fights.
+
+Combat resolves one fight at a time through Character and Enemy objects.
+FightBatch holds N fights as parallel arrays (HP, AC, attack bonus, damage
+dice) and resolves a round of every unfinished fight at once with
+vectorized d20 and damage draws. The rules match Combat with AttackPolicy:
+initiative ties go to the player, a natural 20 hits and doubles the damage
+dice, a natural 1 misses, and damage never goes below 0. Status effects
+(poison, regeneration, ...) and traits (Lucky, Sneak Attack, ...) are not
+modelled.
+"""
+
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batches fall back to a plain loop
+    np = None
+
+from dice import ability_score_table
+from rng import default_rng
+
+# Outcome arrays of FightBatch.resolve(); won is True where the player won
+BatchResult = namedtuple('BatchResult', ['won', 'rounds', 'player_hp'])
+
+# What FightBatch stores for each side of a fight
+SIDE_FIELDS = ('hp', 'ac', 'attack', 'initiative', 'dice', 'die_size', 'damage_bonus')
+
+# Per-fight columns, in the order FightBatch stores them
+COLUMNS = tuple(f'{side}_{field}' for side in ('player', 'enemy') for field in SIDE_FIELDS)
+
+# Rows of the per-side stat matrix used by the NumPy resolver
+STAT_ROWS = ('ac', 'attack', 'dice', 'die_size', 'damage_bonus')
+AC, ATTACK, DICE, DIE_SIZE, DAMAGE_BONUS = range(len(STAT_ROWS))
+
+def _dice_parameters(damage_dice):
+    """(num_dice, die_size, modifier) of a plain 'NdS+M' expression."""
+    if not damage_dice._simple:
+        raise ValueError(f"Batch combat needs plain NdS+M damage dice, got {damage_dice!r}")
+    _, num_dice, die_size, _, _ = damage_dice.groups[0]
+    return num_dice, die_size, damage_dice.modifier
+
+def _combatant_row(combatant):
+    """A Character's or Enemy's values for SIDE_FIELDS."""
+    num_dice, die_size, bonus = _dice_parameters(combatant.get_attack_damage())
+    return (combatant.current_hp, combatant.armor_class, combatant.get_attack_bonus(),
+            combatant.get_modifier('dexterity'), num_dice, die_size, bonus)
+
+class FightBatch:
+    """
+    N independent player-vs-enemy fights stored column by column.
+
+    Build one with from_fights() from Character/Enemy pairs (they are only
+    read, never modified) or from_columns() with one sequence per entry of
+    COLUMNS. The damage bonus is the expression's flat modifier; the
+    attacker's attack bonus is added on top, as in Combat.
+    """
+
+    def __init__(self, columns):
+        lengths = {len(columns[name]) for name in COLUMNS}
+        if len(lengths) != 1:
+            raise ValueError("Every column needs one entry per fight")
+        self.size = lengths.pop()
+        self.columns = columns
+
+    @classmethod
+    def from_columns(cls, **columns):
+        missing = [name for name in COLUMNS if name not in columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        return cls({name: columns[name] for name in COLUMNS})
+
+    @classmethod
+    def from_fights(cls, fights):
+        """Build a batch from (player, enemy) pairs."""
+        rows = {}
+        fight_rows = []
+        for pair in fights:
+            for combatant in pair:
+                if id(combatant) not in rows:
+                    rows[id(combatant)] = _combatant_row(combatant)
+            fight_rows.append(rows[id(pair[0])] + rows[id(pair[1])])
+        if not fight_rows:
+            return cls({name: [] for name in COLUMNS})
+        return cls(dict(zip(COLUMNS, map(list, zip(*fight_rows)))))
+
+    def __len__(self):
+        return self.size
+
+    def resolve(self, rng=None):
+        """
+        Fight every battle to the end.
+        Returns a BatchResult of NumPy arrays (lists without NumPy).
+        """
+        rng = rng or default_rng()
+        generator = rng.numpy_generator() if np is not None else None
+        if generator is not None:
+            return self._resolve_numpy(generator)
+        return self._resolve_python(rng)
+
+    def _resolve_numpy(self, generator):
+        n = self.size
+        col = {name: np.asarray(self.columns[name], dtype=np.int64) for name in COLUMNS}
+        player = np.stack([col[f'player_{key}'] for key in STAT_ROWS])
+        enemy = np.stack([col[f'enemy_{key}'] for key in STAT_ROWS])
+
+        # Reorder each fight by initiative so the first actor is always side 0
+        player_roll = generator.integers(1, 21, n) + col['player_initiative']
+        enemy_roll = generator.integers(1, 21, n) + col['enemy_initiative']
+        player_first = player_roll >= enemy_roll
+        first = np.where(player_first, player, enemy)
+        second = np.where(player_first, enemy, player)
+        hp = np.stack([np.where(player_first, col['player_hp'], col['enemy_hp']),
+                       np.where(player_first, col['enemy_hp'], col['player_hp'])])
+
+        final_hp = np.zeros((2, n), dtype=np.int64)
+        rounds = np.zeros(n, dtype=np.int64)
+        index = np.arange(n)
+
+        round_number = 0
+        while len(index):
+            round_number += 1
+            hp[1] = self._attack(generator, first, second[AC], hp[1])
+            standing = hp[1] > 0
+            if standing.any():
+                hp[0, standing] = self._attack(generator, second[:, standing], first[AC, standing], hp[0, standing])
+
+            done = (hp[0] <= 0) | ~standing
+            if done.any():
+                finished = index[done]
+                final_hp[:, finished] = hp[:, done]
+                rounds[finished] = round_number
+                keep = ~done
+                index = index[keep]
+                hp = hp[:, keep]
+                first = first[:, keep]
+                second = second[:, keep]
+
+        player_hp = np.where(player_first, final_hp[0], final_hp[1])
+        return BatchResult(player_hp > 0, rounds, player_hp)
+
+    @staticmethod
+    def _attack(generator, attackers, armor_class, hp):
+        """One vectorized attack per fight (rows of STAT_ROWS); returns the defenders' new HP."""
+        count = len(hp)
+        attack = attackers[ATTACK]
+        d20 = generator.integers(1, 21, count)
+        crit = d20 == 20
+        hit = crit | ((d20 != 1) & (d20 + attack >= armor_class))
+
+        # Critical hits roll the damage expression twice
+        copies = 1 + crit
+        num_dice = attackers[DICE] * copies
+        width = int(num_dice.max())
+        # Scaling uniforms is much faster than integers() with a per-row bound
+        faces = (generator.random((count, width)) * attackers[DIE_SIZE][:, None]).astype(np.int64) + 1
+        if (num_dice < width).any():
+            faces = np.where(np.arange(width) < num_dice[:, None], faces, 0)
+        damage = faces.sum(axis=1) + attackers[DAMAGE_BONUS] * copies + attack
+        damage = np.where(hit, np.maximum(damage, 0), 0)
+        return np.maximum(hp - damage, 0)
+
+    def _resolve_python(self, rng):
+        c = self.columns
+        won, rounds, final_hp = [], [], []
+        for i in range(self.size):
+            hp = [c['player_hp'][i], c['enemy_hp'][i]]
+            sides = [
+                (c[f'{side}_ac'][i], c[f'{side}_attack'][i], c[f'{side}_dice'][i],
+                 c[f'{side}_die_size'][i], c[f'{side}_damage_bonus'][i])
+                for side in ('player', 'enemy')
+            ]
+            player_roll = rng.randint(1, 20) + c['player_initiative'][i]
+            enemy_roll = rng.randint(1, 20) + c['enemy_initiative'][i]
+            order = (0, 1) if player_roll >= enemy_roll else (1, 0)
+
+            round_number = 0
+            while hp[0] > 0 and hp[1] > 0:
+                round_number += 1
+                for attacker in order:
+                    if hp[0] <= 0 or hp[1] <= 0:
+                        break
+                    _, attack, num_dice, die_size, bonus = sides[attacker]
+                    defender = 1 - attacker
+                    d20 = rng.randint(1, 20)
+                    if d20 == 20:
+                        damage = sum(rng.randint(1, die_size) for _ in range(2 * num_dice)) + 2 * bonus + attack
+                    elif d20 != 1 and d20 + attack >= sides[defender][0]:
+                        damage = sum(rng.randint(1, die_size) for _ in range(num_dice)) + bonus + attack
+                    else:
+                        continue
+                    hp[defender] = max(0, hp[defender] - max(0, damage))
+
+            won.append(hp[0] > 0)
+            rounds.append(round_number)
+            final_hp.append(hp[0])
+        return BatchResult(won, rounds, final_hp)
+
+def batch_scenario(scenario, fights, rng=None):
+    """
+    Resolve fights of a simulator Scenario as one batch; returns ScenarioStats.
+    Each fight gets its own rolled ability scores, as in simulator.run_chunk.
+    """
+    # Imported here: simulator imports this module for its batch engine
+    from enemies import create_enemy
+    from simulator import ScenarioStats, build_player
+
+    rng = rng or default_rng()
+    enemy_row = _combatant_row(create_enemy(scenario.enemy, scenario.level))
+
+    # Only STR, DEX and CON reach combat: roll those and build one
+    # character per distinct triple instead of one per fight
+    scores = ability_score_table().draw_many(3 * fights, rng)
+    if np is not None:
+        scores = np.array(scores, dtype=np.int64).reshape(fights, 3)
+        keys, inverse = np.unique((scores[:, 0] * 19 + scores[:, 1]) * 19 + scores[:, 2], return_inverse=True)
+        rows = np.array([_combatant_row(build_player(scenario, [key // 361, key // 19 % 19, key % 19, 10, 10, 10]))
+                         for key in keys.tolist()], dtype=np.int64)
+        player_columns = rows[inverse].T
+        enemy_columns = [np.full(fights, value, dtype=np.int64) for value in enemy_row]
+    else:
+        rows = {}
+        player_rows = []
+        for i in range(0, 3 * fights, 3):
+            triple = tuple(scores[i:i + 3])
+            if triple not in rows:
+                rows[triple] = _combatant_row(build_player(scenario, list(triple) + [10, 10, 10]))
+            player_rows.append(rows[triple])
+        player_columns = list(map(list, zip(*player_rows))) or [[] for _ in SIDE_FIELDS]
+        enemy_columns = [[value] * fights for value in enemy_row]
+
+    result = FightBatch(dict(zip(COLUMNS, list(player_columns) + enemy_columns))).resolve(rng)
+
+    stats = ScenarioStats()
+    if np is not None and isinstance(result.won, np.ndarray):
+        stats.fights = fights
+        stats.wins = int(result.won.sum())
+        stats.losses = fights - stats.wins
+        stats.rounds = int(result.rounds.sum())
+        stats.rounds_squared = int((result.rounds * result.rounds).sum())
+        stats.hp = int(result.player_hp.sum())
+        stats.hp_squared = int((result.player_hp * result.player_hp).sum())
+    else:
+        for won, rounds, hp in zip(*result):
+            stats.add('victory' if won else 'defeat', rounds, hp)
+    return stats
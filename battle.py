@@ -0,0 +1,241 @@
+"""Large multi-combatant battles for the D&D-style game."""
+
+import heapq
+
+from combat import Combat, COMBAT_LOG_SIZE
+
+class TurnScheduler:
+    """
+    Priority queue of pending turns ordered by (round, highest initiative,
+    order added). Changing an initiative or removing a combatant leaves the
+    old heap entry behind; stale entries are skipped when they surface, so
+    every operation is O(log n).
+    """
+
+    def __init__(self):
+        self._heap = []
+        # key -> the live heap entry for that key
+        self._entries = {}
+        # key -> position among equal initiatives (first added goes first)
+        self._order = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def add(self, key, initiative, round_number=1):
+        """Schedule key's turn in round_number."""
+        order = self._order.setdefault(key, len(self._order))
+        entry = (round_number, -initiative, order, key)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+
+    def set_initiative(self, key, initiative):
+        """Move key's pending turn to its new place in the order."""
+        round_number = self._entries[key][0]
+        self.add(key, initiative, round_number)
+
+    def remove(self, key):
+        """Cancel key's pending turn."""
+        self._entries.pop(key, None)
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap and self._entries.get(heap[0][3]) is not heap[0]:
+            heapq.heappop(heap)
+
+    def next_round(self):
+        """Round of the next pending turn, or None when nothing is scheduled."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop(self):
+        """Take the next turn; returns (round, key, initiative)."""
+        self._drop_stale()
+        round_number, negated, _, key = heapq.heappop(self._heap)
+        del self._entries[key]
+        return round_number, key, -negated
+
+class Roster:
+    """Combatants still in the fight on one side: O(1) removal and random pick."""
+
+    def __init__(self, members):
+        self.members = [m for m in members if m.is_alive()]
+        self._index = {id(m): i for i, m in enumerate(self.members)}
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, member):
+        return id(member) in self._index
+
+    def remove(self, member):
+        """Drop member (swapping the last member into its slot)."""
+        i = self._index.pop(id(member), None)
+        if i is None:
+            return
+        last = self.members.pop()
+        if last is not member:
+            self.members[i] = last
+            self._index[id(last)] = i
+
+    def choice(self, rng):
+        return self.members[rng.randrange(len(self.members))]
+
+class Battle(Combat):
+    """
+    A fight between any number of player characters and enemies.
+
+    Turns come from a TurnScheduler instead of scanning the whole turn
+    order, and each side keeps a Roster of who is still standing, so a
+    turn costs O(log n) however many combatants there are (weakest_enemy()
+    is a heap too, so AttackPolicy stays fast). Each player's
+    choices come from the policy (the same one for the whole party); each
+    enemy attacks a random standing player. A player who flees leaves the
+    battle; the battle is 'fled' if everyone left standing ran away.
+    """
+
+    def __init__(self, players, enemies, rng=None, policy=None, sink=None, log_size=COMBAT_LOG_SIZE,
+                 enemy_policy=None):
+        players = list(players)
+        if not players:
+            raise ValueError("A battle needs at least one player")
+        super().__init__(players[0], list(enemies), rng, policy, sink, log_size, enemy_policy)
+        self.players = players
+        self.combatants = players + self.enemies
+        self.scheduler = TurnScheduler()
+        self._keys = {id(c): key for key, c in enumerate(self.combatants)}
+        self.standing_players = Roster(players)
+        self.standing_enemies = Roster(self.enemies)
+        self.fled = []
+        # (HP, key) of every standing enemy, plus each key's live entry
+        self._enemy_entries = {self._keys[id(enemy)]: (enemy.current_hp, self._keys[id(enemy)])
+                               for enemy in self.standing_enemies.members}
+        self._enemy_heap = list(self._enemy_entries.values())
+        heapq.heapify(self._enemy_heap)
+
+    def start_combat(self):
+        """Roll initiative for everyone and schedule round 1."""
+        self.log('begin')
+        order = []
+        for key, combatant in enumerate(self.combatants):
+            initiative = self.roll_initiative(combatant)
+            self.scheduler.add(key, initiative)
+            order.append((combatant, initiative, 'player' if key < len(self.players) else f'enemy_{key - len(self.players)}'))
+        order.sort(key=lambda x: x[1], reverse=True)
+        self.turn_order = order
+        self.log('initiative', rolls=tuple((combatant.name, initiative) for combatant, initiative, _ in order))
+        self.apply_innate_effects(self.combatants)
+
+    def set_initiative(self, combatant, initiative):
+        """Change a combatant's initiative; it takes effect from their next turn."""
+        key = self._keys[id(combatant)]
+        if key in self.scheduler:
+            self.scheduler.set_initiative(key, initiative)
+
+    def rounds(self):
+        """Resolve the battle round by round, yielding a RoundReport after each."""
+        self.start_combat()
+
+        while self.standing_players and self.standing_enemies:
+            self.start_round()
+            self.play_round()
+            if not self.standing_players or not self.standing_enemies:
+                self.finish()
+            yield self._report()
+            if self.result:
+                return
+
+        if not self.result:
+            self.finish()
+
+    def play_round(self):
+        """Take turns from the scheduler until the round (or the battle) is over."""
+        scheduler = self.scheduler
+        while self.standing_players and self.standing_enemies and scheduler.next_round() == self.round_number:
+            round_number, key, initiative = scheduler.pop()
+            combatant = self.combatants[key]
+            scheduler.add(key, initiative, round_number + 1)
+
+            if key < len(self.players):
+                self.player = combatant
+                if self.player_turn() == 'flee':
+                    self.fled.append(combatant)
+                    self.standing_players.remove(combatant)
+                    scheduler.remove(key)
+            else:
+                self.player = self.standing_players.choice(self.rng)
+                self.enemy_turn(combatant)
+
+            self.sink.end_turn()
+        return None
+
+    def finish(self):
+        """Record and announce the outcome once one side is out of the fight."""
+        if not self.standing_enemies:
+            self.result = 'victory'
+        elif self.fled:
+            self.result = 'fled'
+        else:
+            self.result = 'defeat'
+        self.effects.clear()
+        if self.result != 'fled':
+            self.log(self.result)
+        return self.result
+
+    def player_attack(self, target=None):
+        if target is None:
+            if len(self.standing_enemies) == 1:
+                target = self.standing_enemies.members[0]
+            else:
+                target = self.policy.choose_target(self, self.standing_enemies.members)
+        result = super().player_attack(target)
+        self.hp_changed(target)
+        return result
+
+    def hp_changed(self, combatant):
+        """Tell the battle a combatant's HP changed outside an attack."""
+        key = self._keys[id(combatant)]
+        if key >= len(self.players) and combatant.is_alive():
+            entry = self._enemy_entries[key] = (combatant.current_hp, key)
+            heapq.heappush(self._enemy_heap, entry)
+
+    def weakest_enemy(self):
+        heap = self._enemy_heap
+        entries = self._enemy_entries
+        while True:
+            entry = heap[0]
+            hp, key = entry
+            enemy = self.combatants[key]
+            if entries.get(key) is not entry:
+                heapq.heappop(heap)
+            elif not enemy.is_alive():
+                heapq.heappop(heap)
+                del entries[key]
+            elif enemy.current_hp != hp:
+                # HP changed without hp_changed(); re-file it
+                entries[key] = (enemy.current_hp, key)
+                heapq.heapreplace(heap, entries[key])
+            else:
+                return enemy
+
+    def defeated(self, combatant):
+        super().defeated(combatant)
+        key = self._keys[id(combatant)]
+        self.scheduler.remove(key)
+        if key < len(self.players):
+            self.standing_players.remove(combatant)
+        else:
+            self.standing_enemies.remove(combatant)
+
+    def enemies_alive(self):
+        return len(self.standing_enemies) > 0
+
+    def living_enemies(self):
+        return self.standing_enemies.members
+
+    def _report(self):
+        report = super()._report()
+        return report._replace(player_hp=[p.current_hp for p in self.players])
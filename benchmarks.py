@@ -0,0 +1,98 @@
+"""
+Throughput benchmarks for the D&D-style game's hot paths.
+Run with: python3 benchmarks.py
+"""
+
+import secrets
+import time
+
+from batch_combat import batch_scenario
+from character import generate_characters
+from combat import Combat, AttackPolicy, NULL_SINK
+from dice import DiceRoller
+from enemies import create_enemy
+from rng import RNGStream, SecureRNG
+from simulator import Scenario, run_chunk
+from telemetry import TELEMETRY
+
+def _rate(func, count):
+    """Run func count times and return calls per second."""
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return count / (time.perf_counter() - start)
+
+def compare_dice_backends(count=200000):
+    """
+    Compare single-die throughput of the default Mersenne Twister stream,
+    the buffered secure stream and a naive secrets.randbelow per die.
+    Returns {backend: rolls per second}.
+    """
+    default_rng = RNGStream()
+    secure_rng = SecureRNG()
+    return {
+        'default': _rate(lambda: default_rng.randint(1, 20), count),
+        'secure (buffered)': _rate(lambda: secure_rng.randint(1, 20), count),
+        'secrets.randbelow': _rate(lambda: secrets.randbelow(20) + 1, count),
+        'default bulk': count / _time_call(lambda: DiceRoller.d20_many(count, default_rng)),
+        'secure bulk': count / _time_call(lambda: DiceRoller.d20_many(count, secure_rng)),
+    }
+
+def _time_call(func):
+    """Return the seconds func takes to run once."""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+def telemetry_overhead(count=200000):
+    """Compare roll_d20 throughput with roll telemetry on and off."""
+    rng = RNGStream()
+    enabled = TELEMETRY.enabled
+    try:
+        TELEMETRY.enabled = True
+        with_telemetry = _rate(lambda: DiceRoller.roll_d20(rng), count)
+        TELEMETRY.enabled = False
+        without_telemetry = _rate(lambda: DiceRoller.roll_d20(rng), count)
+    finally:
+        TELEMETRY.enabled = enabled
+    return {'telemetry on': with_telemetry, 'telemetry off': without_telemetry}
+
+def character_generation(count=20000):
+    """Compare bulk character generation with one-at-a-time scalar rolling."""
+    stats = {}
+    generate_characters(count, stats=stats)
+    scalar = _rate(DiceRoller.roll_ability_scores, count)
+    return {'generate_characters': stats['per_second'], 'ability rolls only (scalar)': scalar}
+
+def headless_combat(count=2000):
+    """Resolve fresh warrior-vs-two-enemy fights with no I/O; returns fights per second."""
+    players = generate_characters(count, mix=[('human', 'warrior')])
+    rng = RNGStream()
+
+    def fight(player):
+        enemies = [create_enemy('demobat', level=1), create_enemy('demodog', level=1)]
+        return Combat(player, enemies, rng=rng, policy=AttackPolicy(), sink=NULL_SINK).run_combat()
+
+    players_iter = iter(players)
+    return {'headless fights': _rate(lambda: fight(next(players_iter)), count)}
+
+def batch_combat(count=100000):
+    """Compare fights per second of the Combat engine and the FightBatch resolver."""
+    scenario = Scenario('human', 'warrior', 'demobat', 1)
+    scalar_count = max(1, count // 50)
+    return {
+        'Combat (one at a time)': scalar_count / _time_call(lambda: run_chunk(scenario, 1, scalar_count)),
+        'FightBatch': count / _time_call(lambda: batch_scenario(scenario, count, RNGStream(1))),
+    }
+
+def _print_rates(title, rates):
+    print(f"\n{title}")
+    for name, rate in rates.items():
+        print(f"  {name:<30} {rate:>14,.0f} /s")
+
+if __name__ == '__main__':
+    _print_rates("Dice backends (d20 rolls)", compare_dice_backends())
+    _print_rates("Roll telemetry (d20 rolls)", telemetry_overhead())
+    _print_rates("Character generation (characters)", character_generation())
+    _print_rates("Combat (fights)", headless_combat())
+    _print_rates("Balance sweeps (fights)", batch_combat())
@@ -0,0 +1,199 @@
+"""
+Offline difficulty calibration for generate_random_encounter.
+
+For every (class, player level, gear level) cell, simulates candidate
+encounters - count x enemy type at some enemy level - and keeps the ones
+a player wins about TARGET_WIN_RATE of the time. The result is written as
+a small JSON lookup table that enemies.generate_random_encounter reads.
+Run with: python3 calibrate.py [fights] [workers] [--target P] [--levels 1-10]
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from character import RACES, CLASSES, valid_combinations
+from combat import Combat, AttackPolicy, NULL_SINK
+from dice import DiceRoller
+from enemies import ENCOUNTER_TABLE_PATH, TABLE_VERSION, create_enemy
+from items import WEAPONS, ARMOR
+from rng import RNGStream, derive_seed
+from simulator import Scenario, build_player, init_worker
+
+# Win probability each encounter is tuned to
+TARGET_WIN_RATE = 0.8
+
+# Encounters this close to the target are all kept, for variety
+TOLERANCE = 0.1
+
+# Fights simulated per candidate encounter
+FIGHTS = 60
+
+# Player and gear levels calibrated by default
+DEFAULT_LEVELS = tuple(range(1, 11))
+GEAR_LEVELS = (0, 1, 2, 3, 4, 5)
+
+# Enemies random encounters may use (bosses and story enemies stay out)
+ENCOUNTER_ENEMIES = ('demobat', 'vine', 'flayed', 'soldier', 'demodog', 'demogorgon', 'mindflayer',
+                     'shadow_monster')
+
+# Most enemies in one encounter
+MAX_ENEMIES = 3
+
+# Enemies may be this many levels above the player
+LEVEL_MARGIN = 3
+
+# (weapon, armor) simulated at each gear level: None for the weapon means
+# unarmed at 0 and the class's starting weapon at 1; shop items above that
+# are tagged with the gear level, as get_gear_level() would read them
+GEAR_LOADOUTS = {
+    0: (None, None),
+    1: (None, None),
+    2: ('longsword', 'leather'),
+    3: ('warhammer', 'chainmail'),
+    4: ('greatsword', 'chainmail'),
+    5: ('greatsword', 'plate'),
+}
+
+def build_calibration_player(race, char_class, level, gear, scores):
+    """A levelled character of the given race and class equipped for gear level gear."""
+    player = build_player(Scenario(race, char_class, None, level), scores)
+    weapon, armor = GEAR_LOADOUTS[gear]
+    if gear == 0:
+        player.equipped_weapon = None
+    if weapon is not None:
+        player.equipped_weapon = dict(WEAPONS[weapon].to_dict(), level=gear)
+    if armor is not None:
+        player.equipped_armor = dict(ARMOR[armor].to_dict(), level=gear)
+        player.armor_class += player.equipped_armor['ac_bonus']
+    return player
+
+def calibration_races(char_class):
+    """
+    Races a class is calibrated over: its ordinary races, if it has any.
+    Bonus-HP hero races (Vecna above all) would make every fight look easy.
+    """
+    races = [race for race, key in valid_combinations() if key == char_class]
+    return [race for race in races if not getattr(RACES[race], 'bonus_hp', 0)] or races
+
+def encounter_win_rate(char_class, level, gear, mix, fights, seed):
+    """Fraction of fights won against mix = (enemy, count, enemy level)."""
+    enemy, count, enemy_level = mix
+    races = calibration_races(char_class)
+    rng = RNGStream(seed)
+    wins = 0
+    for _ in range(fights):
+        scores = DiceRoller.roll_ability_scores(rng)
+        player = build_calibration_player(rng.choice(races), char_class, level, gear, scores)
+        enemies = [create_enemy(enemy, enemy_level) for _ in range(count)]
+        combat = Combat(player, enemies, rng=rng, policy=AttackPolicy(), sink=NULL_SINK, log_size=0)
+        wins += combat.run_combat() == 'victory'
+    return wins / fights
+
+def calibrate_cell(char_class, level, gear, target=TARGET_WIN_RATE, fights=FIGHTS, seed=0):
+    """
+    Encounters for one cell as [enemy, count, enemy level, win %] lists,
+    closest to target first.
+
+    Win rates fall as the enemy level rises, so for each enemy and count a
+    binary search finds the levels either side of the target; the closer
+    one is the candidate. Every candidate within TOLERANCE is kept (the
+    closest one if none are). Each encounter has its own seed, so the
+    result does not depend on the order of the search.
+    """
+    rates = {}
+
+    def rate(mix):
+        if mix not in rates:
+            rates[mix] = encounter_win_rate(char_class, level, gear, mix, fights, derive_seed(seed, mix))
+        return rates[mix]
+
+    candidates = []
+    for enemy in ENCOUNTER_ENEMIES:
+        for count in range(1, min(MAX_ENEMIES, level + 1) + 1):
+            # Highest enemy level still won at least target of the time
+            low, high = 1, level + LEVEL_MARGIN
+            if rate((enemy, count, low)) < target:
+                high = low
+            while low < high:
+                middle = (low + high + 1) // 2
+                if rate((enemy, count, middle)) >= target:
+                    low = middle
+                else:
+                    high = middle - 1
+            options = [(enemy, count, low)]
+            if low < level + LEVEL_MARGIN:
+                options.append((enemy, count, low + 1))
+            candidates.append(min(options, key=lambda mix: abs(rate(mix) - target)))
+
+    candidates.sort(key=lambda mix: (abs(rates[mix] - target), mix))
+    kept = [mix for mix in candidates if abs(rates[mix] - target) <= TOLERANCE] or candidates[:1]
+    return [[enemy, count, enemy_level, round(rates[(enemy, count, enemy_level)] * 100)]
+            for enemy, count, enemy_level in kept]
+
+def _calibrate_cell(args):
+    return args[:3], calibrate_cell(*args)
+
+def _calibrate_cells(cells, workers):
+    """Yield (cell, encounters) in order, across a process pool unless workers=0."""
+    if workers == 0:
+        yield from map(_calibrate_cell, cells)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        yield from pool.map(_calibrate_cell, cells)
+
+def calibrate(classes=None, levels=DEFAULT_LEVELS, gear_levels=GEAR_LEVELS, target=TARGET_WIN_RATE,
+              fights=FIGHTS, seed=0, workers=None, progress=None):
+    """
+    Calibrate every cell and return the table as a JSON-ready dict.
+    workers=0 runs in this process; progress gets (cells done, cells total).
+    """
+    classes = list(classes or CLASSES)
+    cells = [(char_class, level, gear, target, fights, derive_seed(seed, (char_class, level, gear)))
+             for char_class in classes for level in levels for gear in gear_levels]
+    results = {}
+    for done, (cell, mixes) in enumerate(_calibrate_cells(cells, workers), 1):
+        results[cell] = mixes
+        if progress:
+            progress(done, len(cells))
+
+    return {
+        'version': TABLE_VERSION,
+        'target': target,
+        'fights': fights,
+        'levels': [min(levels), max(levels)],
+        'gear': [min(gear_levels), max(gear_levels)],
+        # Class name -> [level][gear] -> encounters
+        'classes': {CLASSES[char_class].name: [[results[(char_class, level, gear)] for gear in gear_levels]
+                                               for level in levels]
+                    for char_class in classes},
+    }
+
+def write_table(table, path=ENCOUNTER_TABLE_PATH):
+    """Save a calibrate() table, replacing any previous file in one step."""
+    with open(path + '.tmp', 'w') as f:
+        json.dump(table, f, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+def _range(text):
+    low, _, high = text.partition('-')
+    return tuple(range(int(low), int(high or low) + 1))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Calibrate random encounter difficulty")
+    parser.add_argument('fights', type=int, nargs='?', default=FIGHTS, help="fights per candidate encounter")
+    parser.add_argument('workers', type=int, nargs='?', default=None)
+    parser.add_argument('--target', type=float, default=TARGET_WIN_RATE, help="win probability to aim for")
+    parser.add_argument('--levels', type=_range, default=DEFAULT_LEVELS, help="player levels, e.g. 1-10")
+    parser.add_argument('--gear', type=_range, default=GEAR_LEVELS, help="gear levels, e.g. 0-5")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=ENCOUNTER_TABLE_PATH)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    table = calibrate(levels=args.levels, gear_levels=args.gear, target=args.target, fights=args.fights,
+                      seed=args.seed, workers=args.workers,
+                      progress=lambda done, total: print(f"\r{done}/{total} cells", end='', flush=True))
+    write_table(table, args.output)
+    print(f"\nWrote {args.output} in {time.perf_counter() - start:.1f}s")
@@ -1,21 +1,34 @@
 """Character classes and races for the D&D-style game."""
 
+import time
+
+from dice import DiceRoller, WeightedTable, compile_dice
+from traits import compile_hooks
+
+UNARMED_DAMAGE = compile_dice('1d4')
+
 class Race:
     """Base class for character races."""
     
-    def __init__(self, name, stat_bonuses, special_ability):
+    def __init__(self, name, stat_bonuses, special_ability, combat_effects=(), traits=()):
         self.name = name
         self.stat_bonuses = stat_bonuses
         self.special_ability = special_ability
+        # (effect, rounds, potency) status effects started in every fight
+        self.combat_effects = combat_effects
+        # Keys into traits.TRAITS
+        self.traits = traits
 
 class CharacterClass:
     """Base class for character classes."""
     
-    def __init__(self, name, hit_die, primary_stats, starting_equipment):
+    def __init__(self, name, hit_die, primary_stats, starting_equipment, traits=()):
         self.name = name
         self.hit_die = hit_die
         self.primary_stats = primary_stats
         self.starting_equipment = starting_equipment
+        # Keys into traits.TRAITS
+        self.traits = traits
 
 class Character:
     """Player character with stats, inventory, and abilities."""
@@ -52,9 +65,63 @@ class Character:
         # Inventory
         self.inventory = char_class.starting_equipment.copy()
         self.gold = 100
-        self.equipped_weapon = None
-        self.equipped_armor = None
+        self._equipped_weapon = None
+        self._equipped_armor = None
+        self.compile_traits()
+        
+        # Status effects in force (name -> StatusEffect); only set during a fight
+        self.status_effects = {}
         
+    def compile_traits(self):
+        """
+        Rebuild self.hooks from the race's, class's and equipped items'
+        traits. Runs at construction and whenever equipment changes.
+        """
+        keys = list(self.race.traits) + list(self.char_class.traits)
+        for item in (self._equipped_weapon, self._equipped_armor):
+            if item:
+                keys.extend(item.get('traits', ()))
+        self.hooks = compile_hooks(keys)
+    
+    @property
+    def equipped_weapon(self):
+        return self._equipped_weapon
+    
+    @equipped_weapon.setter
+    def equipped_weapon(self, item):
+        self._equipped_weapon = item
+        self.compile_traits()
+    
+    @property
+    def equipped_armor(self):
+        return self._equipped_armor
+    
+    @equipped_armor.setter
+    def equipped_armor(self, item):
+        self._equipped_armor = item
+        self.compile_traits()
+    
+    def assign_ability_scores(self, scores):
+        """
+        Replace the base stats with rolled scores (STR, DEX, CON, INT, WIS, CHA),
+        reapply racial bonuses and recalculate HP and AC.
+        """
+        (self.strength, self.dexterity, self.constitution,
+         self.intelligence, self.wisdom, self.charisma) = scores
+        
+        for stat, bonus in self.race.stat_bonuses.items():
+            setattr(self, stat, getattr(self, stat) + bonus)
+        
+        self.max_hp = self.calculate_max_hp() + getattr(self.race, 'bonus_hp', 0)
+        self.current_hp = self.max_hp
+        self.armor_class = 10 + self.get_modifier('dexterity')
+    
+    def equip_starting_weapon(self):
+        """Equip the first weapon in the inventory, if any."""
+        weapons = [item for item in self.inventory if isinstance(item, dict) and 'damage' in item]
+        if weapons:
+            self.equipped_weapon = weapons[0]
+    
     def calculate_max_hp(self):
         """Calculate maximum hit points."""
         con_modifier = self.get_modifier('constitution')
@@ -82,6 +149,11 @@ class Character:
         """Check if character is still alive."""
         return self.current_hp > 0
     
+    @property
+    def combat_effects(self):
+        """Status effects this character starts every fight with."""
+        return self.race.combat_effects
+    
     def add_experience(self, xp):
         """Add experience and check for level up."""
         self.experience += xp
@@ -117,10 +189,10 @@ class Character:
         return self.get_modifier('strength')
     
     def get_attack_damage(self):
-        """Calculate attack damage."""
+        """Calculate attack damage as a compiled DiceExpression."""
         if self.equipped_weapon:
-            return self.equipped_weapon['damage']
-        return '1d4'  # Unarmed strike
+            return compile_dice(self.equipped_weapon['damage'])
+        return UNARMED_DAMAGE  # Unarmed strike
     
     def get_gear_level(self):
         """Calculate average gear level from equipped items."""
@@ -158,8 +230,8 @@ class Character:
 # - Demogorgon: 60 HP (killed but left lasting impact, season 1 monster)
 class RaceWithHP(Race):
     """Race with bonus HP."""
-    def __init__(self, name, stat_bonuses, special_ability, bonus_hp=0):
-        super().__init__(name, stat_bonuses, special_ability)
+    def __init__(self, name, stat_bonuses, special_ability, bonus_hp=0, combat_effects=(), traits=()):
+        super().__init__(name, stat_bonuses, special_ability, combat_effects, traits)
         self.bonus_hp = bonus_hp
 
 RACES = {
@@ -167,11 +239,11 @@ RACES = {
                             'intelligence': 1, 'wisdom': 1, 'charisma': 1}, 
                   'Versatile: +1 to all stats'),
     'elf': Race('Elf', {'dexterity': 2, 'intelligence': 1}, 
-                'Keen Senses: Advantage on perception checks'),
+                'Keen Senses: Advantage on perception checks', traits=('keen_senses',)),
     'dwarf': Race('Dwarf', {'constitution': 2, 'strength': 1}, 
                   'Tough: Extra hit points'),
     'halfling': Race('Halfling', {'dexterity': 2, 'charisma': 1}, 
-                     'Lucky: Can reroll 1s'),
+                     'Lucky: Can reroll 1s', traits=('lucky',)),
     'vecna': RaceWithHP('Vecna', {'intelligence': 3, 'charisma': 2, 'constitution': 2},
                   'Mind Flayer Lord: Control minds and cast dark magic', 150),
     'eleven': RaceWithHP('Eleven', {'intelligence': 3, 'wisdom': 2, 'constitution': 1},
@@ -179,7 +251,8 @@ RACES = {
     'dustin': RaceWithHP('Dustin', {'intelligence': 2, 'constitution': 2, 'wisdom': 1},
                    'Strategic Mind: Understand complex systems and survive', 50),
     'demogorgon': RaceWithHP('Demogorgon', {'strength': 3, 'constitution': 3, 'intelligence': -2},
-                       'Creature of the Upside Down: Regenerate health in battle', 60),
+                       'Creature of the Upside Down: Regenerate health in battle', 60,
+                       combat_effects=(('regeneration', None, 2),)),
 }
 
 # Define available classes
@@ -191,7 +264,8 @@ CLASSES = {
     'rogue': CharacterClass('Rogue', 8, ['dexterity', 'charisma'],
                            [{'name': 'Dagger', 'damage': '1d6', 'finesse': True},
                             {'name': 'Lockpicks'},
-                            {'name': 'Health Potion', 'healing': 20}]),
+                            {'name': 'Health Potion', 'healing': 20}],
+                           traits=('sneak_attack',)),
     'wizard': CharacterClass('Wizard', 6, ['intelligence', 'wisdom'],
                             [{'name': 'Staff', 'damage': '1d6', 'finesse': False},
                              {'name': 'Spellbook'},
@@ -199,7 +273,8 @@ CLASSES = {
     'cleric': CharacterClass('Cleric', 8, ['wisdom', 'constitution'],
                             [{'name': 'Mace', 'damage': '1d6', 'finesse': False},
                              {'name': 'Holy Symbol'},
-                             {'name': 'Health Potion', 'healing': 20}]),
+                             {'name': 'Health Potion', 'healing': 20}],
+                            traits=('healing_touch',)),
     'psychic': CharacterClass('Psychic', 7, ['intelligence', 'wisdom'],
                              [{'name': 'Telekinesis', 'damage': '2d6', 'type': 'psychic'},
                               {'name': 'Mind Flayer Sensory', 'type': 'ability'},
@@ -221,3 +296,50 @@ RACE_CLASS_MAPPING = {
     'dustin': ['scientist'],
     'demogorgon': ['creature'],
 }
+
+def valid_combinations():
+    """All (race, class) key pairs allowed by RACE_CLASS_MAPPING."""
+    return [(race, char_class)
+            for race in RACES
+            for char_class in RACE_CLASS_MAPPING.get(race, CLASSES)]
+
+def generate_characters(count, mix=None, rng=None, name_prefix='Hero', stats=None):
+    """
+    Build count rolled characters in one call.
+    
+    Args:
+        count: Number of characters to create
+        mix: (race, class) keys to draw from - a list (equal odds) or a dict
+             of pair -> weight. Defaults to every valid combination.
+        rng: Random stream to draw from (defaults to the thread's stream)
+        name_prefix: Characters are named '<prefix> <n>'
+        stats: Optional dict that receives 'count', 'seconds' and 'per_second'
+    """
+    start = time.perf_counter()
+    
+    if mix is None:
+        mix = valid_combinations()
+    if not isinstance(mix, dict):
+        mix = {pair: 1 for pair in mix}
+    for race, char_class in mix:
+        if race not in RACES or char_class not in CLASSES:
+            raise ValueError(f"Unknown race/class combination: {race}/{char_class}")
+    
+    pairs = WeightedTable(mix).draw_many(count, rng)
+    score_sets = DiceRoller.roll_ability_scores_many(count, rng)
+    
+    characters = []
+    for number, ((race, char_class), scores) in enumerate(zip(pairs, score_sets), 1):
+        character = Character(f"{name_prefix} {number}", RACES[race], CLASSES[char_class])
+        character.assign_ability_scores(scores)
+        character.equip_starting_weapon()
+        characters.append(character)
+    
+    if stats is not None:
+        elapsed = time.perf_counter() - start
+        stats.update({
+            'count': count,
+            'seconds': elapsed,
+            'per_second': count / elapsed if elapsed > 0 else float('inf'),
+        })
+    return characters
@@ -0,0 +1,337 @@
+"""
+Multi-machine simulation sweeps for the D&D-style game.
+
+A Coordinator serves one Simulator's chunks over TCP; workers on any
+machine connect, pull a chunk, run it with simulator.run_chunk and push
+back its totals as a ScenarioStats record. The protocol is one JSON object
+per line in each direction, so nothing received is ever unpickled:
+
+    worker: {"op": "next"}          coordinator: {"chunk": id, "scenario": [...],
+                                                  "seed": s, "fights": n, "engine": e}
+                                              or {"wait": seconds} / {"done": true}
+    worker: {"op": "result", "chunk": id, "stats": [...]}
+                                    coordinator: {"ok": true}
+
+A chunk handed out and not returned within the lease goes to the next
+worker that asks, so a worker dying mid-chunk only costs that chunk.
+Finished chunks are appended to the checkpoint file as they arrive; a
+coordinator started on the same file skips them.
+
+Run with: python3 cluster.py coordinator [fights] [--levels 1-20] [--checkpoint FILE] [--host 0.0.0.0]
+          python3 cluster.py worker HOST:PORT [--processes N]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from multiprocessing import Process
+
+from simulator import (Simulator, Scenario, ScenarioStats, all_scenarios, format_report, init_worker,
+                       run_chunk)
+
+# Default TCP port of the coordinator
+DEFAULT_PORT = 8765
+
+# Seconds a worker may hold a chunk before it is handed out again
+LEASE_SECONDS = 600
+
+# Seconds a worker waits before asking again when every chunk is out
+WAIT_SECONDS = 0.5
+
+def _sweep_header(simulator):
+    """What a checkpoint must match to belong to this sweep."""
+    scenarios = json.dumps([list(scenario) for scenario in simulator.scenarios]).encode()
+    return {
+        'seed': simulator.seed,
+        'fights': simulator.fights,
+        'chunk_size': simulator.chunk_size,
+        'engine': simulator.engine,
+        'scenarios': hashlib.sha256(scenarios).hexdigest(),
+    }
+
+def checkpoint_seed(path):
+    """The seed of the sweep saved in a checkpoint file, or None if there is none (or it is unreadable)."""
+    try:
+        with open(path) as f:
+            return json.loads(f.readline())['seed']
+    except (OSError, ValueError, KeyError):
+        return None
+
+class _Handler(socketserver.StreamRequestHandler):
+    """One worker connection: answer each request line with a reply line."""
+
+    def handle(self):
+        connections = self.server.connections
+        connections.add(self.connection)
+        try:
+            self._serve()
+        finally:
+            connections.discard(self.connection)
+
+    def _serve(self):
+        for line in self.rfile:
+            try:
+                reply = self.server.coordinator.handle(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                reply = {'error': str(e)}
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+            if 'error' in reply:
+                return
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+class Coordinator:
+    """
+    Hands out a Simulator's chunks to TCP workers and collects the totals.
+
+    Totals are integer sums, so the results are identical to
+    Simulator.run() with the same seed, whichever workers ran which chunks.
+    Adaptive simulators are not supported: every chunk is run.
+    """
+
+    def __init__(self, simulator, host='127.0.0.1', port=DEFAULT_PORT, checkpoint=None, lease=LEASE_SECONDS):
+        if simulator.adaptive:
+            raise ValueError("Cluster sweeps run every chunk; adaptive stopping is not supported")
+        self.simulator = simulator
+        self.work = simulator.chunks()
+        self.lease = lease
+        self.results = {}
+        self._lock = threading.Condition()
+        # Chunk id -> time its lease runs out
+        self._leased = {}
+        self._pending = list(range(len(self.work) - 1, -1, -1))
+        self._checkpoint = None
+        if checkpoint is not None:
+            self._open_checkpoint(checkpoint)
+        self._server = _Server((host, port), _Handler)
+        self._server.coordinator = self
+        self._server.connections = set()
+        self._thread = None
+
+    @property
+    def address(self):
+        """(host, port) the coordinator listens on."""
+        return self._server.server_address[:2]
+
+    def _open_checkpoint(self, path):
+        """Load the chunks already finished in path, then keep appending to it."""
+        header = _sweep_header(self.simulator)
+        records = []
+        if os.path.exists(path):
+            with open(path) as f:
+                lines = f.read().split('\n')
+            if lines[0]:
+                try:
+                    saved = json.loads(lines[0])
+                except ValueError:
+                    saved = None
+                if not isinstance(saved, dict):
+                    raise ValueError(f"Checkpoint {path} header unreadable: start over or pass a new path")
+                if saved != header:
+                    raise ValueError(f"Checkpoint {path} belongs to a different sweep")
+            for line in lines[1:]:
+                try:
+                    chunk, *record = json.loads(line)
+                    if not 0 <= chunk < len(self.work):
+                        raise ValueError(f"Unknown chunk: {chunk}")
+                    self.results[chunk] = ScenarioStats.from_record(record)
+                    records.append(line)
+                except (ValueError, TypeError):
+                    break  # Cut short by a crash; redo from here
+        # Rewrite without any torn last line, then append from there
+        with open(path + '.tmp', 'w') as f:
+            f.write('\n'.join([json.dumps(header)] + records) + '\n')
+        os.replace(path + '.tmp', path)
+        self._pending = [chunk for chunk in self._pending if chunk not in self.results]
+        self._checkpoint = open(path, 'a')
+
+    def handle(self, request):
+        """Answer one worker request (a decoded JSON object)."""
+        with self._lock:
+            if request['op'] == 'next':
+                return self._next_chunk()
+            if request['op'] == 'result':
+                chunk = request['chunk']
+                if not 0 <= chunk < len(self.work):
+                    raise ValueError(f"Unknown chunk: {chunk}")
+                stats = ScenarioStats.from_record(request['stats'])
+                if stats.fights != self.work[chunk][2]:
+                    raise ValueError(f"Chunk {chunk} came back with {stats.fights} fights")
+                self._leased.pop(chunk, None)
+                # A reissued chunk can come back twice; the seed makes both copies equal
+                if chunk not in self.results:
+                    self.results[chunk] = stats
+                    if self._checkpoint:
+                        self._checkpoint.write(json.dumps([chunk] + stats.record()) + '\n')
+                        self._checkpoint.flush()
+                    self._lock.notify_all()
+                return {'ok': True}
+            raise ValueError(f"Unknown request: {request['op']}")
+
+    def _next_chunk(self):
+        now = time.monotonic()
+        if not self._pending:
+            # Take back chunks whose worker has gone quiet for too long
+            self._pending = [chunk for chunk, expires in self._leased.items() if expires <= now]
+        while self._pending:
+            chunk = self._pending.pop()
+            if chunk in self.results:
+                continue
+            self._leased[chunk] = now + self.lease
+            scenario, seed, fights, engine = self.work[chunk]
+            return {'chunk': chunk, 'scenario': list(scenario), 'seed': seed, 'fights': fights, 'engine': engine}
+        if len(self.results) == len(self.work):
+            return {'done': True}
+        return {'wait': WAIT_SECONDS}
+
+    def start(self):
+        """Start accepting workers in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, progress=None, timeout=None):
+        """
+        Block until every chunk is in (True) or timeout seconds pass (False).
+        progress, if given, is called with (chunks done, chunks total).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while len(self.results) < len(self.work):
+                if progress:
+                    progress(len(self.results), len(self.work))
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+        if progress:
+            progress(len(self.work), len(self.work))
+        return True
+
+    def totals(self):
+        """{scenario: ScenarioStats} over the chunks finished so far."""
+        totals = {scenario: ScenarioStats() for scenario in self.simulator.scenarios}
+        with self._lock:
+            for chunk, stats in self.results.items():
+                totals[self.work[chunk][0]].merge(stats)
+        return totals
+
+    def close(self):
+        """Stop serving; workers still connected see the connection drop."""
+        if self._thread:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+        for connection in list(self._server.connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        with self._lock:
+            if self._checkpoint:
+                self._checkpoint.close()
+                self._checkpoint = None
+
+    def run(self, progress=None):
+        """Serve until the sweep is finished and return {scenario: ScenarioStats}."""
+        self.start()
+        try:
+            self.wait(progress)
+        finally:
+            self.close()
+        return self.totals()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def run_worker(host, port=DEFAULT_PORT, limit=None):
+    """
+    Pull chunks from a coordinator and run them until it is done (or limit
+    chunks have been run). Returns the number of chunks run.
+    """
+    init_worker()
+    done = 0
+    with socket.create_connection((host, port)) as connection, connection.makefile('rwb') as stream:
+        def ask(request):
+            stream.write(json.dumps(request).encode() + b'\n')
+            stream.flush()
+            line = stream.readline()
+            if not line:
+                raise ConnectionError("Coordinator closed the connection")
+            reply = json.loads(line)
+            if 'error' in reply:
+                raise ValueError(f"Coordinator refused request: {reply['error']}")
+            return reply
+
+        try:
+            while limit is None or done < limit:
+                reply = ask({'op': 'next'})
+                if reply.get('done'):
+                    break
+                if 'wait' in reply:
+                    time.sleep(reply['wait'])
+                    continue
+                stats = run_chunk(Scenario(*reply['scenario']), reply['seed'], reply['fights'], reply['engine'])
+                ask({'op': 'result', 'chunk': reply['chunk'], 'stats': stats.record()})
+                done += 1
+        except ConnectionError:
+            pass  # Coordinator finished or went down; its lease covers any lost chunk
+    return done
+
+def start_workers(host, port=DEFAULT_PORT, processes=None):
+    """Start worker processes on this machine; returns the Process objects."""
+    workers = [Process(target=run_worker, args=(host, port), daemon=True)
+               for _ in range(processes or os.cpu_count())]
+    for worker in workers:
+        worker.start()
+    return workers
+
+def _levels(text):
+    low, _, high = text.partition('-')
+    return tuple(range(int(low), int(high or low) + 1))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Distributed Monte Carlo balance sweeps")
+    roles = parser.add_subparsers(dest='role', required=True)
+    coordinator_args = roles.add_parser('coordinator', help="serve a sweep to workers")
+    coordinator_args.add_argument('fights', type=int, nargs='?', default=1000, help="fights per scenario")
+    coordinator_args.add_argument('--levels', type=_levels, default=(1, 2, 3, 4, 5), help="e.g. 1-20")
+    coordinator_args.add_argument('--engine', default='combat', choices=('combat', 'batch'))
+    coordinator_args.add_argument('--seed', type=int, help="defaults to the checkpoint's, else random")
+    coordinator_args.add_argument('--checkpoint', help="file to save progress in and resume from")
+    coordinator_args.add_argument('--host', default='127.0.0.1',
+                                  help="address to listen on; 0.0.0.0 lets other machines connect "
+                                       "(the protocol is unauthenticated: trusted networks only)")
+    coordinator_args.add_argument('--port', type=int, default=DEFAULT_PORT)
+    worker_args = roles.add_parser('worker', help="run chunks for a coordinator")
+    worker_args.add_argument('address', help="HOST:PORT of the coordinator")
+    worker_args.add_argument('--processes', type=int, default=None, help="defaults to one per CPU")
+    args = parser.parse_args()
+
+    if args.role == 'worker':
+        host, _, port = args.address.rpartition(':')
+        for worker in start_workers(host, int(port), args.processes):
+            worker.join()
+    else:
+        seed = args.seed if args.seed is not None else (args.checkpoint and checkpoint_seed(args.checkpoint))
+        simulator = Simulator(all_scenarios(levels=args.levels), fights=args.fights, seed=seed, engine=args.engine)
+        try:
+            coordinator = Coordinator(simulator, args.host, args.port, checkpoint=args.checkpoint)
+        except ValueError as e:
+            parser.exit(1, f"{e}\n")
+        print(f"Serving {len(coordinator.work):,} chunks on port {coordinator.address[1]} (seed {simulator.seed})")
+        start = time.perf_counter()
+        results = coordinator.run(lambda done, total: print(f"\r{done}/{total} chunks", end='', flush=True))
+        elapsed = time.perf_counter() - start
+        print(f"\n{sum(stats.fights for stats in results.values()):,} fights in {elapsed:.1f}s\n")
+        print(format_report(results))
@@ -1,240 +1,592 @@
 """Combat system for the D&D-style game."""
 
+from collections import deque, namedtuple
+from itertools import islice
 from dice import DiceRoller
+from rng import default_rng
+from status_effects import EFFECTS, EffectTimers, status_item
 import time
 
+# What one call of Combat.rounds() yields
+RoundReport = namedtuple('RoundReport', ['number', 'events', 'player_hp', 'enemy_hp', 'result'])
+
+# Events kept per fight by default (None keeps everything)
+COMBAT_LOG_SIZE = 256
+
+# What an enemy can do on its turn: (attack roll modifier, damage dice rolled on a hit)
+ENEMY_ACTIONS = {
+    'attack': (0, 1),
+    'heavy': (-5, 2),  # A telegraphed blow: harder to land, double dice
+}
+
+class CombatEvent(namedtuple('CombatEvent', ['type', 'actor', 'target', 'rolls', 'damage'])):
+    """
+    One thing that happened in a fight, stored as plain values.
+    rolls holds the numbers the event's text needs (for an attack:
+    d20, attack bonus and target AC); damage is damage dealt, or HP healed
+    for an 'item' event. Text is only built by render_event().
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, type, actor=None, target=None, rolls=(), damage=None):
+        return super().__new__(cls, type, actor, target, rolls, damage)
+
+BANNER = '=' * 50
+
+def _render_attack(event, outcome):
+    roll, bonus, armor_class = event.rolls
+    return [
+        f"{event.actor} attacks {event.target}!",
+        f"  Attack roll: {roll} + {bonus} = {roll + bonus} vs AC {armor_class}",
+        outcome,
+    ]
+
+# Event type -> function returning the event's lines of text
+RENDERERS = {
+    'begin': lambda e: [f"\n{BANNER}", "COMBAT BEGINS!", f"{BANNER}\n"],
+    'initiative': lambda e: ["Initiative Order:"] + [f"  {name}: {roll}" for name, roll in e.rolls] + [""],
+    'round': lambda e: [f"\n--- Round {e.rolls[0]} ---"],
+    'turn': lambda e: [f"\n{e.actor}'s turn!"] + ([f"HP: {e.rolls[0]}/{e.rolls[1]}"] if e.rolls else []),
+    'critical_hit': lambda e: _render_attack(e, f"  CRITICAL HIT! {e.damage} damage!"),
+    'critical_miss': lambda e: _render_attack(e, "  CRITICAL MISS! The attack goes wide!"),
+    'hit': lambda e: _render_attack(e, f"  Hit! {e.damage} damage!"),
+    'miss': lambda e: _render_attack(e, "  Miss!"),
+    'defeated': lambda e: [f"  {e.actor} has been defeated!"],
+    'item': lambda e: [f"{e.actor} uses {e.target}" + (f" and heals {e.damage} HP!" if e.damage is not None else "!")],
+    'effect': lambda e: [f"  {e.actor} is {EFFECTS[e.target].adjective}!"],
+    'effect_damage': lambda e: [f"{e.actor} takes {e.damage} {e.target} damage!"],
+    'effect_heal': lambda e: [f"{e.actor} regenerates {e.damage} HP!"],
+    'effect_ends': lambda e: [f"{e.actor} is no longer {EFFECTS[e.target].adjective}."],
+    'cured': lambda e: [f"  {e.actor} is cured of {e.target}!"],
+    'stunned': lambda e: [f"{e.actor} is stunned and cannot act!"],
+    'trait': lambda e: [f"  {e.actor}'s {e.target} comes into play!"],
+    'flee': lambda e: [f"{e.actor} successfully flees from combat!"],
+    'flee_failed': lambda e: [f"{e.actor} fails to escape!"],
+    'heavy': lambda e: [f"{e.actor} winds up a heavy blow!"],
+    'victory': lambda e: ["\n" + BANNER, "VICTORY!", BANNER + "\n"],
+    'defeat': lambda e: ["\n" + BANNER, "DEFEAT!", BANNER + "\n"],
+}
+
+def render_event(event):
+    """Return the lines of text for a CombatEvent."""
+    return RENDERERS[event.type](event)
+
+class InteractivePolicy:
+    """Ask the player for every choice at the terminal."""
+    
+    def choose_action(self, combat):
+        """Return 'attack', 'item' or 'flee'."""
+        while True:
+            print("\nWhat do you want to do?")
+            print("1. Attack")
+            print("2. Use Item")
+            print("3. Flee")
+            print("4. Auto-battle")
+            
+            choice = input("Choose an action: ").strip()
+            
+            if choice == '1':
+                return 'attack'
+            elif choice == '2':
+                return 'item'
+            elif choice == '3':
+                return 'flee'
+            elif choice == '4':
+                # Let the auto-battle policy play out the rest of this fight
+                from auto_battle import AutoBattlePolicy
+                combat.policy = AutoBattlePolicy()
+                return combat.policy.choose_action(combat)
+            else:
+                print("Invalid choice. Try again.")
+    
+    def choose_target(self, combat, targets):
+        """Return one of the living enemies in targets."""
+        print("\nChoose a target:")
+        for i, enemy in enumerate(targets):
+            print(f"{i+1}. {enemy.name} (HP: {enemy.current_hp}/{enemy.max_hp})")
+        
+        while True:
+            try:
+                choice = int(input("Target: ").strip())
+                if 1 <= choice <= len(targets):
+                    return targets[choice - 1]
+                else:
+                    print("Invalid target.")
+            except (ValueError, IndexError):
+                print("Invalid input.")
+    
+    def choose_item(self, combat, items):
+        """Return one of the usable items, or None to cancel."""
+        if not items:
+            print("No usable items in inventory!")
+            return None
+        
+        print("\nUsable Items:")
+        for i, item in enumerate(items):
+            if 'healing' in item:
+                print(f"{i+1}. {item['name']} (Heals {item['healing']} HP)")
+            else:
+                print(f"{i+1}. {item['name']} ({item.get('description', 'Special item')})")
+        print(f"{len(items)+1}. Cancel")
+        
+        try:
+            choice = int(input("Choose item: ").strip())
+            if 1 <= choice <= len(items):
+                return items[choice - 1]
+        except (ValueError, IndexError):
+            print("Invalid choice.")
+        return None
+
+class AttackPolicy:
+    """
+    Headless policy: attack the weakest living enemy.
+    Optionally drink the strongest potion below heal_below and try to flee
+    below flee_below (both fractions of max HP).
+    """
+    
+    def __init__(self, heal_below=None, flee_below=None):
+        self.heal_below = heal_below
+        self.flee_below = flee_below
+    
+    def choose_action(self, combat):
+        player = combat.player
+        hp_fraction = player.current_hp / player.max_hp
+        if self.flee_below is not None and hp_fraction < self.flee_below:
+            return 'flee'
+        if self.heal_below is not None and hp_fraction < self.heal_below and combat.healing_items():
+            return 'item'
+        return 'attack'
+    
+    def choose_target(self, combat, targets):
+        return combat.weakest_enemy()
+    
+    def choose_item(self, combat, items):
+        potions = [item for item in items if 'healing' in item]
+        return max(potions, key=lambda item: item['healing']) if potions else None
+
+class ScriptedPolicy:
+    """
+    Headless policy that plays a fixed list of actions ('attack', 'item',
+    'flee'), then falls back to another policy (attacking by default).
+    """
+    
+    def __init__(self, actions, fallback=None):
+        self.actions = list(actions)
+        self.fallback = fallback or AttackPolicy()
+    
+    def choose_action(self, combat):
+        if self.actions:
+            return self.actions.pop(0)
+        return self.fallback.choose_action(combat)
+    
+    def choose_target(self, combat, targets):
+        return self.fallback.choose_target(combat, targets)
+    
+    def choose_item(self, combat, items):
+        return self.fallback.choose_item(combat, items)
+
+class AggressivePolicy:
+    """Enemy policy: a plain attack on every turn."""
+    
+    def choose_action(self, combat, enemy):
+        return 'attack'
+
+class PacedPrinter:
+    """Print combat events as text, pausing after each turn for readability."""
+    
+    def __init__(self, delay=0.5):
+        self.delay = delay
+    
+    def emit(self, event):
+        for line in render_event(event):
+            print(line)
+    
+    def end_turn(self):
+        if self.delay:
+            time.sleep(self.delay)
+
+class NullSink:
+    """Discard combat events (headless runs still keep combat_log)."""
+    
+    def emit(self, event):
+        pass
+    
+    def end_turn(self):
+        pass
+
+NULL_SINK = NullSink()
+
 class Combat:
-    """Manage combat encounters between player and enemies."""
+    """Manage combat encounters between player and enemies.
     
-    def __init__(self, player, enemies):
+    Turn resolution is separate from presentation: player choices come from
+    a policy (InteractivePolicy asks at the terminal; AttackPolicy and
+    ScriptedPolicy run headless) and events go to a sink (PacedPrinter
+    for the CLI, NULL_SINK for simulations and servers). Enemies pick one
+    of ENEMY_ACTIONS through enemy_policy (AggressivePolicy by default;
+    see enemy_ai.ExpectimaxPolicy for a searching opponent).
+    
+    combat_log keeps the last log_size CombatEvents (None keeps them all);
+    get_combat_log() renders them as text on demand. With record=True the
+    fight runs on its own seeded stream and replay() returns a compact
+    replay.Replay of it.
+    """
+    
+    def __init__(self, player, enemies, rng=None, policy=None, sink=None, log_size=COMBAT_LOG_SIZE,
+                 enemy_policy=None, record=False):
         self.player = player
         self.enemies = enemies
+        # Random stream for every roll in this fight (defaults to the thread's stream)
+        self.rng = rng if rng is not None else default_rng()
+        self.policy = policy if policy is not None else InteractivePolicy()
+        self.sink = sink if sink is not None else PacedPrinter()
+        self.enemy_policy = enemy_policy if enemy_policy is not None else AggressivePolicy()
         self.turn_order = []
         self.current_turn = 0
-        self.combat_log = []
-        
+        self.combat_log = deque(maxlen=log_size)
+        # Status effects in force, ticked as each round starts
+        self.effects = EffectTimers()
+        self.round_number = 0
+        self.result = None
+        self._events = 0
+        self._reported = 0
+        # Notes the seed and every decision for replay.py (record=True only)
+        self.recorder = None
+        if record:
+            from replay import ReplayRecorder  # replay imports this module
+            self.recorder = ReplayRecorder(self)
+    
     def start_combat(self):
         """Initialize combat and determine turn order."""
-        self.log(f"\n{'='*50}")
-        self.log("COMBAT BEGINS!")
-        self.log(f"{'='*50}\n")
+        self.log('begin')
         
         # Roll initiative
-        combatants = [(self.player, DiceRoller.roll_d20() + self.player.get_modifier('dexterity'), 'player')]
+        combatants = [(self.player, self.roll_initiative(self.player), 'player')]
         
         for i, enemy in enumerate(self.enemies):
-            initiative = DiceRoller.roll_d20() + enemy.get_modifier('dexterity')
-            combatants.append((enemy, initiative, f'enemy_{i}'))
+            combatants.append((enemy, self.roll_initiative(enemy), f'enemy_{i}'))
         
         # Sort by initiative (highest first)
         combatants.sort(key=lambda x: x[1], reverse=True)
         self.turn_order = combatants
         
         # Display initiative order
-        self.log("Initiative Order:")
-        for combatant, initiative, _ in self.turn_order:
-            name = combatant.name
-            self.log(f"  {name}: {initiative}")
-        self.log("")
-        
+        self.log('initiative', rolls=tuple((combatant.name, initiative) for combatant, initiative, _ in self.turn_order))
+        self.apply_innate_effects(combatant for combatant, _, _ in self.turn_order)
+    
+    def roll_initiative(self, combatant):
+        """d20 (after any on_initiative traits) + DEX modifier."""
+        roll = DiceRoller.roll_d20(self.rng)
+        for hook in combatant.hooks.on_initiative:
+            roll = hook(self, combatant, roll)
+        return roll + combatant.get_modifier('dexterity')
+    
     def run_combat(self):
         """Execute combat rounds until one side is defeated."""
+        for _ in self.rounds():
+            pass
+        return self.result
+    
+    def rounds(self):
+        """
+        Resolve the fight one round at a time.
+        Yields a RoundReport after every round; the last one carries the
+        result ('victory', 'defeat' or 'fled'), which is also left in self.result.
+        """
         self.start_combat()
         
-        round_num = 1
-        
-        while self.player.is_alive() and any(e.is_alive() for e in self.enemies):
-            self.log(f"\n--- Round {round_num} ---")
+        while self.player.is_alive() and self.enemies_alive():
+            self.start_round()
             
-            for combatant, _, combatant_type in self.turn_order:
+            if self.play_round() == 'flee':
+                self.result = 'fled'
+                self.effects.clear()
+            elif not self.player.is_alive() or not self.enemies_alive():
+                self.finish()
+            
+            yield self._report()
+            if self.result:
+                return
+        
+        # No round was needed (e.g. every enemy was already down)
+        if not self.result:
+            self.finish()
+    
+    def start_round(self):
+        """Move to the next round and fire the status effects due as it starts."""
+        self.round_number += 1
+        self.log('round', rolls=(self.round_number,))
+        
+        for combatant, effect, ended in self.effects.due(self.round_number):
+            if ended:
+                self.log('effect_ends', combatant.name, effect.name)
+            elif EFFECTS[effect.name].hp_sign < 0:
+                damage = combatant.take_damage(effect.potency)
+                self.log('effect_damage', combatant.name, effect.name, damage=damage)
+                self.hp_changed(combatant)
                 if not combatant.is_alive():
-                    continue
-                
-                if not self.player.is_alive() or not any(e.is_alive() for e in self.enemies):
-                    break
-                
-                if combatant == self.player:
-                    action = self.player_turn()
-                    if action == 'flee':
-                        return 'fled'
-                else:
-                    self.enemy_turn(combatant)
-                
-                time.sleep(0.5)  # Pause for readability
+                    self.defeated(combatant)
+            else:
+                healed = combatant.heal(effect.potency)
+                if healed:
+                    self.log('effect_heal', combatant.name, effect.name, damage=healed)
+                    self.hp_changed(combatant)
+    
+    def hp_changed(self, combatant):
+        """Called when a combatant's HP changes outside an attack (Battle keeps an HP heap)."""
+    
+    def apply_innate_effects(self, combatants):
+        """Start the effects combatants always have in a fight (e.g. racial regeneration)."""
+        for combatant in combatants:
+            for name, rounds, potency in combatant.combat_effects:
+                self.add_effect(combatant, name, rounds, potency)
+    
+    def add_effect(self, combatant, name, rounds, potency=0):
+        """Put a status effect on combatant for rounds more rounds (None: the whole fight)."""
+        self.effects.apply(combatant, name, rounds, potency, self.round_number)
+        self.log('effect', combatant.name, name, rolls=(rounds,))
+    
+    def stunned(self, combatant):
+        """True (and logged) if combatant must skip this turn."""
+        if 'stun' in combatant.status_effects:
+            self.log('stunned', combatant.name)
+            return True
+        return False
+    
+    def play_round(self):
+        """Give every living combatant a turn; returns 'flee' if the player escaped."""
+        for combatant, _, combatant_type in self.turn_order:
+            if not combatant.is_alive():
+                continue
             
-            round_num += 1
-        
-        # Combat ended
-        if self.player.is_alive():
-            self.log("\n" + "="*50)
-            self.log("VICTORY!")
-            self.log("="*50 + "\n")
-            return 'victory'
-        else:
-            self.log("\n" + "="*50)
-            self.log("DEFEAT!")
-            self.log("="*50 + "\n")
-            return 'defeat'
+            if not self.player.is_alive() or not self.enemies_alive():
+                break
+            
+            if combatant == self.player:
+                action = self.player_turn()
+                if action == 'flee':
+                    return 'flee'
+            else:
+                self.enemy_turn(combatant)
+            
+            self.sink.end_turn()  # Pause for readability
+        return None
+    
+    def finish(self):
+        """Record and announce the outcome once one side is down."""
+        self.result = 'victory' if self.player.is_alive() else 'defeat'
+        self.effects.clear()
+        self.log(self.result)
+        return self.result
+    
+    def _report(self):
+        # Events since the last report (older ones may have left the ring buffer)
+        new = min(self._events - self._reported, len(self.combat_log))
+        events = list(islice(self.combat_log, len(self.combat_log) - new, None))
+        self._reported = self._events
+        return RoundReport(self.round_number, events, self.player.current_hp,
+                           [e.current_hp for e in self.enemies], self.result)
+    
+    def enemies_alive(self):
+        """Check whether any enemy is still standing."""
+        return any(e.is_alive() for e in self.enemies)
+    
+    def living_enemies(self):
+        """Enemies the player can target."""
+        return [e for e in self.enemies if e.is_alive()]
+    
+    def weakest_enemy(self):
+        """The living enemy with the least HP."""
+        return min(self.living_enemies(), key=lambda enemy: enemy.current_hp)
+    
+    def defeated(self, combatant):
+        """Called once when a combatant drops to 0 HP."""
+        self.log('defeated', combatant.name)
+    
+    def usable_items(self):
+        """Items the player can use in combat (potions, etc.)."""
+        return [item for item in self.player.inventory
+                if isinstance(item, dict) and ('healing' in item or status_item(item))]
+    
+    def healing_items(self):
+        """Usable items that restore HP."""
+        return [item for item in self.usable_items() if 'healing' in item]
     
     def player_turn(self):
         """Handle player's turn in combat."""
-        self.log(f"\n{self.player.name}'s turn!")
-        self.log(f"HP: {self.player.current_hp}/{self.player.max_hp}")
+        self.log('turn', self.player.name, rolls=(self.player.current_hp, self.player.max_hp))
+        for hook in self.player.hooks.on_turn_start:
+            hook(self, self.player)
+        if self.stunned(self.player):
+            return 'stunned'
         
+        # Keep asking until the turn is used (a failed flee lets the player choose again)
         while True:
-            print("\nWhat do you want to do?")
-            print("1. Attack")
-            print("2. Use Item")
-            print("3. Flee")
-            
-            choice = input("Choose an action: ").strip()
+            choice = self.policy.choose_action(self)
             
-            if choice == '1':
+            if choice == 'attack':
                 return self.player_attack()
-            elif choice == '2':
+            elif choice == 'item':
                 used = self.player_use_item()
                 if used:
                     return 'item_used'
-            elif choice == '3':
+            elif choice == 'flee':
                 if self.attempt_flee():
                     return 'flee'
             else:
-                print("Invalid choice. Try again.")
+                raise ValueError(f"Unknown combat action: {choice}")
     
-    def player_attack(self):
-        """Player attacks an enemy."""
+    def player_attack(self, target=None):
+        """Player attacks an enemy (chosen by the policy unless given)."""
         # Choose target
-        alive_enemies = [e for e in self.enemies if e.is_alive()]
-        
-        if len(alive_enemies) == 1:
-            target = alive_enemies[0]
-        else:
-            print("\nChoose a target:")
-            for i, enemy in enumerate(alive_enemies):
-                print(f"{i+1}. {enemy.name} (HP: {enemy.current_hp}/{enemy.max_hp})")
+        if target is None:
+            alive_enemies = self.living_enemies()
             
-            while True:
-                try:
-                    choice = int(input("Target: ").strip())
-                    if 1 <= choice <= len(alive_enemies):
-                        target = alive_enemies[choice - 1]
-                        break
-                    else:
-                        print("Invalid target.")
-                except (ValueError, IndexError):
-                    print("Invalid input.")
+            if len(alive_enemies) == 1:
+                target = alive_enemies[0]
+            else:
+                target = self.policy.choose_target(self, alive_enemies)
         
         # Roll attack
-        attack_roll = DiceRoller.roll_d20()
+        attacker = self.player
+        attack_roll = DiceRoller.roll_d20(self.rng)
+        for hook in attacker.hooks.on_attack_roll:
+            attack_roll = hook(self, attacker, attack_roll)
         attack_bonus = self.player.get_attack_bonus()
         total_attack = attack_roll + attack_bonus
         
-        self.log(f"{self.player.name} attacks {target.name}!")
-        self.log(f"  Attack roll: {attack_roll} + {attack_bonus} = {total_attack} vs AC {target.armor_class}")
+        rolls = (attack_roll, attack_bonus, target.armor_class)
         
         # Check if hit
         if DiceRoller.is_critical_hit(attack_roll):
             # Critical hit - double damage dice
             damage_dice = self.player.get_attack_damage()
-            damage = DiceRoller.roll_simple(damage_dice) + DiceRoller.roll_simple(damage_dice)
+            damage = DiceRoller.roll_simple(damage_dice, self.rng) + DiceRoller.roll_simple(damage_dice, self.rng)
             damage += attack_bonus
+            for hook in attacker.hooks.on_damage:
+                damage = hook(self, attacker, target, damage)
             actual_damage = target.take_damage(damage)
-            self.log(f"  CRITICAL HIT! {actual_damage} damage!")
+            self.log('critical_hit', self.player.name, target.name, rolls, actual_damage)
         elif DiceRoller.is_critical_miss(attack_roll):
-            self.log(f"  CRITICAL MISS! The attack goes wide!")
+            self.log('critical_miss', self.player.name, target.name, rolls)
         elif total_attack >= target.armor_class:
             # Normal hit
             damage_dice = self.player.get_attack_damage()
-            damage = DiceRoller.roll_simple(damage_dice) + attack_bonus
+            damage = DiceRoller.roll_simple(damage_dice, self.rng) + attack_bonus
+            for hook in attacker.hooks.on_damage:
+                damage = hook(self, attacker, target, damage)
             actual_damage = target.take_damage(damage)
-            self.log(f"  Hit! {actual_damage} damage!")
+            self.log('hit', self.player.name, target.name, rolls, actual_damage)
         else:
-            self.log(f"  Miss!")
+            self.log('miss', self.player.name, target.name, rolls)
         
         if not target.is_alive():
-            self.log(f"  {target.name} has been defeated!")
+            self.defeated(target)
         
         return 'attacked'
     
-    def player_use_item(self):
-        """Player uses an item from inventory."""
-        # Find usable items (potions, etc.)
-        usable_items = [item for item in self.player.inventory 
-                       if isinstance(item, dict) and 'healing' in item]
-        
-        if not usable_items:
-            print("No usable items in inventory!")
-            return False
-        
-        print("\nUsable Items:")
-        for i, item in enumerate(usable_items):
-            print(f"{i+1}. {item['name']} (Heals {item['healing']} HP)")
-        print(f"{len(usable_items)+1}. Cancel")
-        
-        try:
-            choice = int(input("Choose item: ").strip())
-            if choice == len(usable_items) + 1:
+    def player_use_item(self, item=None):
+        """Player uses an item from inventory (chosen by the policy unless given)."""
+        if item is None:
+            item = self.policy.choose_item(self, self.usable_items())
+            if item is None:
                 return False
-            if 1 <= choice <= len(usable_items):
-                item = usable_items[choice - 1]
-                healing = self.player.heal(item['healing'])
-                self.log(f"{self.player.name} uses {item['name']} and heals {healing} HP!")
-                self.player.remove_item(item)
-                return True
-        except (ValueError, IndexError):
-            print("Invalid choice.")
         
-        return False
+        if 'healing' in item:
+            healing = self.player.heal(item['healing'])
+            self.log('item', self.player.name, item['name'], damage=healing)
+        else:
+            self.log('item', self.player.name, item['name'])
+        self.player.remove_item(item)
+        
+        # Status effects: cure_<name> removes one, applies/inflicts put one on the user/every enemy
+        for key, value in item.items():
+            if key.startswith('cure_') and value and self.effects.remove(self.player, key[5:]):
+                self.log('cured', self.player.name, key[5:])
+        if 'applies' in item:
+            self.add_effect(self.player, *item['applies'])
+        if 'inflicts' in item:
+            for enemy in list(self.living_enemies()):
+                self.add_effect(enemy, *item['inflicts'])
+        return True
     
     def attempt_flee(self):
         """Attempt to flee from combat."""
-        flee_roll = DiceRoller.roll_d20()
+        flee_roll = DiceRoller.roll_d20(self.rng)
         if flee_roll >= 10:
-            self.log(f"{self.player.name} successfully flees from combat!")
+            self.log('flee', self.player.name, rolls=(flee_roll,))
             return True
         else:
-            self.log(f"{self.player.name} fails to escape!")
+            self.log('flee_failed', self.player.name, rolls=(flee_roll,))
             return False
     
     def enemy_turn(self, enemy):
         """Handle enemy's turn in combat."""
-        self.log(f"\n{enemy.name}'s turn!")
+        self.log('turn', enemy.name)
+        for hook in enemy.hooks.on_turn_start:
+            hook(self, enemy)
+        if self.stunned(enemy):
+            return
+        
+        action = self.enemy_policy.choose_action(self, enemy)
+        to_hit, copies = ENEMY_ACTIONS[action]
+        if action != 'attack':
+            self.log(action, enemy.name)
         
-        # Simple AI - always attack player
-        attack_roll = DiceRoller.roll_d20()
-        attack_bonus = enemy.get_attack_bonus()
+        attack_roll = DiceRoller.roll_d20(self.rng)
+        for hook in enemy.hooks.on_attack_roll:
+            attack_roll = hook(self, enemy, attack_roll)
+        damage_bonus = enemy.get_attack_bonus()
+        attack_bonus = damage_bonus + to_hit
         total_attack = attack_roll + attack_bonus
         
-        self.log(f"{enemy.name} attacks {self.player.name}!")
-        self.log(f"  Attack roll: {attack_roll} + {attack_bonus} = {total_attack} vs AC {self.player.armor_class}")
+        rolls = (attack_roll, attack_bonus, self.player.armor_class)
         
         # Check if hit
         if DiceRoller.is_critical_hit(attack_roll):
-            # Critical hit
+            # Critical hit - double damage dice
             damage_dice = enemy.get_attack_damage()
-            damage = DiceRoller.roll_simple(damage_dice) + DiceRoller.roll_simple(damage_dice)
-            damage += attack_bonus
+            damage = sum(DiceRoller.roll_simple(damage_dice, self.rng) for _ in range(2 * copies))
+            damage += damage_bonus
+            for hook in enemy.hooks.on_damage:
+                damage = hook(self, enemy, self.player, damage)
             actual_damage = self.player.take_damage(damage)
-            self.log(f"  CRITICAL HIT! {actual_damage} damage!")
+            self.log('critical_hit', enemy.name, self.player.name, rolls, actual_damage)
         elif DiceRoller.is_critical_miss(attack_roll):
-            self.log(f"  CRITICAL MISS! The attack goes wide!")
+            self.log('critical_miss', enemy.name, self.player.name, rolls)
+            actual_damage = 0
         elif total_attack >= self.player.armor_class:
             # Normal hit
             damage_dice = enemy.get_attack_damage()
-            damage = DiceRoller.roll_simple(damage_dice) + attack_bonus
+            damage = sum(DiceRoller.roll_simple(damage_dice, self.rng) for _ in range(copies))
+            damage += damage_bonus
+            for hook in enemy.hooks.on_damage:
+                damage = hook(self, enemy, self.player, damage)
             actual_damage = self.player.take_damage(damage)
-            self.log(f"  Hit! {actual_damage} damage!")
+            self.log('hit', enemy.name, self.player.name, rolls, actual_damage)
         else:
-            self.log(f"  Miss!")
+            self.log('miss', enemy.name, self.player.name, rolls)
+            actual_damage = 0
         
         if not self.player.is_alive():
-            self.log(f"  {self.player.name} has been defeated!")
+            self.defeated(self.player)
+        elif actual_damage and enemy.on_hit:
+            self.add_effect(self.player, *enemy.on_hit)
+    
+    def log(self, event_type, actor=None, target=None, rolls=(), damage=None):
+        """Record a CombatEvent and send it to the sink."""
+        event = CombatEvent(event_type, actor, target, rolls, damage)
+        self.combat_log.append(event)
+        self._events += 1
+        self.sink.emit(event)
     
-    def log(self, message):
-        """Add message to combat log and print it."""
-        self.combat_log.append(message)
-        print(message)
+    def replay(self):
+        """The finished fight as a replay.Replay (needs record=True)."""
+        if self.recorder is None:
+            raise ValueError("This fight was not recorded; pass record=True")
+        return self.recorder.replay(self)
     
     def get_combat_log(self):
-        """Return the full combat log."""
-        return '\n'.join(self.combat_log)
+        """Render the retained combat log as text."""
+        return '\n'.join(line for event in self.combat_log for line in render_event(event))
@@ -1,100 +1,332 @@
 """Dice rolling mechanics for the D&D-style game."""
 
-import random
 import re
+from functools import lru_cache
+from itertools import product
 
-class DiceRoller:
-    """Handle all dice rolling operations."""
-    
-    @staticmethod
-    def roll(dice_string):
+from rng import default_rng
+from telemetry import FACE_BASE, TELEMETRY
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; bulk rolls fall back to pure Python
+    np = None
+
+# One term of a dice expression: an optional sign followed by either a dice
+# group ('2d6', 'd20', '4d6kh3', '1d20adv') or a flat number ('5').
+_TERM_PATTERN = re.compile(r'([+-]?)(?:(\d*)d(\d+)(kh\d+|kl\d+|adv|dis)?|(\d+))')
+
+# Number of distinct notations kept compiled at once
+DICE_CACHE_SIZE = 256
+
+class DiceExpression(str):
+    """
+    A compiled, immutable dice expression.
+
+    Behaves like the notation string it was built from (so it can still be
+    displayed, compared and stored in item dicts), but carries the parsed
+    dice groups so rolling never has to re-parse it.
+
+    Supported grammar: terms joined by '+' or '-', where a term is a flat
+    number or a dice group 'NdS' optionally followed by 'khK' / 'klK'
+    (keep highest / lowest K dice) or 'adv' / 'dis' (roll a single die
+    twice and keep the higher / lower result).
+    """
+
+    def __new__(cls, notation):
+        groups, modifier = _parse_dice(notation)
+        expression = super().__new__(cls, notation)
+        # Each group is (sign, num_dice, die_size, keep, keep_highest)
+        object.__setattr__(expression, 'groups', groups)
+        object.__setattr__(expression, 'modifier', modifier)
+        simple = len(groups) == 1 and groups[0][0] == 1 and groups[0][3] == groups[0][1]
+        object.__setattr__(expression, '_simple', simple)
+        return expression
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DiceExpression objects are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("DiceExpression objects are immutable")
+
+    def __repr__(self):
+        return f"DiceExpression({str.__repr__(self)})"
+
+    @property
+    def minimum(self):
+        """Lowest total this expression can produce."""
+        total = self.modifier
+        for sign, _, die_size, keep, _ in self.groups:
+            total += sign * (keep if sign > 0 else keep * die_size)
+        return total
+
+    @property
+    def maximum(self):
+        """Highest total this expression can produce."""
+        total = self.modifier
+        for sign, _, die_size, keep, _ in self.groups:
+            total += sign * (keep * die_size if sign > 0 else keep)
+        return total
+
+    def roll(self, rng=None):
         """
-        Roll dice based on standard notation (e.g., '2d6', '1d20+5', '3d8-2').
-        Returns the total result.
+        Roll the expression, drawing from rng (default: the thread's stream).
+        Returns (total, rolls, modifier) like DiceRoller.roll; rolls holds the
+        kept dice, negated for subtracted groups, so total == sum(rolls) + modifier.
         """
-        # Parse dice notation
-        pattern = r'(\d+)d(\d+)([\+\-]\d+)?'
-        match = re.match(pattern, dice_string.lower().replace(' ', ''))
-        
-        if not match:
-            raise ValueError(f"Invalid dice notation: {dice_string}")
-        
-        num_dice = int(match.group(1))
-        die_size = int(match.group(2))
-        modifier = int(match.group(3)) if match.group(3) else 0
-        
+        rng = rng or default_rng()
+        randint = rng.randint
+        if self._simple:
+            _, num_dice, die_size, _, _ = self.groups[0]
+            rolls = [randint(1, die_size) for _ in range(num_dice)]
+            if TELEMETRY.enabled:
+                TELEMETRY.record_faces(die_size, rolls, rng)
+            return sum(rolls) + self.modifier, rolls, self.modifier
+
+        rolls = []
+        for sign, num_dice, die_size, keep, keep_highest in self.groups:
+            group = [randint(1, die_size) for _ in range(num_dice)]
+            if TELEMETRY.enabled:
+                TELEMETRY.record_faces(die_size, group, rng)
+            if keep < num_dice:
+                group.sort(reverse=keep_highest)
+                group = group[:keep]
+            if sign < 0:
+                group = [-r for r in group]
+            rolls.extend(group)
+        return sum(rolls) + self.modifier, rolls, self.modifier
+
+    def roll_total(self, rng=None):
+        """Roll the expression and return only the total."""
+        if self._simple:
+            _, num_dice, die_size, _, _ = self.groups[0]
+            if num_dice == 1:
+                return _roll_die(die_size, rng) + self.modifier
+        return self.roll(rng)[0]
+
+    def roll_many(self, count, rng=None):
+        """
+        Roll the expression count times in one batch.
+        Returns a NumPy int64 array of totals, or a list when NumPy is unavailable.
+        Bulk rolls are for simulations and are not recorded by TELEMETRY.
+        """
+        if count < 0:
+            raise ValueError("Number of rolls cannot be negative")
+        rng = rng or default_rng()
+        generator = rng.numpy_generator() if np is not None else None
+        if generator is not None:
+            return self._roll_many_numpy(count, generator)
+        return self._roll_many_python(count, rng)
+
+    def _roll_many_numpy(self, count, generator):
+        totals = np.full(count, self.modifier, dtype=np.int64)
+        for sign, num_dice, die_size, keep, keep_highest in self.groups:
+            faces = generator.integers(1, die_size + 1, size=(count, num_dice))
+            if keep < num_dice:
+                faces.sort(axis=1)
+                faces = faces[:, num_dice - keep:] if keep_highest else faces[:, :keep]
+            totals += sign * faces.sum(axis=1)
+        return totals
+
+    def _roll_many_python(self, count, rng):
+        totals = [self.modifier] * count
+        for sign, num_dice, die_size, keep, keep_highest in self.groups:
+            faces = rng.choices(range(1, die_size + 1), k=count * num_dice)
+            if num_dice == 1:
+                sums = faces
+            elif keep == num_dice:
+                sums = [sum(faces[i:i + num_dice]) for i in range(0, len(faces), num_dice)]
+            else:
+                sums = [sum(sorted(faces[i:i + num_dice], reverse=keep_highest)[:keep])
+                        for i in range(0, len(faces), num_dice)]
+            if sign > 0:
+                totals = [t + r for t, r in zip(totals, sums)]
+            else:
+                totals = [t - r for t, r in zip(totals, sums)]
+        return totals
+
+def _roll_die(die_size, rng=None):
+    """Roll one die from rng (default: the thread's stream) and record it."""
+    rng = rng or default_rng()
+    face = rng.randint(1, die_size)
+    if TELEMETRY.enabled:
+        # TELEMETRY.record inlined: this is the hottest roll path
+        try:
+            log = rng._roll_log
+        except AttributeError:
+            log = TELEMETRY.attach(rng)
+        log.append(die_size * FACE_BASE + face)
+        if len(log) >= TELEMETRY.flush_every:
+            TELEMETRY.flush(rng)
+    return face
+
+def _parse_dice(notation):
+    """Parse dice notation into (groups, modifier), validating every group."""
+    text = notation.lower().replace(' ', '')
+    groups = []
+    modifier = 0
+    pos = 0
+
+    while pos < len(text):
+        match = _TERM_PATTERN.match(text, pos)
+        # Every term after the first must be introduced by a sign
+        if not match or match.end() == pos or (pos > 0 and not match.group(1)):
+            raise ValueError(f"Invalid dice notation: {notation}")
+        pos = match.end()
+
+        sign = -1 if match.group(1) == '-' else 1
+        if match.group(5) is not None:
+            modifier += sign * int(match.group(5))
+            continue
+
+        num_dice = int(match.group(2)) if match.group(2) else 1
+        die_size = int(match.group(3))
+        suffix = match.group(4)
+
         # Validate inputs
         if num_dice < 1 or num_dice > 100:
             raise ValueError("Number of dice must be between 1 and 100")
         if die_size < 2 or die_size > 100:
             raise ValueError("Die size must be between 2 and 100")
-        
-        # Roll the dice
-        rolls = [random.randint(1, die_size) for _ in range(num_dice)]
-        total = sum(rolls) + modifier
-        
-        return total, rolls, modifier
+
+        keep, keep_highest = num_dice, True
+        if suffix in ('adv', 'dis'):
+            if num_dice != 1:
+                raise ValueError("Advantage and disadvantage apply to a single die")
+            num_dice, keep, keep_highest = 2, 1, suffix == 'adv'
+        elif suffix:
+            keep, keep_highest = int(suffix[2:]), suffix[1] == 'h'
+            if keep < 1 or keep > num_dice:
+                raise ValueError("Number of kept dice must be between 1 and the number rolled")
+
+        groups.append((sign, num_dice, die_size, keep, keep_highest))
+
+    if not groups:
+        raise ValueError(f"Invalid dice notation: {notation}")
+
+    return tuple(groups), modifier
+
+@lru_cache(maxsize=DICE_CACHE_SIZE)
+def _compile_cached(notation):
+    return DiceExpression(notation)
+
+def compile_dice(notation):
+    """
+    Compile dice notation into a reusable DiceExpression.
+    Compiled expressions are cached by their notation string.
+    """
+    if isinstance(notation, DiceExpression):
+        return notation
+    return _compile_cached(notation)
+
+class DiceRoller:
+    """Handle all dice rolling operations."""
+    
+    @staticmethod
+    def roll(dice_string, rng=None):
+        """
+        Roll dice based on standard notation (e.g., '2d6', '1d20+5', '3d8-2',
+        '4d6kh3', '1d20adv'). Accepts a string or a compiled DiceExpression.
+        Every method draws from rng, defaulting to the current thread's stream.
+        Returns the total result.
+        """
+        return compile_dice(dice_string).roll(rng)
     
     @staticmethod
-    def roll_simple(dice_string):
+    def roll_simple(dice_string, rng=None):
         """Roll dice and return only the total."""
-        total, _, _ = DiceRoller.roll(dice_string)
-        return total
+        return compile_dice(dice_string).roll_total(rng)
+    
+    @staticmethod
+    def roll_many(dice_string, count, rng=None):
+        """
+        Roll dice notation count times in one vectorized batch.
+        Returns a NumPy array of totals, or a list when NumPy is unavailable.
+        """
+        return compile_dice(dice_string).roll_many(count, rng)
     
     @staticmethod
-    def roll_with_advantage():
+    def d20_many(count, rng=None):
+        """Roll count independent d20s."""
+        return compile_dice('1d20').roll_many(count, rng)
+    
+    @staticmethod
+    def advantage_many(count, rng=None):
+        """Roll count d20s with advantage (2d20 keep highest)."""
+        return compile_dice('1d20adv').roll_many(count, rng)
+    
+    @staticmethod
+    def disadvantage_many(count, rng=None):
+        """Roll count d20s with disadvantage (2d20 keep lowest)."""
+        return compile_dice('1d20dis').roll_many(count, rng)
+    
+    @staticmethod
+    def roll_with_advantage(rng=None):
         """Roll 2d20 and take the higher result."""
-        roll1 = random.randint(1, 20)
-        roll2 = random.randint(1, 20)
+        roll1 = _roll_die(20, rng)
+        roll2 = _roll_die(20, rng)
         return max(roll1, roll2), [roll1, roll2]
     
     @staticmethod
-    def roll_with_disadvantage():
+    def roll_with_disadvantage(rng=None):
         """Roll 2d20 and take the lower result."""
-        roll1 = random.randint(1, 20)
-        roll2 = random.randint(1, 20)
+        roll1 = _roll_die(20, rng)
+        roll2 = _roll_die(20, rng)
         return min(roll1, roll2), [roll1, roll2]
     
     @staticmethod
-    def roll_ability_scores():
+    def roll_ability_scores(rng=None):
         """Roll ability scores using 4d6 drop lowest method."""
+        rng = rng or default_rng()
         scores = []
         for _ in range(6):
-            rolls = [random.randint(1, 6) for _ in range(4)]
+            rolls = [rng.randint(1, 6) for _ in range(4)]
+            if TELEMETRY.enabled:
+                TELEMETRY.record_faces(6, rolls, rng)
             rolls.sort()
             score = sum(rolls[1:])  # Drop the lowest
             scores.append(score)
         return scores
     
     @staticmethod
-    def roll_d20():
+    def roll_ability_scores_many(count, rng=None):
+        """
+        Roll count sets of six ability scores in one batch, sampling each
+        score from the exact 4d6-drop-lowest distribution.
+        Returns a list of count lists of six scores.
+        """
+        scores = ability_score_table().draw_many(6 * count, rng)
+        return [scores[i:i + 6] for i in range(0, 6 * count, 6)]
+    
+    @staticmethod
+    def roll_d20(rng=None):
         """Roll a single d20."""
-        return random.randint(1, 20)
+        return _roll_die(20, rng)
     
     @staticmethod
-    def roll_d6():
+    def roll_d6(rng=None):
         """Roll a single d6."""
-        return random.randint(1, 6)
+        return _roll_die(6, rng)
     
     @staticmethod
-    def roll_d4():
+    def roll_d4(rng=None):
         """Roll a single d4."""
-        return random.randint(1, 4)
+        return _roll_die(4, rng)
     
     @staticmethod
-    def roll_d8():
+    def roll_d8(rng=None):
         """Roll a single d8."""
-        return random.randint(1, 8)
+        return _roll_die(8, rng)
     
     @staticmethod
-    def roll_d10():
+    def roll_d10(rng=None):
         """Roll a single d10."""
-        return random.randint(1, 10)
+        return _roll_die(10, rng)
     
     @staticmethod
-    def roll_d12():
+    def roll_d12(rng=None):
         """Roll a single d12."""
-        return random.randint(1, 12)
+        return _roll_die(12, rng)
     
     @staticmethod
     def is_critical_hit(roll):
@@ -105,3 +337,87 @@ class DiceRoller:
     def is_critical_miss(roll):
         """Check if a d20 roll is a critical miss (natural 1)."""
         return roll == 1
+
+class WeightedTable:
+    """
+    A weighted random table with O(1) draws (Vose's alias method).
+    
+    The alias tables are built once; each draw then costs one uniform and one
+    comparison however many entries the table has.
+    """
+    
+    def __init__(self, entries):
+        """entries: a dict or iterable of (value, weight) pairs with weights >= 0."""
+        if isinstance(entries, dict):
+            entries = entries.items()
+        entries = [(value, weight) for value, weight in entries]
+        if not entries:
+            raise ValueError("A weighted table needs at least one entry")
+        if any(weight < 0 for _, weight in entries):
+            raise ValueError("Weights cannot be negative")
+        
+        self.values = tuple(value for value, _ in entries)
+        self.weights = tuple(weight for _, weight in entries)
+        self.total_weight = sum(self.weights)
+        if self.total_weight <= 0:
+            raise ValueError("At least one weight must be positive")
+        
+        size = len(entries)
+        scaled = [weight * size / self.total_weight for weight in self.weights]
+        prob = [1.0] * size
+        alias = list(range(size))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            prob[low] = scaled[low]
+            alias[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+        # Anything left over is full up to rounding error
+        self._prob = tuple(prob)
+        self._alias = tuple(alias)
+        self._numpy_tables = None
+    
+    def __len__(self):
+        return len(self.values)
+    
+    def items(self):
+        """Return (value, weight) pairs."""
+        return list(zip(self.values, self.weights))
+    
+    def probability(self, value):
+        """Chance that a draw returns value."""
+        return sum(w for v, w in zip(self.values, self.weights) if v == value) / self.total_weight
+    
+    def draw(self, rng=None):
+        """Draw one value."""
+        scaled = (rng or default_rng()).random() * len(self._prob)
+        index = int(scaled)
+        if scaled - index < self._prob[index]:
+            return self.values[index]
+        return self.values[self._alias[index]]
+    
+    def draw_many(self, count, rng=None):
+        """Draw count values in one batch, returned as a list."""
+        rng = rng or default_rng()
+        generator = rng.numpy_generator() if np is not None else None
+        if generator is None:
+            return [self.draw(rng) for _ in range(count)]
+        
+        if self._numpy_tables is None:
+            self._numpy_tables = (np.array(self._prob), np.array(self._alias))
+        prob, alias = self._numpy_tables
+        scaled = generator.random(count) * len(prob)
+        indices = scaled.astype(np.int64)
+        chosen = np.where(scaled - indices < prob[indices], indices, alias[indices])
+        values = self.values
+        return [values[i] for i in chosen.tolist()]
+
+@lru_cache(maxsize=None)
+def ability_score_table():
+    """Exact 4d6-drop-lowest score distribution as a WeightedTable (built once)."""
+    counts = [0] * 19
+    for rolls in product(range(1, 7), repeat=4):
+        counts[sum(rolls) - min(rolls)] += 1
+    return WeightedTable([(score, counts[score]) for score in range(3, 19)])
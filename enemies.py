@@ -1,11 +1,18 @@
 """Enemy and monster classes for the D&D-style game."""
 
-import random
-from dice import DiceRoller
+import json
+import os
+
+from dice import DiceRoller, compile_dice
+from rng import default_rng
+from traits import NO_HOOKS
 
 class Enemy:
     """Base enemy class."""
     
+    # Enemies have no traits
+    hooks = NO_HOOKS
+    
     def __init__(self, name, level, base_stats):
         self.name = name
         self.level = level
@@ -22,9 +29,14 @@ class Enemy:
         self.max_hp = base_stats.get('hp', 10)
         self.current_hp = self.max_hp
         self.armor_class = base_stats.get('ac', 10)
-        self.damage_dice = base_stats.get('damage', '1d6')
+        self.damage_dice = compile_dice(base_stats.get('damage', '1d6'))
         self.xp_value = base_stats.get('xp', level * 100)
         self.gold_drop = base_stats.get('gold', level * 10)
+        
+        # Status effects: started every fight, put on the target by a damaging hit, in force now
+        self.combat_effects = tuple(base_stats.get('effects', ()))
+        self.on_hit = base_stats.get('on_hit')
+        self.status_effects = {}
     
     def get_modifier(self, stat_name):
         """Calculate ability modifier from stat."""
@@ -37,6 +49,12 @@ class Enemy:
         self.current_hp = max(0, self.current_hp - actual_damage)
         return actual_damage
     
+    def heal(self, amount):
+        """Restore HP up to the maximum."""
+        actual_healing = min(amount, max(0, self.max_hp - self.current_hp))
+        self.current_hp += actual_healing
+        return actual_healing
+    
     def is_alive(self):
         """Check if enemy is still alive."""
         return self.current_hp > 0
@@ -46,7 +64,7 @@ class Enemy:
         return self.get_modifier('strength')
     
     def get_attack_damage(self):
-        """Get attack damage dice."""
+        """Get attack damage dice as a compiled DiceExpression."""
         return self.damage_dice
     
     def __str__(self):
@@ -107,6 +125,7 @@ ENEMY_TEMPLATES = {
         'hp': 18,
         'ac': 13,
         'damage': '1d4+1',
+        'on_hit': ('poison', 3, 1),  # Toxic thorns
         'xp': 50,
         'gold': 0,
     },
@@ -248,20 +267,101 @@ def create_enemy(enemy_type, level=None):
     enemy_level = level if level else 1
     return Enemy(template['name'], enemy_level, template)
 
-def generate_random_encounter(player_level, player_gear_level=0):
+# Calibrated encounters written by calibrate.py, and the format it writes
+ENCOUNTER_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'encounter_table.json')
+TABLE_VERSION = 1
+
+# At a bias of +-1 (see player_stats.PlayerStats.difficulty): levels the
+# encounter moves up or down, and how strongly the pick within a
+# calibrated cell leans to its hardest or easiest groups (1: no lean)
+BIAS_LEVELS = 1
+BIAS_SKEW = 3
+
+class EncounterTable:
+    """
+    Calibrated encounters by (class name, player level, gear level).
+    Levels outside the calibrated range use the nearest calibrated one.
+    """
+    
+    def __init__(self, data):
+        if data.get('version') != TABLE_VERSION:
+            raise ValueError(f"Not a version {TABLE_VERSION} encounter table")
+        self.target = data['target']
+        self.min_level, self.max_level = data['levels']
+        self.min_gear, self.max_gear = data['gear']
+        # Class name -> [level][gear] -> tuple of (enemy type, count, enemy level), hardest first
+        self.cells = {
+            name: [[tuple((enemy, count, level) for enemy, count, level, _ in sorted(mixes, key=lambda mix: mix[3]))
+                    for mixes in row]
+                   for row in rows]
+            for name, rows in data['classes'].items()
+        }
+    
+    @classmethod
+    def load(cls, path=ENCOUNTER_TABLE_PATH):
+        """Read a table written by calibrate.py; None if there is no file."""
+        try:
+            with open(path) as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            return None
+    
+    def lookup(self, char_class, player_level, gear_level):
+        """The encounters for a cell, or None for a class that was not calibrated."""
+        rows = self.cells.get(char_class)
+        if rows is None:
+            return None
+        level = min(max(player_level, self.min_level), self.max_level)
+        gear = min(max(gear_level, self.min_gear), self.max_gear)
+        return rows[level - self.min_level][gear - self.min_gear] or None
+
+# The table generate_random_encounter uses; loaded on first use (False: not yet)
+_encounter_table = False
+
+def default_encounter_table():
+    """The calibrated table shipped at ENCOUNTER_TABLE_PATH, or None."""
+    global _encounter_table
+    if _encounter_table is False:
+        _encounter_table = EncounterTable.load()
+    return _encounter_table
+
+def generate_random_encounter(player_level, player_gear_level=0, rng=None, char_class=None, table=None,
+                              bias=0.0):
     """Generate a random encounter based on player level and gear.
     
+    With the player's class name, encounters come from the calibrated
+    EncounterTable (see calibrate.py): one of the enemy groups a player of
+    that class, level and gear beats at the table's target rate. Without
+    it, or for a cell not in the table, hand-tuned tiers are used.
+    
     Args:
         player_level: Player's character level
         player_gear_level: Average item level of player's equipped gear (0-5)
+        rng: Random stream to draw from (defaults to the thread's stream)
+        char_class: Name of the player's class (e.g. player.char_class.name)
+        table: EncounterTable to use (defaults to the shipped one)
+        bias: -1 (much easier) to 1 (much harder), e.g. from
+              PlayerStats.difficulty(); 0 leaves the odds alone
     """
+    rng = rng or default_rng()
+    level_shift = round(bias * BIAS_LEVELS)
+    
+    if char_class is not None:
+        table = table or default_encounter_table()
+        mixes = table.lookup(char_class, player_level + level_shift, player_gear_level) if table else None
+        if mixes:
+            # Cells run hardest first: a positive bias leans towards the front
+            pick = rng.random() ** (BIAS_SKEW ** bias)
+            enemy_type, count, level = mixes[int(pick * len(mixes))]
+            return [create_enemy(enemy_type, level) for _ in range(count)]
+    
     # Determine number of enemies
-    num_enemies = random.randint(1, min(3, player_level + 1))
+    num_enemies = rng.randint(1, min(3, player_level + 1))
     
     # Calculate effective encounter level based on gear
     # Higher gear = higher chance of stronger enemies
     gear_bonus = player_gear_level * 0.3  # Each gear level adds 30% to encounter level
-    encounter_level = player_level + int(player_level * gear_bonus)
+    encounter_level = max(1, player_level + int(player_level * gear_bonus) + level_shift)
     
     # Select appropriate enemy types based on encounter level
     if encounter_level <= 2:
@@ -275,7 +375,7 @@ def generate_random_encounter(player_level, player_gear_level=0):
     
     enemies = []
     for _ in range(num_enemies):
-        enemy_type = random.choice(enemy_types)
+        enemy_type = rng.choice(enemy_types)
         enemy = create_enemy(enemy_type, encounter_level)
         enemies.append(enemy)
     
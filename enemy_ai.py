@@ -0,0 +1,122 @@
+"""Searching enemy AI for the D&D-style game."""
+
+import time
+
+from combat import ENEMY_ACTIONS
+from probability import attack_distribution
+
+# Wall-clock seconds one decision may take
+DECISION_BUDGET = 0.05
+
+# Deepest search tried, in enemy turns
+MAX_DEPTH = 4
+
+# Transposition table entries kept before it is cleared
+TABLE_SIZE = 200000
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the decision budget runs out."""
+
+class ExpectimaxPolicy:
+    """
+    Enemy policy that picks the action in ENEMY_ACTIONS with the best
+    expected outcome a few turns ahead.
+
+    The search alternates this enemy's choice (max) with the dice of its
+    attack and of the player's reply (chance, exact distributions from
+    probability.attack_distribution). It assumes the player keeps
+    attacking this enemy and ignores other enemies, which keeps the state
+    down to (player HP, enemy HP). Leaves score the HP each side has lost.
+
+    Depth grows one enemy turn at a time (iterative deepening) until
+    max_depth or the budget runs out; the deepest finished search decides,
+    so under load the AI simply looks less far ahead. Values are kept in a
+    transposition table keyed by the fight's stats and both HP totals, and
+    reused across turns.
+    """
+
+    def __init__(self, max_depth=MAX_DEPTH, budget=DECISION_BUDGET, actions=None):
+        self.max_depth = max_depth
+        self.budget = budget
+        self.actions = tuple(actions or ENEMY_ACTIONS)
+        self.table = {}
+        # Depth the last decision finished (0 if it fell back to 'attack')
+        self.last_depth = 0
+
+    def choose_action(self, combat, enemy):
+        player = combat.player
+        model = self._model(player, enemy)
+        deadline = time.perf_counter() + self.budget
+        if len(self.table) > TABLE_SIZE:
+            self.table.clear()
+
+        best = 'attack'
+        self.last_depth = 0
+        for depth in range(1, self.max_depth + 1):
+            try:
+                best = self._best_action(model, player.current_hp, enemy.current_hp, depth, deadline)[0]
+            except SearchTimeout:
+                break
+            self.last_depth = depth
+        return best
+
+    def _model(self, player, enemy):
+        """Everything the search needs that stays fixed during a fight."""
+        damage_bonus = enemy.get_attack_bonus()
+        enemy_dice = str(enemy.get_attack_damage())
+        key = (player.max_hp, player.get_attack_bonus(), player.armor_class, str(player.get_attack_damage()),
+               enemy.max_hp, damage_bonus, enemy.armor_class, enemy_dice, self.actions)
+        player_hits = list(attack_distribution(key[1], enemy.armor_class, key[3]).items())
+        enemy_hits = []
+        for action in self.actions:
+            to_hit, copies = ENEMY_ACTIONS[action]
+            hits = attack_distribution(damage_bonus + to_hit, player.armor_class, enemy_dice, damage_bonus, copies)
+            enemy_hits.append((action, list(hits.items())))
+        return key, player_hits, enemy_hits
+
+    def _best_action(self, model, player_hp, enemy_hp, depth, deadline):
+        """(action, value) for the enemy to move, searching depth enemy turns."""
+        key, _, enemy_hits = model
+        entry = (key, player_hp, enemy_hp, depth)
+        cached = self.table.get(entry)
+        if cached is not None:
+            return cached
+        if time.perf_counter() > deadline:
+            raise SearchTimeout
+
+        best = None
+        for action, hits in enemy_hits:
+            value = 0.0
+            for damage, prob in hits:
+                if damage >= player_hp:
+                    value += prob  # Player down
+                else:
+                    value += prob * self._reply_value(model, player_hp - damage, enemy_hp, depth, deadline)
+            if best is None or value > best[1]:
+                best = (action, value)
+
+        self.table[entry] = best
+        return best
+
+    def _reply_value(self, model, player_hp, enemy_hp, depth, deadline):
+        """Expected value over the player's attack, then the enemy's next turn."""
+        key, player_hits, _ = model
+        entry = (key, player_hp, enemy_hp, -depth)
+        cached = self.table.get(entry)
+        if cached is not None:
+            return cached
+
+        player_max_hp, enemy_max_hp = key[0], key[4]
+        lost = 1 - player_hp / player_max_hp
+        value = 0.0
+        for damage, prob in player_hits:
+            if damage >= enemy_hp:
+                value -= prob  # Enemy down
+            elif depth == 1:
+                taken = 1 - (enemy_hp - damage) / enemy_max_hp
+                value += prob * (lost - taken) / 2
+            else:
+                value += prob * self._best_action(model, player_hp, enemy_hp - damage, depth - 1, deadline)[1]
+
+        self.table[entry] = value
+        return value
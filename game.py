@@ -65,28 +65,9 @@ def character_creation():
     # Create character
     character = Character(name, race, char_class)
     
-    # Assign rolled scores
-    character.strength = scores[0]
-    character.dexterity = scores[1]
-    character.constitution = scores[2]
-    character.intelligence = scores[3]
-    character.wisdom = scores[4]
-    character.charisma = scores[5]
-    
-    # Apply racial bonuses
-    for stat, bonus in race.stat_bonuses.items():
-        current = getattr(character, stat)
-        setattr(character, stat, current + bonus)
-    
-    # Recalculate HP and AC
-    character.max_hp = character.calculate_max_hp()
-    character.current_hp = character.max_hp
-    character.armor_class = 10 + character.get_modifier('dexterity')
-    
-    # Equip starting weapon
-    weapons = [item for item in character.inventory if isinstance(item, dict) and 'damage' in item]
-    if weapons:
-        character.equipped_weapon = weapons[0]
+    # Assign rolled scores, apply racial bonuses and equip starting weapon
+    character.assign_ability_scores(scores)
+    character.equip_starting_weapon()
     
     print("\n" + "="*50)
     print("CHARACTER CREATED!")
@@ -1,5 +1,7 @@
 """Items and inventory management for the D&D-style game."""
 
+from dice import WeightedTable
+
 class Item:
     """Base class for items."""
     
@@ -11,20 +13,24 @@ class Item:
 class Weapon(Item):
     """Weapon item with damage dice."""
     
-    def __init__(self, name, description, value, damage, finesse=False):
+    def __init__(self, name, description, value, damage, finesse=False, traits=()):
         super().__init__(name, description, value)
         self.damage = damage
         self.finesse = finesse
+        self.traits = traits
     
     def to_dict(self):
         """Convert to dictionary for compatibility."""
-        return {
+        item = {
             'name': self.name,
             'damage': self.damage,
             'finesse': self.finesse,
             'value': self.value,
             'description': self.description
         }
+        if self.traits:
+            item['traits'] = list(self.traits)
+        return item
 
 class Armor(Item):
     """Armor item with AC bonus."""
@@ -68,6 +74,8 @@ WEAPONS = {
     'mace': Weapon('Mace', 'A heavy bludgeoning weapon', 50, '1d6', finesse=False),
     'staff': Weapon('Staff', 'A wooden walking staff', 10, '1d6', finesse=False),
     'warhammer': Weapon('Warhammer', 'A heavy war hammer', 150, '1d10', finesse=False),
+    'nail_bat': Weapon('Nail Bat', 'A baseball bat studded with nails (Brutal: +1 damage)', 200, '1d8',
+                       finesse=False, traits=('brutal',)),
 }
 
 ARMOR = {
@@ -81,8 +89,31 @@ CONSUMABLES = {
     'health_potion': Consumable('Health Potion', 'Restores 20 HP', 50, 'healing', 20),
     'greater_health_potion': Consumable('Greater Health Potion', 'Restores 50 HP', 150, 'healing', 50),
     'antidote': Consumable('Antidote', 'Cures poison', 25, 'cure_poison', True),
+    'regeneration_tonic': Consumable('Regeneration Tonic', 'Regenerates 3 HP a round for 5 rounds', 75,
+                                     'applies', ('regeneration', 5, 3)),
+    'flash_bang': Consumable('Flash Bang', 'Stuns every enemy until the end of next round', 60,
+                             'inflicts', ('stun', 1)),
 }
 
+# Loot tables: keys into CONSUMABLES, None means nothing is found
+VICTORY_LOOT = WeightedTable([
+    ('health_potion', 30),
+    (None, 70),
+])
+
+TREASURE_LOOT = WeightedTable([
+    ('health_potion', 25),
+    ('greater_health_potion', 25),
+    (None, 50),
+])
+
+def roll_loot(table, rng=None):
+    """Draw from a loot table; returns an item dict or None."""
+    key = table.draw(rng)
+    if key is None:
+        return None
+    return CONSUMABLES[key].to_dict()
+
 class Shop:
     """Shop for buying and selling items."""
     
@@ -0,0 +1,119 @@
+"""
+Streaming per-session player statistics for adaptive difficulty.
+
+PlayerStats keeps exponentially weighted moving averages (EWMAs) of how
+hard the player's fights have been: the share of max HP lost per round,
+potions drunk per fight, and how often a fight leaves them near death.
+Each CombatEvent updates a few floats in O(1), so a session's history
+costs the same memory after one fight or a thousand. difficulty()
+condenses the averages into a bias for generate_random_encounter.
+"""
+
+from combat import NULL_SINK
+
+# Weight of the newest round in the damage average
+ROUND_WEIGHT = 0.2
+
+# Weight of the newest fight in the potion and near-death averages
+FIGHT_WEIGHT = 0.3
+
+# Below this fraction of max HP counts as near death
+NEAR_DEATH = 0.25
+
+# What an encounter tuned for the player looks like: share of max HP lost
+# per round, potions per fight and fights with a brush with death
+EXPECTED_DAMAGE_SHARE = 0.12
+EXPECTED_POTIONS = 0.5
+EXPECTED_NEAR_DEATHS = 0.2
+
+# Fights seen before difficulty() moves away from 0
+WARM_UP_FIGHTS = 2
+
+def _ewma(average, value, weight):
+    return value if average is None else average + weight * (value - average)
+
+def _score(value, expected):
+    """+1 for none at all, 0 as expected, down to -1 at twice expected or more."""
+    return max(-1.0, min(1.0, 1 - value / expected))
+
+class PlayerStats:
+    """Running averages of one player's fights (see the module docstring)."""
+
+    __slots__ = ('damage_share', 'potions', 'near_deaths', 'fights',
+                 '_round_damage', '_round_open', '_fight_potions', '_fight_near_death')
+
+    def __init__(self):
+        # EWMAs; None until the first round or fight has been seen
+        self.damage_share = None
+        self.potions = None
+        self.near_deaths = None
+        self.fights = 0
+        # The round and fight in progress
+        self._round_damage = 0.0
+        self._round_open = False
+        self._fight_potions = 0
+        self._fight_near_death = False
+
+    def observe(self, player, event):
+        """Update from one CombatEvent of a fight player is in."""
+        kind = event.type
+        if kind == 'round':
+            self._close_round()
+            self._round_open = True
+        elif kind in ('hit', 'critical_hit', 'effect_damage'):
+            # Attacks name the player as the target; effects as the actor
+            victim = event.actor if kind == 'effect_damage' else event.target
+            if victim == player.name and event.damage:
+                self._round_damage += event.damage / player.max_hp
+                if 0 < player.current_hp <= NEAR_DEATH * player.max_hp:
+                    self._fight_near_death = True
+        elif kind == 'item':
+            if event.actor == player.name and event.damage is not None:
+                self._fight_potions += 1
+        elif kind in ('victory', 'defeat', 'flee'):
+            self._close_round()
+            self._close_fight()
+
+    def _close_round(self):
+        if self._round_open:
+            self.damage_share = _ewma(self.damage_share, self._round_damage, ROUND_WEIGHT)
+        self._round_damage = 0.0
+        self._round_open = False
+
+    def _close_fight(self):
+        self.fights += 1
+        self.potions = _ewma(self.potions, self._fight_potions, FIGHT_WEIGHT)
+        self.near_deaths = _ewma(self.near_deaths, float(self._fight_near_death), FIGHT_WEIGHT)
+        self._fight_potions = 0
+        self._fight_near_death = False
+
+    def difficulty(self):
+        """
+        Encounter bias in [-1, 1]: positive when fights have been easier
+        than expected (ask for harder ones), negative when they have been
+        harder, 0 until WARM_UP_FIGHTS fights have been seen.
+        """
+        if self.fights < WARM_UP_FIGHTS:
+            return 0.0
+        return (_score(self.damage_share or 0.0, EXPECTED_DAMAGE_SHARE)
+                + _score(self.potions, EXPECTED_POTIONS)
+                + _score(self.near_deaths, EXPECTED_NEAR_DEATHS)) / 3
+
+    def watch(self, player, sink=None):
+        """A sink that updates these stats and passes each event on to sink."""
+        return StatsSink(self, player, sink)
+
+class StatsSink:
+    """Combat sink feeding a PlayerStats before passing events on."""
+
+    def __init__(self, stats, player, sink=None):
+        self.stats = stats
+        self.player = player
+        self.sink = sink or NULL_SINK
+
+    def emit(self, event):
+        self.stats.observe(self.player, event)
+        self.sink.emit(event)
+
+    def end_turn(self):
+        self.sink.end_turn()
@@ -0,0 +1,399 @@
+"""Exact probability distributions for dice rolls in the D&D-style game."""
+
+from bisect import bisect_left
+from collections import namedtuple
+from functools import lru_cache
+from math import comb
+
+from dice import compile_dice
+
+# Number of distinct distributions kept at once
+DISTRIBUTION_CACHE_SIZE = 512
+
+# Solved duel state tables kept at once (each covers a whole fight)
+DUEL_TABLE_CACHE_SIZE = 32
+
+class Distribution:
+    """
+    Exact probability mass function over a contiguous range of integers.
+    probs[i] is the probability of the outcome offset + i.
+    """
+
+    __slots__ = ('offset', 'probs', '_cdf')
+
+    def __init__(self, offset, probs):
+        # Trim zero-probability tails so minimum/maximum are real outcomes
+        start, end = 0, len(probs)
+        while start < end and probs[start] == 0:
+            start += 1
+        while end > start and probs[end - 1] == 0:
+            end -= 1
+        if start == end:
+            raise ValueError("A distribution needs at least one possible outcome")
+        self.offset = offset + start
+        self.probs = tuple(probs[start:end])
+
+        cdf = []
+        running = 0.0
+        for p in self.probs:
+            running += p
+            cdf.append(running)
+        self._cdf = tuple(cdf)
+
+    @classmethod
+    def point(cls, value):
+        """Distribution that is always value."""
+        return cls(value, (1.0,))
+
+    @classmethod
+    def from_counts(cls, offset, counts):
+        """Build a distribution from exact outcome counts."""
+        total = sum(counts)
+        return cls(offset, [c / total for c in counts])
+
+    @classmethod
+    def mixture(cls, weighted):
+        """Combine (weight, distribution) pairs; weights must sum to 1."""
+        weighted = [(w, d) for w, d in weighted if w > 0]
+        low = min(d.minimum for _, d in weighted)
+        high = max(d.maximum for _, d in weighted)
+        probs = [0.0] * (high - low + 1)
+        for weight, dist in weighted:
+            base = dist.offset - low
+            for i, p in enumerate(dist.probs):
+                probs[base + i] += weight * p
+        return cls(low, probs)
+
+    @property
+    def minimum(self):
+        return self.offset
+
+    @property
+    def maximum(self):
+        return self.offset + len(self.probs) - 1
+
+    @property
+    def mean(self):
+        return sum((self.offset + i) * p for i, p in enumerate(self.probs))
+
+    @property
+    def variance(self):
+        mean = self.mean
+        return sum((self.offset + i - mean) ** 2 * p for i, p in enumerate(self.probs))
+
+    @property
+    def std_dev(self):
+        return self.variance ** 0.5
+
+    def items(self):
+        """Iterate (outcome, probability) pairs in increasing order."""
+        return ((self.offset + i, p) for i, p in enumerate(self.probs))
+
+    def probability(self, value):
+        """P(X == value)."""
+        index = value - self.offset
+        if 0 <= index < len(self.probs):
+            return self.probs[index]
+        return 0.0
+
+    def cdf(self, value):
+        """P(X <= value)."""
+        index = value - self.offset
+        if index < 0:
+            return 0.0
+        if index >= len(self._cdf):
+            return 1.0
+        return self._cdf[index]
+
+    def prob_at_least(self, value):
+        """P(X >= value)."""
+        return max(0.0, 1.0 - self.cdf(value - 1))
+
+    def percentile(self, pct):
+        """Smallest outcome whose cumulative probability reaches pct (0-100)."""
+        if not 0 <= pct <= 100:
+            raise ValueError("Percentile must be between 0 and 100")
+        # Small tolerance so e.g. the 50th percentile of 2d6 is 7, not 8
+        index = bisect_left(self._cdf, pct / 100 - 1e-12)
+        return self.offset + min(index, len(self.probs) - 1)
+
+    def shift(self, amount):
+        """Distribution of X + amount."""
+        return Distribution(self.offset + amount, self.probs)
+
+    def negate(self):
+        """Distribution of -X."""
+        return Distribution(-self.maximum, self.probs[::-1])
+
+    def clamp_min(self, floor):
+        """Distribution of max(X, floor)."""
+        if self.minimum >= floor:
+            return self
+        if self.maximum <= floor:
+            return Distribution.point(floor)
+        cut = floor - self.offset
+        return Distribution(floor, (self.cdf(floor),) + self.probs[cut + 1:])
+
+    def __add__(self, other):
+        """Distribution of the sum of two independent variables."""
+        if isinstance(other, int):
+            return self.shift(other)
+        return Distribution(self.offset + other.offset, _convolve(self.probs, other.probs))
+
+    __radd__ = __add__
+
+    def __repr__(self):
+        return f"Distribution(min={self.minimum}, max={self.maximum}, mean={self.mean:.3f})"
+
+def _convolve(left, right):
+    """Convolve two sequences of weights (counts or probabilities)."""
+    result = [0] * (len(left) + len(right) - 1)
+    for i, a in enumerate(left):
+        if a:
+            for j, b in enumerate(right):
+                result[i + j] += a * b
+    return result
+
+@lru_cache(maxsize=None)
+def _sum_counts(num_dice, die_size):
+    """Exact outcome counts for the sum of num_dice dice, starting at num_dice."""
+    if num_dice == 1:
+        return (1,) * die_size
+    half = num_dice // 2
+    return tuple(_convolve(_sum_counts(half, die_size), _sum_counts(num_dice - half, die_size)))
+
+@lru_cache(maxsize=None)
+def _keep_counts(num_dice, die_size, keep, keep_highest):
+    """
+    Exact outcome counts for the kept dice of NdS keep-highest/lowest K,
+    starting at keep. Faces are visited from the kept end inward, choosing
+    how many dice show each face, so the work is polynomial in N and S.
+    """
+    faces = range(die_size, 0, -1) if keep_highest else range(1, die_size + 1)
+    # (dice placed, dice kept) -> {kept sum: number of ordered outcomes}
+    states = {(0, 0): {0: 1}}
+    for position, face in enumerate(faces):
+        last_face = position == die_size - 1
+        next_states = {}
+        for (placed, kept), sums in states.items():
+            remaining = num_dice - placed
+            choices = [remaining] if last_face else range(remaining + 1)
+            for showing in choices:
+                ways = comb(remaining, showing)
+                newly_kept = min(showing, keep - kept)
+                key = (placed + showing, kept + newly_kept)
+                bucket = next_states.setdefault(key, {})
+                added = face * newly_kept
+                for total, count in sums.items():
+                    bucket[total + added] = bucket.get(total + added, 0) + count * ways
+        states = next_states
+
+    sums = states[(num_dice, keep)]
+    return tuple(sums.get(total, 0) for total in range(keep, keep * die_size + 1))
+
+def _group_distribution(num_dice, die_size, keep, keep_highest):
+    if keep == num_dice:
+        return Distribution.from_counts(num_dice, _sum_counts(num_dice, die_size))
+    return Distribution.from_counts(keep, _keep_counts(num_dice, die_size, keep, keep_highest))
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def dice_distribution(dice_string):
+    """Exact distribution of the total of any notation DiceRoller accepts."""
+    expression = compile_dice(dice_string)
+    result = Distribution.point(expression.modifier)
+    for sign, num_dice, die_size, keep, keep_highest in expression.groups:
+        group = _group_distribution(num_dice, die_size, keep, keep_highest)
+        result = result + (group if sign > 0 else group.negate())
+    return result
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def critical_distribution(dice_string):
+    """
+    Exact distribution of a critical hit's dice, which Combat rolls twice
+    (modifier included) before adding the attack bonus.
+    """
+    single = dice_distribution(dice_string)
+    return single + single
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def damage_distribution(dice_string, attack_bonus=0, critical=False):
+    """Exact distribution of damage dealt by a hit, as applied by take_damage."""
+    dice = critical_distribution(dice_string) if critical else dice_distribution(dice_string)
+    return dice.shift(attack_bonus).clamp_min(0)
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def _repeated_distribution(dice_string, copies):
+    """Exact distribution of dice_string rolled copies times and summed."""
+    single = dice_distribution(dice_string)
+    result = single
+    for _ in range(copies - 1):
+        result = result + single
+    return result
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def attack_distribution(attack_bonus, armor_class, dice_string, damage_bonus=None, copies=1):
+    """
+    Exact distribution of the damage one attack deals, following the rules in
+    Combat.player_attack and Combat.enemy_turn: a natural 20 always crits,
+    a natural 1 always misses, otherwise d20 + bonus must meet the AC.
+    A miss deals 0 damage.
+
+    damage_bonus is added to the damage (defaults to attack_bonus) and
+    copies is how many times a hit rolls the dice (a crit rolls twice as
+    many), for enemy actions like a heavy blow.
+    """
+    if damage_bonus is None:
+        damage_bonus = attack_bonus
+    if copies == 1:
+        hit = damage_distribution(dice_string, damage_bonus)
+        critical = damage_distribution(dice_string, damage_bonus, critical=True)
+    else:
+        hit = _repeated_distribution(dice_string, copies).shift(damage_bonus).clamp_min(0)
+        critical = _repeated_distribution(dice_string, 2 * copies).shift(damage_bonus).clamp_min(0)
+    hit_faces = sum(1 for roll in range(2, 20) if roll + attack_bonus >= armor_class)
+    miss_faces = 18 - hit_faces
+    return Distribution.mixture([
+        ((miss_faces + 1) / 20, Distribution.point(0)),
+        (hit_faces / 20, hit),
+        (1 / 20, critical),
+    ])
+
+def hit_chance(attack_bonus, armor_class):
+    """Probability that an attack hits (including critical hits)."""
+    hit_faces = sum(1 for roll in range(2, 20) if roll + attack_bonus >= armor_class)
+    return (hit_faces + 1) / 20
+
+# Outcome of a 1-vs-1 fight; rounds is the expected number of rounds played
+DuelOutcome = namedtuple('DuelOutcome', ['win', 'lose', 'flee', 'rounds'])
+
+# Terminal values as (P(win), P(flee), rounds still to play)
+_WON = (1.0, 0.0, 0.0)
+_LOST = (0.0, 0.0, 0.0)
+_FLED = (0.0, 1.0, 0.0)
+
+def initiative_chance(player_dexterity_modifier, enemy_dexterity_modifier):
+    """Probability the player acts first (Combat's stable sort gives ties to the player)."""
+    wins = sum(1 for p in range(1, 21) for e in range(1, 21)
+               if p + player_dexterity_modifier >= e + enemy_dexterity_modifier)
+    return wins / 400
+
+@lru_cache(maxsize=DUEL_TABLE_CACHE_SIZE)
+def duel_tables(player_max_hp, player_attack, player_ac, player_dice,
+                enemy_hp, enemy_attack, enemy_ac, enemy_dice,
+                potions=(), heal_below=None, flee_below=None, player_first=True):
+    """
+    Solve every state of a duel with a known turn order.
+
+    Returns (round_start, mid_round): [potions left][player HP][enemy HP]
+    tables of (win, flee, rounds) values at the start of a round and after
+    the first actor's turn, for enemy HP up to enemy_hp. potions is sorted
+    strongest first; with k left, the k weakest remain. See duel_outcome
+    for the rules.
+    """
+    player_hits = list(attack_distribution(player_attack, enemy_ac, player_dice).items())
+    enemy_hits = list(attack_distribution(enemy_attack, player_ac, enemy_dice).items())
+    potions = sorted(potions, reverse=True)
+
+    def player_turn(hp, foe_hp, left, values):
+        """(P(no change), [(prob, value after the turn)]) for the player's turn."""
+        fraction = hp / player_max_hp
+        if flee_below is not None and fraction < flee_below:
+            return 0.0, [(1.0, _FLED)]
+        if heal_below is not None and fraction < heal_below and left:
+            healed = min(player_max_hp, hp + potions[len(potions) - left])
+            return 0.0, [(1.0, values[left - 1][healed][foe_hp])]
+        stay = 0.0
+        outcomes = []
+        for damage, prob in player_hits:
+            if damage == 0:
+                stay = prob
+            elif damage >= foe_hp:
+                outcomes.append((prob, _WON))
+            else:
+                outcomes.append((prob, values[left][hp][foe_hp - damage]))
+        return stay, outcomes
+
+    def enemy_turn(hp, foe_hp, left, values):
+        """(P(no change), [(prob, value after the turn)]) for the enemy's turn."""
+        stay = 0.0
+        outcomes = []
+        for damage, prob in enemy_hits:
+            if damage == 0:
+                stay = prob
+            elif damage >= hp:
+                outcomes.append((prob, _LOST))
+            else:
+                outcomes.append((prob, values[left][hp - damage][foe_hp]))
+        return stay, outcomes
+
+    first_turn, second_turn = (player_turn, enemy_turn) if player_first else (enemy_turn, player_turn)
+
+    # States only move to lower HP or fewer potions, apart from a round in
+    # which nobody changes anything, so they are filled in that order and
+    # the self-loop is summed as a geometric series.
+    round_start = [[[None] * (enemy_hp + 1) for _ in range(player_max_hp + 1)] for _ in range(len(potions) + 1)]
+    mid_round = [[[None] * (enemy_hp + 1) for _ in range(player_max_hp + 1)] for _ in range(len(potions) + 1)]
+    for left in range(len(potions) + 1):
+        for hp in range(1, player_max_hp + 1):
+            for foe_hp in range(1, enemy_hp + 1):
+                stay_first, first = first_turn(hp, foe_hp, left, mid_round)
+                stay_second, second = second_turn(hp, foe_hp, left, round_start)
+                loop = 1 - stay_first * stay_second
+                if loop <= 0:
+                    raise ValueError("This fight can never end: neither side can deal damage")
+                r1 = [sum(prob * value[i] for prob, value in first) for i in range(3)]
+                r2 = [sum(prob * value[i] for prob, value in second) for i in range(3)]
+                start = tuple(
+                    ((1.0 if i == 2 else 0.0) + r1[i] + stay_first * r2[i]) / loop for i in range(3)
+                )
+                round_start[left][hp][foe_hp] = start
+                mid_round[left][hp][foe_hp] = tuple(stay_second * start[i] + r2[i] for i in range(3))
+    return round_start, mid_round
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def duel_outcome(player_hp, player_max_hp, player_attack, player_ac, player_dice, player_initiative,
+                 enemy_hp, enemy_attack, enemy_ac, enemy_dice, enemy_initiative,
+                 potions=(), heal_below=None, flee_below=None):
+    """
+    Exact outcome of Combat between one player and one enemy.
+
+    The fight is a Markov chain over (player HP, enemy HP, potions left):
+    each round the initiative winner attacks, then the other side if it
+    still stands. The player follows AttackPolicy: try to flee below
+    flee_below of max HP, drink the strongest of potions (healing amounts)
+    below heal_below, otherwise attack. A failed flee lets the player choose
+    again in the same turn, so a player who decides to flee always escapes
+    that turn. Results are cached by the full stat tuple.
+    """
+    potions = tuple(sorted(potions, reverse=True))
+    player_first = initiative_chance(player_initiative, enemy_initiative)
+    totals = [0.0, 0.0, 0.0]
+    for weight, order in ((player_first, True), (1 - player_first, False)):
+        if weight > 0:
+            round_start, _ = duel_tables(player_max_hp, player_attack, player_ac, player_dice,
+                                         enemy_hp, enemy_attack, enemy_ac, enemy_dice,
+                                         potions, heal_below, flee_below, order)
+            value = round_start[len(potions)][player_hp][enemy_hp]
+            for i in range(3):
+                totals[i] += weight * value[i]
+    win, flee, rounds = totals
+    return DuelOutcome(win, max(0.0, 1 - win - flee), flee, rounds)
+
+def solve_duel(player, enemy, policy=None):
+    """
+    Exact DuelOutcome for a Character against one Enemy, as Combat would
+    play it with an AttackPolicy (the default attacks every turn).
+    Status effects and traits are not modelled.
+    """
+    potions = ()
+    heal_below = getattr(policy, 'heal_below', None)
+    if heal_below is not None:
+        potions = tuple(sorted(item['healing'] for item in player.inventory
+                               if isinstance(item, dict) and 'healing' in item))
+    return duel_outcome(
+        player.current_hp, player.max_hp, player.get_attack_bonus(), player.armor_class,
+        str(player.get_attack_damage()), player.get_modifier('dexterity'),
+        enemy.current_hp, enemy.get_attack_bonus(), enemy.armor_class,
+        str(enemy.get_attack_damage()), enemy.get_modifier('dexterity'),
+        potions, heal_below, getattr(policy, 'flee_below', None),
+    )
@@ -0,0 +1,320 @@
+"""
+Compact binary combat replays for the D&D-style game.
+
+Combat(..., record=True) plays the fight on a fresh RNGStream seeded from
+the caller's stream and notes every decision (player actions, targets and
+items, enemy actions) as one byte each. combat.replay() then returns a
+Replay: the seed, a snapshot of the combatants, the decision bytes and the
+outcome, with a CRC-32 of every CombatEvent. Re-running it rebuilds the
+combatants, feeds the same seed and decisions back in and must produce the
+same events.
+
+Run with: python3 replay.py FILE [TURN]
+"""
+
+import json
+import struct
+import sys
+import zlib
+from collections import namedtuple
+
+from character import Character, RACES, CLASSES
+from combat import Combat, ENEMY_ACTIONS, NULL_SINK, PacedPrinter
+from enemies import Enemy
+from rng import RNGStream
+
+# File signature and format version
+MAGIC = b'CBRP'
+VERSION = 1
+
+# magic, version, seed, snapshot length | decision count | result, rounds, event checksum
+HEADER = struct.Struct('<4sBQI')
+COUNT = struct.Struct('<I')
+FOOTER = struct.Struct('<BHI')
+
+# Outcome codes stored in the footer
+RESULTS = ('victory', 'defeat', 'fled')
+
+# Decision codes: player actions, then enemy actions in ENEMY_ACTIONS order
+PLAYER_ACTIONS = ('attack', 'item', 'flee')
+ENEMY_ACTION_NAMES = tuple(ENEMY_ACTIONS)
+
+# Item choice meaning "cancel"
+NO_ITEM = 255
+
+class ReplayError(Exception):
+    """A replay is malformed or no longer matches the rules."""
+
+class Replay(namedtuple('Replay', ['seed', 'setup', 'decisions', 'result', 'rounds', 'checksum'])):
+    """One recorded fight; setup is the combatant snapshot from snapshot_combatants()."""
+
+    __slots__ = ()
+
+    def to_bytes(self):
+        setup = zlib.compress(json.dumps(self.setup, separators=(',', ':')).encode())
+        return b''.join([
+            HEADER.pack(MAGIC, VERSION, self.seed, len(setup)), setup,
+            COUNT.pack(len(self.decisions)), bytes(self.decisions),
+            FOOTER.pack(RESULTS.index(self.result), self.rounds, self.checksum),
+        ])
+
+    @classmethod
+    def from_bytes(cls, data):
+        try:
+            magic, version, seed, setup_length = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION:
+                raise ReplayError(f"Not a version {VERSION} combat replay")
+            offset = HEADER.size
+            setup = json.loads(zlib.decompress(data[offset:offset + setup_length]))
+            offset += setup_length
+            count, = COUNT.unpack_from(data, offset)
+            offset += COUNT.size
+            decisions = bytes(data[offset:offset + count])
+            result, rounds, checksum = FOOTER.unpack_from(data, offset + count)
+            if result >= len(RESULTS):
+                raise ValueError(f"unknown result code {result}")
+        except (struct.error, zlib.error, ValueError) as e:
+            raise ReplayError(f"Corrupt replay: {e}") from e
+        return cls(seed, setup, decisions, RESULTS[result], rounds, checksum)
+
+def _key_of(value, table, kind):
+    for key, entry in table.items():
+        if entry is value:
+            return key
+    raise ReplayError(f"Only {kind} from the standard tables can be recorded")
+
+def snapshot_combatants(player, enemies):
+    """JSON-ready copy of everything about the combatants that combat reads."""
+    scores = [getattr(player, stat) for stat in
+              ('strength', 'dexterity', 'constitution', 'intelligence', 'wisdom', 'charisma')]
+    snapshot = {
+        'player': {
+            'name': player.name,
+            'race': _key_of(player.race, RACES, 'races'),
+            'class': _key_of(player.char_class, CLASSES, 'classes'),
+            'level': player.level,
+            'scores': scores,
+            'max_hp': player.max_hp,
+            'hp': player.current_hp,
+            'ac': player.armor_class,
+            'weapon': player.equipped_weapon,
+            'armor': player.equipped_armor,
+            'inventory': player.inventory,
+        },
+        'enemies': [{
+            'name': enemy.name,
+            'level': enemy.level,
+            'stats': {
+                'strength': enemy.strength, 'dexterity': enemy.dexterity, 'constitution': enemy.constitution,
+                'intelligence': enemy.intelligence, 'wisdom': enemy.wisdom, 'charisma': enemy.charisma,
+                'hp': enemy.max_hp, 'ac': enemy.armor_class, 'damage': str(enemy.damage_dice),
+                'xp': enemy.xp_value, 'gold': enemy.gold_drop, 'on_hit': enemy.on_hit,
+                'effects': enemy.combat_effects,
+            },
+            'hp': enemy.current_hp,
+        } for enemy in enemies],
+    }
+    # Round-trip now, so later changes to the inventory don't leak in
+    return json.loads(json.dumps(snapshot))
+
+def restore_combatants(setup):
+    """
+    Rebuild (player, enemies) from snapshot_combatants() output. A snapshot
+    the current rules can't rebuild (a race, class or field that no longer
+    exists, damage dice that no longer parse) raises ReplayError.
+    """
+    try:
+        return _restore_combatants(setup)
+    except (KeyError, ValueError, TypeError) as e:
+        raise ReplayError(f"Cannot restore combatants: {e!r}") from e
+
+def _restore_combatants(setup):
+    saved = setup['player']
+    player = Character(saved['name'], RACES[saved['race']], CLASSES[saved['class']])
+    (player.strength, player.dexterity, player.constitution,
+     player.intelligence, player.wisdom, player.charisma) = saved['scores']
+    player.level = saved['level']
+    player.max_hp = saved['max_hp']
+    player.current_hp = saved['hp']
+    player.armor_class = saved['ac']
+    player.inventory = saved['inventory']
+    player.equipped_weapon = saved['weapon']
+    player.equipped_armor = saved['armor']
+
+    enemies = []
+    for saved in setup['enemies']:
+        enemy = Enemy(saved['name'], saved['level'], saved['stats'])
+        enemy.current_hp = saved['hp']
+        enemies.append(enemy)
+    return player, enemies
+
+class ChecksumSink:
+    """Sink that keeps a CRC-32 of every event and counts turns before passing events on."""
+
+    def __init__(self, sink=None, stop_at_turn=None):
+        self.sink = sink or NULL_SINK
+        self.checksum = 0
+        self.turns = 0
+        self.stop_at_turn = stop_at_turn
+
+    def emit(self, event):
+        if event.type == 'turn':
+            self.turns += 1
+            if self.turns == self.stop_at_turn:
+                raise _Paused
+        self.checksum = zlib.crc32(repr(tuple(event)).encode(), self.checksum)
+        self.sink.emit(event)
+
+    def end_turn(self):
+        self.sink.end_turn()
+
+class _Paused(Exception):
+    """Raised by ChecksumSink to stop a replay at the start of a turn."""
+
+class _RecordingPolicy:
+    """Passes the player's choices through and notes each one."""
+
+    def __init__(self, policy, decisions):
+        self.policy = policy
+        self.decisions = decisions
+
+    def choose_action(self, combat):
+        action = self.policy.choose_action(combat)
+        if combat.policy is not self:
+            # The policy handed the fight on (e.g. to auto-battle); keep recording it
+            self.policy = combat.policy
+            combat.policy = self
+        self.decisions.append(PLAYER_ACTIONS.index(action))
+        return action
+
+    def choose_target(self, combat, targets):
+        target = self.policy.choose_target(combat, targets)
+        self.decisions.append(next(i for i, enemy in enumerate(targets) if enemy is target))
+        return target
+
+    def choose_item(self, combat, items):
+        item = self.policy.choose_item(combat, items)
+        self.decisions.append(NO_ITEM if item is None else next(i for i, it in enumerate(items) if it is item))
+        return item
+
+class _RecordingEnemyPolicy:
+    """Passes the enemies' choices through and notes each one."""
+
+    def __init__(self, policy, decisions):
+        self.policy = policy
+        self.decisions = decisions
+
+    def choose_action(self, combat, enemy):
+        action = self.policy.choose_action(combat, enemy)
+        self.decisions.append(len(PLAYER_ACTIONS) + ENEMY_ACTION_NAMES.index(action))
+        return action
+
+class ReplayRecorder:
+    """Set up by Combat(record=True); see the module docstring."""
+
+    def __init__(self, combat):
+        self.seed = combat.rng.getrandbits(64)
+        self.setup = snapshot_combatants(combat.player, combat.enemies)
+        self.decisions = bytearray()
+        self.sink = ChecksumSink(combat.sink)
+        combat.rng = RNGStream(self.seed)
+        combat.sink = self.sink
+        combat.policy = _RecordingPolicy(combat.policy, self.decisions)
+        combat.enemy_policy = _RecordingEnemyPolicy(combat.enemy_policy, self.decisions)
+
+    def replay(self, combat):
+        if combat.result is None:
+            raise ReplayError("The fight is not over yet")
+        return Replay(self.seed, self.setup, bytes(self.decisions), combat.result, combat.round_number,
+                      self.sink.checksum)
+
+class _DecisionReader:
+    """Hands out recorded decisions in order."""
+
+    def __init__(self, decisions):
+        self.decisions = iter(decisions)
+
+    def next(self, low, high):
+        """The next decision, which must lie in [low, high)."""
+        code = next(self.decisions, None)
+        if code is None:
+            raise ReplayError("The fight asked for more decisions than were recorded")
+        if not low <= code < high:
+            raise ReplayError(f"Recorded decision {code} does not fit here")
+        return code - low
+
+class _ReplayPolicy:
+    """Plays back the player's recorded decisions."""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def choose_action(self, combat):
+        return PLAYER_ACTIONS[self.reader.next(0, len(PLAYER_ACTIONS))]
+
+    def choose_target(self, combat, targets):
+        return targets[self.reader.next(0, len(targets))]
+
+    def choose_item(self, combat, items):
+        code = self.reader.next(0, NO_ITEM + 1)
+        if code == NO_ITEM:
+            return None
+        if code >= len(items):
+            raise ReplayError(f"Recorded item {code} does not exist")
+        return items[code]
+
+class _ReplayEnemyPolicy:
+    """Plays back the enemies' recorded decisions."""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def choose_action(self, combat, enemy):
+        first = len(PLAYER_ACTIONS)
+        return ENEMY_ACTION_NAMES[self.reader.next(first, first + len(ENEMY_ACTION_NAMES))]
+
+def replay_combat(replay, sink=None, stop_at_turn=None):
+    """
+    Re-run a Replay (or its bytes). Returns (combat, checksum).
+    With stop_at_turn=n, stops as turn n begins (turns count from 1) and
+    returns the Combat in that state, for inspection only.
+    """
+    if not isinstance(replay, Replay):
+        replay = Replay.from_bytes(replay)
+    player, enemies = restore_combatants(replay.setup)
+    reader = _DecisionReader(replay.decisions)
+    checksums = ChecksumSink(sink, stop_at_turn)
+    combat = Combat(player, enemies, rng=RNGStream(replay.seed), policy=_ReplayPolicy(reader), sink=checksums,
+                    enemy_policy=_ReplayEnemyPolicy(reader))
+    try:
+        combat.run_combat()
+    except _Paused:
+        pass
+    return combat, checksums.checksum
+
+def verify_replay(replay):
+    """True if re-running the replay gives the recorded result, rounds and events."""
+    try:
+        if not isinstance(replay, Replay):
+            replay = Replay.from_bytes(replay)
+        combat, checksum = replay_combat(replay)
+    except ReplayError:
+        return False
+    return (combat.result, combat.round_number, checksum) == (replay.result, replay.rounds, replay.checksum)
+
+def verify_replays(replays):
+    """Indices of the replays that no longer reproduce (e.g. after a rules change)."""
+    return [i for i, replay in enumerate(replays) if not verify_replay(replay)]
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python3 replay.py FILE [TURN]")
+        sys.exit(1)
+    with open(sys.argv[1], 'rb') as f:
+        recorded = Replay.from_bytes(f.read())
+    turn = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    combat, _ = replay_combat(recorded, PacedPrinter(delay=0), stop_at_turn=turn)
+    if turn is not None:
+        print(f"\n[Paused at turn {turn}: {combat.player.name} HP {combat.player.current_hp}/{combat.player.max_hp}]")
+    else:
+        print("Replay verified." if verify_replay(recorded) else "Replay does NOT match the recorded fight!")
@@ -0,0 +1,57 @@
+"""
+Content-addressed on-disk cache of simulation results.
+
+Each entry is stored under the SHA-256 of everything its numbers depend
+on (see fingerprint()), so an entry never needs invalidating: change an
+input and the key changes with it, and the old entry is simply no longer
+asked for. Delete the directory to reclaim the space.
+"""
+
+import hashlib
+import json
+import os
+
+def _canonical(value):
+    """JSON stand-in for objects json can't encode (definitions, hook functions)."""
+    if callable(value):
+        return f"{value.__module__}.{value.__qualname__}"
+    if hasattr(value, '__dict__'):
+        return {'type': type(value).__name__, **vars(value)}
+    raise TypeError(f"Cannot fingerprint {value!r}")
+
+def fingerprint(inputs):
+    """SHA-256 hex digest of inputs: JSON data, namedtuples, plain objects and functions."""
+    text = json.dumps(inputs, sort_keys=True, separators=(',', ':'), default=_canonical)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+class ResultCache:
+    """A directory of JSON values (e.g. ScenarioStats records), one file per fingerprint."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:] + '.json')
+
+    def get(self, key):
+        """The value stored under key, or None (missing or unreadable entries are misses)."""
+        try:
+            with open(self._path(key)) as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store value under key; the file appears whole or not at all."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(value, f)
+        os.replace(temporary, path)
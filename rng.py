@@ -0,0 +1,378 @@
+"""Seedable random number streams for the D&D-style game."""
+
+import hashlib
+import os
+import random
+import threading
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; only bulk rolls use it
+    np = None
+
+def derive_seed(seed, key):
+    """Derive an independent 128-bit seed from a parent seed and a key."""
+    digest = hashlib.blake2b(f"{seed}:{key}".encode(), digest_size=16).digest()
+    return int.from_bytes(digest, 'big')
+
+class RNGStream(random.Random):
+    """
+    An independent, seedable random stream.
+
+    Every stream remembers the seed it was created from, so a session or a
+    single fight can be reproduced, and can spawn child streams whose seeds
+    are derived deterministically from its own. State (including the
+    NumPy generator used for bulk rolls) can be captured with getstate()
+    and restored with setstate().
+    """
+
+    # Session name used to group this stream's rolls in roll telemetry
+    label = None
+
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = int.from_bytes(os.urandom(16), 'big')
+        self.root_seed = seed
+        self._spawned = 0
+        self._spawn_lock = threading.Lock()
+        self._numpy = None
+        super().__init__(seed)
+
+    def randint(self, a, b):
+        """Same draws as random.Random.randint without the argument checks."""
+        return a + self._randbelow(b - a + 1)
+
+    def spawn(self, count=None):
+        """
+        Create child streams with derived seeds.
+        Returns a single stream, or a list of count streams.
+        """
+        with self._spawn_lock:
+            first = self._spawned
+            self._spawned += 1 if count is None else count
+        if count is None:
+            return RNGStream(derive_seed(self.root_seed, first))
+        return [RNGStream(derive_seed(self.root_seed, first + i)) for i in range(count)]
+
+    def numpy_generator(self):
+        """Return this stream's NumPy generator, or None without NumPy."""
+        if self._numpy is None and np is not None:
+            self._numpy = np.random.default_rng(derive_seed(self.root_seed, 'numpy'))
+        return self._numpy
+
+    def getstate(self):
+        """Capture the full stream state."""
+        numpy_state = self._numpy.bit_generator.state if self._numpy is not None else None
+        return (super().getstate(), self.root_seed, self._spawned, numpy_state)
+
+    def setstate(self, state):
+        """Restore a state captured by getstate()."""
+        base_state, self.root_seed, self._spawned, numpy_state = state
+        super().setstate(base_state)
+        self._numpy = None
+        if numpy_state is not None:
+            self.numpy_generator().bit_generator.state = numpy_state
+
+    def __reduce__(self):
+        return (self.__class__, (self.root_seed,), self.getstate())
+
+    def __setstate__(self, state):
+        self.setstate(state)
+
+# Bytes fetched from os.urandom per refill of a secure stream
+SECURE_BLOCK_SIZE = 4096
+
+# Refill once fewer buffered bytes than this remain
+SECURE_REFILL_THRESHOLD = 64
+
+class SecureRNG(random.Random):
+    """
+    A cryptographically secure stream for tournament play.
+
+    Rolls cannot be predicted from earlier output. Instead of one system call
+    per die, os.urandom is read in large blocks and die faces are cut from
+    the buffered bytes by rejection sampling, so every face stays exactly
+    equally likely. Secure streams cannot be seeded, captured or replayed.
+    """
+
+    label = None
+
+    def __init__(self, block_size=SECURE_BLOCK_SIZE, refill_threshold=SECURE_REFILL_THRESHOLD):
+        self.block_size = block_size
+        self.refill_threshold = refill_threshold
+        self.root_seed = None
+        self._buffer = b''
+        self._pos = 0
+        self._lock = threading.Lock()
+        super().__init__()
+
+    def seed(self, *args, **kwargs):
+        """Secure streams ignore seeding."""
+
+    def getstate(self):
+        """Not supported: a secure stream has no state worth replaying."""
+        raise TypeError("Secure streams cannot be captured")
+
+    def setstate(self, state):
+        """Not supported: a secure stream has no state worth replaying."""
+        raise TypeError("Secure streams cannot be restored")
+
+    def __reduce__(self):
+        return (self.__class__, (self.block_size, self.refill_threshold))
+
+    def spawn(self, count=None):
+        """Create independent secure streams."""
+        if count is None:
+            return SecureRNG(self.block_size, self.refill_threshold)
+        return [SecureRNG(self.block_size, self.refill_threshold) for _ in range(count)]
+
+    def numpy_generator(self):
+        """Secure streams never hand out a NumPy generator."""
+        return None
+
+    def _refill(self, size=0):
+        """Keep the unread tail and append a fresh block. Caller holds the lock."""
+        self._buffer = self._buffer[self._pos:] + os.urandom(max(self.block_size, size))
+        self._pos = 0
+
+    def _take(self, size):
+        """Remove size bytes from the buffer, refilling below the threshold. Caller holds the lock."""
+        if len(self._buffer) - self._pos < max(size, self.refill_threshold):
+            self._refill(size)
+        start = self._pos
+        self._pos += size
+        return self._buffer[start:self._pos]
+
+    def random(self):
+        """Return a float in [0.0, 1.0) with 53 random bits."""
+        with self._lock:
+            data = self._take(7)
+        return (int.from_bytes(data, 'big') >> 3) * (2 ** -53)
+
+    def getrandbits(self, k):
+        """Return an int with k random bits."""
+        if k < 0:
+            raise ValueError("Number of bits must be non-negative")
+        if k == 0:
+            return 0
+        with self._lock:
+            data = self._take((k + 7) // 8)
+        return int.from_bytes(data, 'big') >> (-k % 8)
+
+    def randint(self, a, b):
+        """Return an unbiased integer in [a, b]."""
+        span = b - a + 1
+        if span <= 0:
+            raise ValueError(f"Empty range for randint({a}, {b})")
+        if span > 256:
+            return a + self._randbelow(span)
+        # Bytes at or above limit would favour low faces, so they are rejected
+        limit = 256 - 256 % span
+        with self._lock:
+            if len(self._buffer) - self._pos < self.refill_threshold:
+                self._refill()
+            buffer, pos = self._buffer, self._pos
+            while True:
+                if pos == len(buffer):
+                    self._pos = pos
+                    self._refill()
+                    buffer, pos = self._buffer, 0
+                byte = buffer[pos]
+                pos += 1
+                if byte < limit:
+                    break
+            self._pos = pos
+        return a + byte % span
+
+    def choices(self, population, weights=None, *, cum_weights=None, k=1):
+        """Unweighted choices use byte rejection sampling; weighted ones defer to Random."""
+        if weights is None and cum_weights is None and 0 < len(population) <= 256:
+            return [population[i] for i in self._faces(len(population), k)]
+        return super().choices(population, weights, cum_weights=cum_weights, k=k)
+
+    def _faces(self, span, count):
+        """Draw count unbiased values in [0, span) from buffered bytes (span <= 256)."""
+        limit = 256 - 256 % span
+        faces = []
+        with self._lock:
+            while len(faces) < count:
+                # Over-ask by the expected rejection rate so one pass usually suffices
+                chunk = self._take((count - len(faces)) * 256 // limit + 1)
+                faces.extend(byte % span for byte in chunk if byte < limit)
+        del faces[count:]
+        return faces
+
+class AntitheticRNG(random.Random):
+    """
+    Simulation stream that records its uniforms so a partner stream can
+    replay their mirror images (1 - u). Every roll is derived from one
+    uniform, so a d20 of 3 in the primary fight is an 18 in the partner
+    fight; averaging each pair cancels much of the dice noise.
+    """
+
+    def __init__(self, source=None, mirror=None):
+        self._source = source if source is not None else RNGStream()
+        self._recorded = [] if mirror is None else None
+        self._mirror = mirror
+        self._index = 0
+        self.root_seed = getattr(self._source, 'root_seed', None)
+        super().__init__()
+
+    def seed(self, *args, **kwargs):
+        """Antithetic streams are seeded through their source stream."""
+
+    def antithetic(self):
+        """Return a partner stream that replays this stream's uniforms mirrored."""
+        if self._recorded is None:
+            raise ValueError("Only a primary stream can produce an antithetic partner")
+        return AntitheticRNG(self._source.spawn(), mirror=self._recorded)
+
+    def numpy_generator(self):
+        """Bulk rolls go through random() so they are mirrored too."""
+        return None
+
+    def random(self):
+        if self._mirror is not None and self._index < len(self._mirror):
+            u = 1.0 - self._mirror[self._index]
+            self._index += 1
+            # 1 - u can reach 1.0 exactly; keep the result in [0, 1)
+            return u if u < 1.0 else 0.9999999999999999
+        u = self._source.random()
+        if self._recorded is not None:
+            self._recorded.append(u)
+        return u
+
+    def _randbelow(self, n):
+        return int(self.random() * n)
+
+    def randint(self, a, b):
+        return a + int(self.random() * (b - a + 1))
+
+class StratifiedRNG(RNGStream):
+    """
+    Simulation stream whose single-die rolls are dealt from shuffled decks:
+    every consecutive block of 20 d20 rolls contains each face exactly once
+    (likewise for other die sizes). Bulk rolls are not stratified.
+    """
+
+    def __init__(self, seed=None):
+        self._decks = {}
+        super().__init__(seed)
+
+    def randint(self, a, b):
+        deck = self._decks.get((a, b))
+        if not deck:
+            if b - a >= 100:
+                return super().randint(a, b)
+            deck = self._decks[(a, b)] = list(range(a, b + 1))
+            self.shuffle(deck)
+        return deck.pop()
+
+class Estimate(namedtuple('Estimate', ['mean', 'std_error', 'samples'])):
+    """A Monte Carlo estimate with its standard error."""
+
+    __slots__ = ()
+
+    def confidence_interval(self, z=1.96):
+        """Return the (low, high) normal-approximation interval."""
+        return self.mean - z * self.std_error, self.mean + z * self.std_error
+
+def _estimate(values):
+    count = len(values)
+    mean = sum(values) / count
+    if count < 2:
+        return Estimate(mean, float('inf'), count)
+    variance = sum((v - mean) ** 2 for v in values) / (count - 1)
+    return Estimate(mean, (variance / count) ** 0.5, count)
+
+class SimulationContext:
+    """
+    Opt-in variance reduction for Monte Carlo simulations.
+
+    A scenario is any function taking an rng and returning a number (for
+    example 1 if the player wins a simulated fight). Modes:
+      'plain'       independent streams, the baseline
+      'antithetic'  replicates come in mirrored pairs (see AntitheticRNG)
+      'stratified'  one StratifiedRNG shared by all replicates
+    compare() also uses common random numbers: both scenarios see the same
+    streams, so the estimated difference is not swamped by dice noise.
+    Only the streams handed to scenarios are affected; live gameplay keeps
+    using its own session streams.
+    """
+
+    MODES = ('plain', 'antithetic', 'stratified')
+
+    def __init__(self, mode='plain', seed=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown sampling mode: {mode}")
+        self.mode = mode
+        self.seed = seed
+
+    def streams(self, replicates):
+        """Yield one stream per replicate."""
+        root = RNGStream(self.seed)
+        if self.mode == 'stratified':
+            shared = StratifiedRNG(root.spawn().root_seed)
+            for _ in range(replicates):
+                yield shared
+        elif self.mode == 'antithetic':
+            for i in range(replicates):
+                if i % 2 == 0:
+                    primary = AntitheticRNG(root.spawn())
+                    yield primary
+                else:
+                    yield primary.antithetic()
+        else:
+            for _ in range(replicates):
+                yield root.spawn()
+
+    def _summarise(self, values):
+        if self.mode == 'antithetic' and len(values) >= 2:
+            # Pairs are the independent units; judge the error from pair means
+            pairs = [(values[i] + values[i + 1]) / 2 for i in range(0, len(values) - 1, 2)]
+            estimate = _estimate(pairs)
+            return Estimate(sum(values) / len(values), estimate.std_error, len(values))
+        return _estimate(values)
+
+    def run(self, scenario, replicates):
+        """Estimate the mean of scenario(rng) over replicates."""
+        return self._summarise([scenario(rng) for rng in self.streams(replicates)])
+
+    def compare(self, scenario_a, scenario_b, replicates):
+        """
+        Estimate mean(scenario_a) - mean(scenario_b) with common random
+        numbers: replicate i of both scenarios gets an identically seeded stream.
+        """
+        seed = self.seed if self.seed is not None else int.from_bytes(os.urandom(16), 'big')
+        paired = SimulationContext(self.mode, seed)
+        values_a = [scenario_a(rng) for rng in paired.streams(replicates)]
+        values_b = [scenario_b(rng) for rng in paired.streams(replicates)]
+        return self._summarise([a - b for a, b in zip(values_a, values_b)])
+
+# Process-wide root; every thread and session stream is spawned from it
+_root = RNGStream()
+_local = threading.local()
+
+def default_rng():
+    """Return the current thread's default stream, spawning it on first use."""
+    try:
+        return _local.rng
+    except AttributeError:
+        rng = _local.rng = _root.spawn()
+        return rng
+
+def set_default_rng(rng):
+    """Replace the current thread's default stream."""
+    _local.rng = rng
+
+def seed_default_rng(seed):
+    """Reseed the current thread's default stream for reproducible rolls."""
+    _local.rng = RNGStream(seed)
+    return _local.rng
+
+def spawn_rng(seed=None):
+    """Create an independent stream for a session or combat."""
+    if seed is not None:
+        return RNGStream(seed)
+    return _root.spawn()
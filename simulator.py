@@ -0,0 +1,446 @@
+"""
+Monte Carlo balance simulator for the D&D-style game.
+
+Runs headless fights for every race x class x enemy x level across a
+process pool and reports win rates, rounds and HP remaining.
+Run with: python3 simulator.py [fights] [workers] [combat|batch]
+          [--precision P] [--threshold T] [--cache DIR]
+"""
+
+import argparse
+import os
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from statistics import NormalDist
+
+from batch_combat import batch_scenario
+from character import Character, RACES, CLASSES, valid_combinations
+from combat import Combat, AttackPolicy, NULL_SINK
+from dice import DiceRoller
+from enemies import ENEMY_TEMPLATES, create_enemy
+from result_cache import ResultCache, fingerprint
+from rng import RNGStream, Estimate, derive_seed
+from telemetry import TELEMETRY
+from traits import TRAITS
+
+# Bump whenever combat, levelling or enemy scaling rules change, so results
+# cached under the old rules stop matching
+RULES_VERSION = 1
+
+# Fights per unit of work handed to a worker process
+CHUNK_SIZE = 250
+
+# Smaller units for adaptive runs, so settled scenarios stop early
+ADAPTIVE_CHUNK_SIZE = 25
+
+# Chunks of one scenario that may be queued or unmerged at once in adaptive runs
+ADAPTIVE_LOOKAHEAD = 2
+
+# Player (and enemy) levels simulated by default
+DEFAULT_LEVELS = (1, 2, 3, 4, 5)
+
+# ScenarioStats totals, in the order of ScenarioStats.record()
+STATS_FIELDS = ('fights', 'wins', 'losses', 'fled', 'rounds', 'rounds_squared', 'hp', 'hp_squared')
+
+# One matchup: a race/class character against one enemy of the same level
+Scenario = namedtuple('Scenario', ['race', 'char_class', 'enemy', 'level'])
+
+def all_scenarios(levels=DEFAULT_LEVELS, enemies=None):
+    """Every valid race/class pair against every enemy template at each level."""
+    enemies = enemies or list(ENEMY_TEMPLATES)
+    return [Scenario(race, char_class, enemy, level)
+            for race, char_class in valid_combinations()
+            for enemy in enemies
+            for level in levels]
+
+def build_player(scenario, scores):
+    """Create a levelled character with rolled scores and a starting weapon."""
+    player = Character(f"{scenario.race} {scenario.char_class}",
+                       RACES[scenario.race], CLASSES[scenario.char_class])
+    player.assign_ability_scores(scores)
+    player.equip_starting_weapon()
+    for _ in range(scenario.level - 1):
+        player.level_up()
+    return player
+
+def scenario_inputs(scenario):
+    """
+    The game data one scenario's fights depend on: its race, class
+    (starting equipment included), enemy template and the traits they use.
+    """
+    race, char_class = RACES[scenario.race], CLASSES[scenario.char_class]
+    trait_keys = list(race.traits) + list(char_class.traits)
+    for item in char_class.starting_equipment:
+        trait_keys.extend(item.get('traits', ()))
+    return {
+        'scenario': list(scenario),
+        'race': race,
+        'class': char_class,
+        'enemy': ENEMY_TEMPLATES[scenario.enemy],
+        'traits': {key: TRAITS[key] for key in trait_keys},
+        'rules': RULES_VERSION,
+    }
+
+def simulate_fight(scenario, rng, scores=None, policy=None):
+    """
+    Resolve one headless fight.
+    Returns (result, rounds, player HP remaining).
+    """
+    if scores is None:
+        scores = DiceRoller.roll_ability_scores(rng)
+    player = build_player(scenario, scores)
+    enemy = create_enemy(scenario.enemy, scenario.level)
+    combat = Combat(player, [enemy], rng=rng, policy=policy or AttackPolicy(), sink=NULL_SINK)
+    result = combat.run_combat()
+    return result, combat.round_number, player.current_hp
+
+def wilson_interval(successes, trials, z=1.96):
+    """Wilson score interval for a binomial proportion."""
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    margin = z * ((p * (1 - p) + z * z / (4 * trials)) / trials) ** 0.5 / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+def sequential_z(confidence, looks):
+    """
+    z for two-sided intervals that keep their confidence when checked
+    looks times as data comes in (Bonferroni: each look gets alpha / looks).
+    """
+    return NormalDist().inv_cdf(1 - (1 - confidence) / (2 * looks))
+
+def _sum_estimate(total, total_squares, count):
+    """Estimate from a running sum and sum of squares."""
+    if count == 0:
+        return Estimate(0.0, float('inf'), 0)
+    mean = total / count
+    if count < 2:
+        return Estimate(mean, float('inf'), count)
+    variance = max(0.0, (total_squares - count * mean * mean) / (count - 1))
+    return Estimate(mean, (variance / count) ** 0.5, count)
+
+class ScenarioStats:
+    """
+    Running totals for one scenario.
+    Everything is kept as integer sums, so merging chunks in any order
+    gives identical results.
+    """
+
+    def __init__(self):
+        self.fights = 0
+        self.wins = 0
+        self.losses = 0
+        self.fled = 0
+        self.rounds = 0
+        self.rounds_squared = 0
+        self.hp = 0
+        self.hp_squared = 0
+
+    def record(self):
+        """The totals as a compact list of ints (STATS_FIELDS order)."""
+        return [getattr(self, name) for name in STATS_FIELDS]
+
+    @classmethod
+    def from_record(cls, record):
+        """Rebuild totals from record() output."""
+        if len(record) != len(STATS_FIELDS) or not all(isinstance(value, int) for value in record):
+            raise ValueError(f"Bad stats record: {record!r}")
+        stats = cls()
+        for name, value in zip(STATS_FIELDS, record):
+            setattr(stats, name, value)
+        return stats
+
+    def add(self, result, rounds, hp):
+        """Count one fight."""
+        self.fights += 1
+        if result == 'victory':
+            self.wins += 1
+        elif result == 'defeat':
+            self.losses += 1
+        else:
+            self.fled += 1
+        self.rounds += rounds
+        self.rounds_squared += rounds * rounds
+        self.hp += hp
+        self.hp_squared += hp * hp
+
+    def merge(self, other):
+        """Add another set of totals to this one."""
+        for name in vars(other):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    @property
+    def win_rate(self):
+        return self.wins / self.fights if self.fights else 0.0
+
+    def win_interval(self, z=1.96):
+        """Wilson confidence interval for the win rate."""
+        return wilson_interval(self.wins, self.fights, z)
+
+    def average_rounds(self):
+        """Estimate of the rounds a fight lasts."""
+        return _sum_estimate(self.rounds, self.rounds_squared, self.fights)
+
+    def average_hp(self):
+        """Estimate of the player's HP left after a fight (0 on defeat)."""
+        return _sum_estimate(self.hp, self.hp_squared, self.fights)
+
+    def as_dict(self):
+        low, high = self.win_interval()
+        return {
+            'fights': self.fights,
+            'wins': self.wins,
+            'losses': self.losses,
+            'fled': self.fled,
+            'win_rate': self.win_rate,
+            'win_interval': [low, high],
+            'rounds': self.average_rounds().mean,
+            'hp_remaining': self.average_hp().mean,
+        }
+
+def init_worker():
+    """Prepare a process that only runs chunks (pool, cluster or calibration workers)."""
+    # Worker rolls would only fill a histogram nobody reads
+    TELEMETRY.enabled = False
+
+def run_chunk(scenario, seed, fights, engine='combat'):
+    """
+    Simulate fights for one scenario from one seed; returns ScenarioStats.
+    engine='batch' resolves the whole chunk at once with batch_combat.
+    """
+    rng = RNGStream(seed)
+    if engine == 'batch':
+        return batch_scenario(scenario, fights, rng)
+    stats = ScenarioStats()
+    for scores in DiceRoller.roll_ability_scores_many(fights, rng):
+        stats.add(*simulate_fight(scenario, rng, scores))
+    return stats
+
+class Simulator:
+    """
+    Parallel Monte Carlo simulator over a list of scenarios.
+
+    Each scenario's fights are split into chunks of chunk_size. Chunk i of a
+    scenario always gets the seed derive_seed(seed, (scenario, i)), so the
+    totals are identical whatever the number of workers or the order in
+    which chunks finish. workers=0 runs everything in this process.
+
+    engine='combat' plays each fight through Combat; engine='batch' uses
+    the vectorized FightBatch resolver, which is much faster (use a larger
+    chunk_size with it) but plays plain attacks only. Traits (Keen Senses,
+    Lucky, Sneak Attack, Healing Touch, the Nail Bat's Brutal) and status
+    effects (Vine Creature poison, Demogorgon regeneration) are ignored, so
+    scenarios that use them come out differently from engine='combat'.
+
+    Given a precision (half-width of the win-rate interval) or a threshold
+    (a win rate to decide against), the run is adaptive: fights becomes a
+    per-scenario cap, and each scenario stops after the first chunk at
+    which its interval is narrow enough or excludes the threshold.
+    Intervals use sequential_z(), so checking after every chunk still holds
+    the stated confidence. Lopsided matchups settle in a chunk or two and
+    the fights go to the close calls. Chunks are merged in order, so the
+    totals still do not depend on the number of workers.
+
+    With a result_cache.ResultCache as cache, each finished scenario is
+    stored under the fingerprint of cache_key(), and later runs reuse it
+    instead of simulating. Unseeded runs share entries, since any sample is
+    as good as another; seeded runs only reuse results from the same seed.
+    """
+
+    def __init__(self, scenarios=None, fights=1000, seed=None, chunk_size=None, workers=None,
+                 engine='combat', precision=None, threshold=None, confidence=0.95, cache=None):
+        if engine not in ('combat', 'batch'):
+            raise ValueError(f"Unknown simulation engine: {engine}")
+        self.scenarios = list(scenarios) if scenarios is not None else all_scenarios()
+        self.fights = fights
+        self.seeded = seed is not None
+        self.seed = seed if seed is not None else int.from_bytes(os.urandom(16), 'big')
+        self.confidence = confidence
+        self.cache = cache
+        self.precision = precision
+        self.threshold = threshold
+        self.adaptive = precision is not None or threshold is not None
+        if chunk_size is None:
+            chunk_size = ADAPTIVE_CHUNK_SIZE if self.adaptive else CHUNK_SIZE
+        self.chunk_size = chunk_size
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.engine = engine
+        self.z = sequential_z(confidence, -(-fights // chunk_size)) if self.adaptive else 1.96
+
+    def settled(self, stats):
+        """True once an adaptive run can stop simulating this scenario."""
+        low, high = stats.win_interval(self.z)
+        if self.threshold is not None and (low > self.threshold or high < self.threshold):
+            return True
+        return self.precision is not None and (high - low) / 2 <= self.precision
+
+    def verdict(self, stats):
+        """'above' or 'below' the threshold once the interval excludes it, else None."""
+        low, high = stats.win_interval(self.z)
+        if self.threshold is None:
+            return None
+        if low > self.threshold:
+            return 'above'
+        if high < self.threshold:
+            return 'below'
+        return None
+
+    def cache_key(self, scenario):
+        """Fingerprint of everything this run's results for scenario depend on."""
+        inputs = scenario_inputs(scenario)
+        # The engines play different rules, so they never share entries
+        inputs['engine'] = self.engine
+        inputs['run'] = {
+            'fights': self.fights, 'chunk_size': self.chunk_size,
+            'seed': self.seed if self.seeded else None,
+            'stopping': [self.precision, self.threshold, self.confidence] if self.adaptive else None,
+        }
+        return fingerprint(inputs)
+
+    def chunks(self, scenarios=None):
+        """List every (scenario, seed, fights, engine) unit of work."""
+        work = []
+        for scenario in self.scenarios if scenarios is None else scenarios:
+            for index, start in enumerate(range(0, self.fights, self.chunk_size)):
+                seed = derive_seed(self.seed, (tuple(scenario), index))
+                work.append((scenario, seed, min(self.chunk_size, self.fights - start), self.engine))
+        return work
+
+    def stream(self):
+        """
+        Run the simulation, yielding (scenario, running ScenarioStats) each
+        time a chunk finishes, so callers can show partial results.
+        """
+        totals = {scenario: ScenarioStats() for scenario in self.scenarios}
+        keys = {}
+        if self.cache is not None:
+            for scenario in self.scenarios:
+                keys[scenario] = self.cache_key(scenario)
+                record = self.cache.get(keys[scenario])
+                if record is not None:
+                    totals[scenario] = ScenarioStats.from_record(record)
+                    yield scenario, totals[scenario]
+
+        def finished(scenario):
+            if scenario in keys:
+                self.cache.put(keys[scenario], totals[scenario].record())
+
+        work = self.chunks([scenario for scenario in self.scenarios if not totals[scenario].fights])
+        if self.adaptive:
+            yield from self._adaptive_stream(totals, work, finished)
+            return
+
+        left = Counter(unit[0] for unit in work)
+        if not self.workers:
+            for unit in work:
+                yield unit[0], totals[unit[0]].merge(run_chunk(*unit))
+                left[unit[0]] -= 1
+                if not left[unit[0]]:
+                    finished(unit[0])
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker) as pool:
+            futures = {pool.submit(run_chunk, *unit): unit[0] for unit in work}
+            for future in as_completed(futures):
+                scenario = futures[future]
+                yield scenario, totals[scenario].merge(future.result())
+                left[scenario] -= 1
+                if not left[scenario]:
+                    finished(scenario)
+
+    def _adaptive_stream(self, totals, work, finished):
+        """stream() for adaptive runs: hand out chunks only to unsettled scenarios."""
+        queues = {scenario: [] for scenario in self.scenarios}
+        for unit in work:
+            queues[unit[0]].append(unit)
+        # Scenario -> results that arrived ahead of an earlier chunk, by index
+        waiting = {scenario: {} for scenario in self.scenarios}
+        submitted = dict.fromkeys(self.scenarios, 0)
+        merged = dict.fromkeys(self.scenarios, 0)
+        active = [scenario for scenario in self.scenarios if queues[scenario]]
+
+        def merge(scenario, index, stats):
+            """Merge every result now in order; yields the totals after each."""
+            waiting[scenario][index] = stats
+            while merged[scenario] in waiting[scenario] and scenario in active:
+                totals[scenario].merge(waiting[scenario].pop(merged[scenario]))
+                merged[scenario] += 1
+                if self.settled(totals[scenario]) or merged[scenario] == len(queues[scenario]):
+                    active.remove(scenario)
+                    finished(scenario)
+                yield scenario, totals[scenario]
+
+        if not self.workers:
+            while active:
+                for scenario in list(active):
+                    index = submitted[scenario]
+                    submitted[scenario] += 1
+                    yield from merge(scenario, index, run_chunk(*queues[scenario][index]))
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker) as pool:
+            running = {}
+            while active:
+                # Keep the pool busy, round-robin over the unsettled scenarios
+                for scenario in list(active):
+                    while (len(running) < 2 * self.workers
+                           and submitted[scenario] < len(queues[scenario])
+                           and submitted[scenario] - merged[scenario] < ADAPTIVE_LOOKAHEAD):
+                        index = submitted[scenario]
+                        submitted[scenario] += 1
+                        running[pool.submit(run_chunk, *queues[scenario][index])] = (scenario, index)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    scenario, index = running.pop(future)
+                    yield from merge(scenario, index, future.result())
+            for future in running:
+                future.cancel()
+
+    def run(self, progress=None):
+        """
+        Run to completion and return {scenario: ScenarioStats}.
+        progress, if given, is called with (chunks done, chunks total);
+        adaptive runs usually finish well before that total.
+        """
+        total = len(self.scenarios) * -(-self.fights // self.chunk_size)
+        results = {}
+        for done, (scenario, stats) in enumerate(self.stream(), 1):
+            results[scenario] = stats
+            if progress:
+                progress(done, total)
+        return results
+
+def format_report(results, z=1.96):
+    """Format results as a text table, weakest matchups first."""
+    lines = [f"{'Race':<12} {'Class':<12} {'Enemy':<16} {'Lvl':>3} {'Fights':>6} {'Win %':>7} {'CI':>15} "
+             f"{'Rounds':>7} {'HP left':>8}"]
+    for scenario, stats in sorted(results.items(), key=lambda item: item[1].win_rate):
+        low, high = stats.win_interval(z)
+        lines.append(
+            f"{scenario.race:<12} {scenario.char_class:<12} {scenario.enemy:<16} {scenario.level:>3} "
+            f"{stats.fights:>6} {stats.win_rate * 100:>6.1f}% {low * 100:>6.1f}-{high * 100:<6.1f}% "
+            f"{stats.average_rounds().mean:>7.2f} {stats.average_hp().mean:>8.1f}"
+        )
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Monte Carlo balance simulator")
+    parser.add_argument('fights', type=int, nargs='?', default=1000, help="fights per scenario (the cap if adaptive)")
+    parser.add_argument('workers', type=int, nargs='?', default=None)
+    parser.add_argument('engine', nargs='?', default='combat', choices=('combat', 'batch'))
+    parser.add_argument('--precision', type=float, help="stop a scenario once its win-rate interval is this narrow")
+    parser.add_argument('--threshold', type=float, help="stop a scenario once its win rate is clearly above or below this")
+    parser.add_argument('--cache', metavar='DIR', help="reuse results for unchanged scenarios from this directory")
+    args = parser.parse_args()
+    simulator = Simulator(fights=args.fights, workers=args.workers, engine=args.engine,
+                          precision=args.precision, threshold=args.threshold,
+                          cache=ResultCache(args.cache) if args.cache else None)
+    start = time.perf_counter()
+    results = simulator.run(lambda done, total: print(f"\r{done}/{total} chunks", end='', flush=True))
+    elapsed = time.perf_counter() - start
+    print(f"\n{sum(stats.fights for stats in results.values()):,} fights in {elapsed:.1f}s\n")
+    print(format_report(results, simulator.z))
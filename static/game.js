@@ -295,6 +295,7 @@ function showCombatUI(enemy) {
         <button class="combat-btn" onclick="executeCombatAction('defend')">🛡️ Defend</button>
         <button class="combat-btn" onclick="executeCombatAction('useitem')">🧪 Use Item</button>
         <button class="combat-btn" onclick="executeCombatAction('flee')">🏃 Flee</button>
+        <button class="combat-btn" onclick="executeCombatAction('auto')">🤖 Auto-Battle</button>
     `;
 }
 
@@ -0,0 +1,90 @@
+"""Status effects (poison, stun, regeneration) for the D&D-style game."""
+
+import heapq
+from collections import namedtuple
+
+# How an effect behaves: hp_sign is the HP change per point of potency each
+# round (0 for effects that do nothing but last), adjective names the state
+EffectKind = namedtuple('EffectKind', ['hp_sign', 'adjective'])
+
+EFFECTS = {
+    'poison': EffectKind(-1, 'poisoned'),
+    'regeneration': EffectKind(1, 'regenerating'),
+    'stun': EffectKind(0, 'stunned'),  # Loses every turn while it lasts
+}
+
+# One effect on one combatant; ends is the last round it is in force (None: the whole fight)
+StatusEffect = namedtuple('StatusEffect', ['name', 'potency', 'ends'])
+
+def status_item(item):
+    """True for an item dict that applies, inflicts or cures a status effect."""
+    return isinstance(item, dict) and any(
+        key in ('applies', 'inflicts') or key.startswith('cure_') for key in item)
+
+class EffectTimers:
+    """
+    The status effects in force during one fight, scheduled on a min-heap.
+
+    Effects live in each combatant's status_effects dict (name ->
+    StatusEffect). Each one also has a heap entry keyed by the round it
+    next needs attention: every round for effects that change HP, the round
+    after it ends for the rest. Replacing or curing an effect leaves its
+    old entry behind, to be skipped when it surfaces, so starting a round
+    costs O(log n) per effect that fires, however many are in force.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._count = 0
+        # id -> every combatant given an effect, so clear() can reach them
+        self._affected = {}
+
+    def apply(self, combatant, name, rounds, potency, round_number):
+        """
+        Put an effect on combatant for rounds rounds after round_number
+        (None: until the fight ends), replacing any effect of that name.
+        """
+        if name not in EFFECTS:
+            raise ValueError(f"Unknown status effect: {name}")
+        ends = None if rounds is None else round_number + rounds
+        effect = StatusEffect(name, potency, ends)
+        combatant.status_effects[name] = effect
+        self._affected[id(combatant)] = combatant
+        if EFFECTS[name].hp_sign:
+            self._push(round_number + 1, combatant, effect)
+        elif ends is not None:
+            self._push(ends + 1, combatant, effect)
+        return effect
+
+    def remove(self, combatant, name):
+        """Take an effect off combatant; returns it, or None if it had none."""
+        return combatant.status_effects.pop(name, None)
+
+    def _push(self, round_number, combatant, effect):
+        self._count += 1
+        heapq.heappush(self._heap, (round_number, self._count, combatant, effect))
+
+    def due(self, round_number):
+        """
+        Yield (combatant, effect, ended) for each effect that fires as
+        round_number starts: ended is True when it has just worn off,
+        otherwise it ticks this round.
+        """
+        heap = self._heap
+        while heap and heap[0][0] <= round_number:
+            _, _, combatant, effect = heapq.heappop(heap)
+            if combatant.status_effects.get(effect.name) is not effect or not combatant.is_alive():
+                continue
+            if effect.ends is not None and round_number > effect.ends:
+                del combatant.status_effects[effect.name]
+                yield combatant, effect, True
+            else:
+                self._push(round_number + 1, combatant, effect)
+                yield combatant, effect, False
+
+    def clear(self):
+        """End every effect (when the fight is over)."""
+        for combatant in self._affected.values():
+            combatant.status_effects.clear()
+        self._affected.clear()
+        self._heap.clear()
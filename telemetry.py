@@ -0,0 +1,238 @@
+"""Roll fairness telemetry for the D&D-style game."""
+
+import json
+import math
+import threading
+import weakref
+from collections import Counter, deque
+
+# Rolls a stream logs before they are merged into the shared histograms
+FLUSH_EVERY = 1024
+
+# Logged rolls are encoded as die_size * FACE_BASE + face
+FACE_BASE = 128
+
+class RollTelemetry:
+    """
+    Streaming histograms of every die face rolled.
+
+    Each random stream (one per thread and one per session) appends its
+    faces to a private log without locking; every FLUSH_EVERY rolls the log
+    is counted in one pass and merged into the shared histograms. Rolls
+    from a labelled stream (e.g. a web session's) also get a per-session
+    histogram. Set enabled to False to skip recording entirely.
+
+    When a stream is garbage collected its weak reference queues it for
+    retirement; the next attach, flush or read folds its last rolls into
+    the histograms and drops its log, so memory stays bounded by the
+    streams still alive however many come and go.
+    """
+
+    def __init__(self, flush_every=FLUSH_EVERY, enabled=True):
+        self.flush_every = flush_every
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # Unflushed logs: weak reference to stream -> (label, log)
+        self._logs = {}
+        # References of collected streams waiting to be retired; appended by
+        # the weakref callback, which must not take the lock (it can run
+        # from the garbage collector while this thread holds it)
+        self._dead = deque()
+        # (session label, die size) -> counts indexed by face
+        self._merged = {}
+
+    def record(self, die_size, face, rng):
+        """Count one die face rolled with rng."""
+        try:
+            log = rng._roll_log
+        except AttributeError:
+            log = self.attach(rng)
+        log.append(die_size * FACE_BASE + face)
+        if len(log) >= self.flush_every:
+            self.flush(rng)
+
+    def record_faces(self, die_size, faces, rng):
+        """Count several faces of the same die size."""
+        try:
+            log = rng._roll_log
+        except AttributeError:
+            log = self.attach(rng)
+        base = die_size * FACE_BASE
+        log.extend([base + face for face in faces])
+        if len(log) >= self.flush_every:
+            self.flush(rng)
+
+    def attach(self, rng):
+        """Give a stream its roll log on first use."""
+        log = rng._roll_log = []
+        with self._lock:
+            self._retire_dead()
+            self._logs[weakref.ref(rng, self._dead.append)] = (getattr(rng, 'label', None), log)
+        return log
+
+    def _retire_dead(self):
+        """Fold the logs of collected streams into the histograms (lock held)."""
+        while self._dead:
+            entry = self._logs.pop(self._dead.popleft(), None)
+            if entry is not None:
+                self._merge_log(self._merged, *entry)
+
+    def flush(self, rng):
+        """Merge rng's unflushed rolls into the shared histograms."""
+        log = getattr(rng, '_roll_log', None)
+        if not log:
+            return
+        label = getattr(rng, 'label', None)
+        with self._lock:
+            self._retire_dead()
+            self._merge_log(self._merged, label, log)
+            del log[:]
+
+    @staticmethod
+    def _merge_log(target, label, log):
+        for code, count in Counter(log).items():
+            die_size, face = divmod(code, FACE_BASE)
+            counts = target.get((label, die_size))
+            if counts is None:
+                counts = target[(label, die_size)] = [0] * (die_size + 1)
+            counts[face] += count
+
+    def _snapshot(self):
+        """Shared histograms plus every stream's unflushed rolls."""
+        with self._lock:
+            self._retire_dead()
+            snapshot = {key: list(faces) for key, faces in self._merged.items()}
+            for ref, (label, log) in list(self._logs.items()):
+                stream = ref()
+                if stream is not None:
+                    self._merge_log(snapshot, getattr(stream, 'label', label), list(log))
+                elif self._logs.pop(ref, None) is not None:
+                    # Collected but not yet retired; fold its last rolls in for good
+                    self._merge_log(self._merged, label, log)
+                    self._merge_log(snapshot, label, log)
+        return snapshot
+
+    def histogram(self, die_size, session=None):
+        """
+        Return face counts for one die size, indexed 1..die_size.
+        session=None gives the totals across all sessions.
+        """
+        histogram = [0] * die_size
+        for (label, size), faces in self._snapshot().items():
+            if size == die_size and (session is None or label == session):
+                for face in range(1, die_size + 1):
+                    histogram[face - 1] += faces[face]
+        return histogram
+
+    def fairness(self, die_size, session=None):
+        """Chi-square goodness-of-fit of the observed faces against a fair die."""
+        return fairness_score(self.histogram(die_size, session))
+
+    def export(self):
+        """Export all histograms and fairness scores as a JSON-serialisable dict."""
+        totals = {}
+        sessions = {}
+        for (label, size), faces in self._snapshot().items():
+            observed = faces[1:]
+            merged = totals.setdefault(size, [0] * size)
+            for i, count in enumerate(observed):
+                merged[i] += count
+            if label is not None:
+                sessions.setdefault(label, {})[size] = observed
+        return {
+            'dice': {f'd{size}': fairness_score(counts) for size, counts in sorted(totals.items())},
+            'sessions': {
+                str(label): {f'd{size}': fairness_score(counts) for size, counts in sorted(dice.items())}
+                for label, dice in sessions.items()
+            },
+        }
+
+    def export_json(self):
+        """Export as a JSON string."""
+        return json.dumps(self.export(), indent=2)
+
+    def forget_session(self, session):
+        """Drop a finished session's histograms (its rolls stay in the totals)."""
+        self._snapshot()
+        with self._lock:
+            for ref, (label, log) in list(self._logs.items()):
+                stream = ref()
+                if stream is not None and getattr(stream, 'label', label) == session:
+                    self._merge_log(self._merged, None, log)
+                    del log[:]
+            for key in [k for k in self._merged if k[0] == session]:
+                faces = self._merged.pop(key)
+                totals = self._merged.setdefault((None, key[1]), [0] * len(faces))
+                for face, count in enumerate(faces):
+                    totals[face] += count
+
+    def reset(self):
+        """Clear every histogram."""
+        with self._lock:
+            self._retire_dead()
+            self._merged = {}
+            for _, log in self._logs.values():
+                del log[:]
+
+def fairness_score(counts):
+    """
+    Chi-square test of face counts against a fair die.
+    A p-value near 0 means the observed faces are very unlikely for a fair die.
+    """
+    rolls = sum(counts)
+    faces = len(counts)
+    if rolls == 0 or faces < 2:
+        return {'counts': list(counts), 'rolls': rolls, 'chi_square': 0.0, 'p_value': 1.0}
+    expected = rolls / faces
+    chi_square = sum((c - expected) ** 2 for c in counts) / expected
+    return {
+        'counts': list(counts),
+        'rolls': rolls,
+        'chi_square': chi_square,
+        'p_value': chi_square_survival(chi_square, faces - 1),
+    }
+
+def chi_square_survival(statistic, degrees_of_freedom):
+    """P(X >= statistic) for a chi-square distribution."""
+    if statistic <= 0:
+        return 1.0
+    return _upper_regularized_gamma(degrees_of_freedom / 2, statistic / 2)
+
+def _upper_regularized_gamma(a, x):
+    """Q(a, x) by series below a + 1 and a continued fraction above."""
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        term = total = 1.0 / a
+        n = a
+        for _ in range(500):
+            n += 1
+            term *= x / n
+            total += term
+            if abs(term) < abs(total) * 1e-15:
+                break
+        return max(0.0, 1.0 - total * math.exp(log_prefix))
+
+    # Lentz's method for the continued fraction
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 500):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return min(1.0, math.exp(log_prefix) * h)
+
+# Shared telemetry used by DiceRoller; off by default, since it adds about a
+# third to the cost of a roll and only the web server's fairness report
+# reads it (web_app turns it on)
+TELEMETRY = RollTelemetry(enabled=False)
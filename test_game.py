@@ -2,14 +2,34 @@
 Test script to verify game components work correctly.
 """
 
+import json
+import os
 import sys
+import tempfile
+import time
 sys.path.insert(0, '/workspaces/dnd')
 
-from character import Character, RACES, CLASSES
-from dice import DiceRoller
-from enemies import create_enemy, generate_random_encounter
-from combat import Combat
-from items import Shop, WEAPONS, ARMOR, CONSUMABLES
+from character import Character, RACES, CLASSES, RACE_CLASS_MAPPING, generate_characters
+import dice
+from dice import DiceRoller, DiceExpression, WeightedTable, ability_score_table, compile_dice
+from enemies import ENEMY_TEMPLATES, EncounterTable, create_enemy, generate_random_encounter
+from combat import Combat, AttackPolicy, ScriptedPolicy, NULL_SINK, CombatEvent, render_event, ENEMY_ACTIONS
+from rng import RNGStream, SecureRNG, SimulationContext, StratifiedRNG, default_rng, spawn_rng
+from telemetry import TELEMETRY, fairness_score, chi_square_survival
+from probability import dice_distribution, critical_distribution, attack_distribution, duel_outcome, duel_tables, solve_duel, initiative_chance
+from battle import Battle, TurnScheduler
+from status_effects import EffectTimers
+from traits import TRAITS, NO_HOOKS, compile_hooks, register_trait
+from replay import FOOTER, Replay, ReplayError, replay_combat, verify_replay, verify_replays
+from enemy_ai import ExpectimaxPolicy
+from auto_battle import AutoBattlePolicy
+from batch_combat import FightBatch, batch_scenario
+from simulator import Simulator, Scenario, ScenarioStats, all_scenarios, wilson_interval, sequential_z
+from cluster import Coordinator, run_worker, start_workers, checkpoint_seed
+from result_cache import ResultCache, fingerprint
+from calibrate import calibrate, calibration_races, write_table
+from player_stats import PlayerStats
+from items import Shop, WEAPONS, ARMOR, CONSUMABLES, VICTORY_LOOT, TREASURE_LOOT, roll_loot
 
 def test_dice_rolling():
     """Test dice rolling mechanics."""
@@ -40,6 +60,313 @@ def test_dice_rolling():
     
     print("✓ Dice rolling tests passed!")
 
+def test_dice_expressions():
+    """Test compiled dice expressions and the extended grammar."""
+    print("\nTesting dice expressions...")
+    
+    # Compiled expressions are cached and still behave like strings
+    expr = compile_dice('2d8+5')
+    assert isinstance(expr, DiceExpression)
+    assert compile_dice('2d8+5') is expr
+    assert expr == '2d8+5'
+    assert (expr.minimum, expr.maximum) == (7, 21)
+    for _ in range(50):
+        assert 7 <= DiceRoller.roll_simple(expr) <= 21
+    
+    # Multiple terms, keep-highest and advantage
+    total, rolls, modifier = DiceRoller.roll('4d6kh3 + 1d4 - 2')
+    assert len(rolls) == 4
+    assert modifier == -2
+    assert total == sum(rolls) + modifier
+    expr = compile_dice('1d20adv')
+    assert (expr.minimum, expr.maximum) == (1, 20)
+    assert len(expr.roll()[1]) == 1
+    assert compile_dice('1d6-1d4').minimum == -3
+    
+    # Invalid notation is rejected
+    for bad in ['', 'd', '2d6x', '2d1', '5d6kh6', '2d6adv', '1d6+']:
+        try:
+            compile_dice(bad)
+            assert False, f"{bad!r} should be rejected"
+        except ValueError:
+            pass
+    
+    # Expressions cannot be modified
+    try:
+        expr.modifier = 3
+        assert False, "DiceExpression should be immutable"
+    except AttributeError:
+        pass
+    
+    print("✓ Dice expression tests passed!")
+
+def test_bulk_rolling():
+    """Test batch rolls on both the NumPy and pure-Python paths."""
+    print("\nTesting bulk rolling...")
+    
+    numpy_module = dice.np
+    backends = [numpy_module, None] if numpy_module is not None else [None]
+    try:
+        for backend in backends:
+            dice.np = backend
+            
+            results = list(DiceRoller.roll_many('2d6+3', 20000))
+            assert len(results) == 20000
+            assert min(results) >= 5 and max(results) <= 15
+            assert abs(sum(results) / len(results) - 10.0) < 0.1
+            
+            d20s = list(DiceRoller.d20_many(20000))
+            assert set(d20s) == set(range(1, 21))
+            
+            # Exact means: advantage 13.825, disadvantage 7.175
+            advantage = list(DiceRoller.advantage_many(20000))
+            disadvantage = list(DiceRoller.disadvantage_many(20000))
+            assert abs(sum(advantage) / 20000 - 13.825) < 0.25
+            assert abs(sum(disadvantage) / 20000 - 7.175) < 0.25
+            
+            # Subtracted and keep-lowest groups match the scalar grammar
+            mixed = list(DiceRoller.roll_many('3d6kl1-1d4', 1000))
+            assert min(mixed) >= -3 and max(mixed) <= 5
+            assert len(DiceRoller.roll_many('1d8', 0)) == 0
+    finally:
+        dice.np = numpy_module
+    
+    print("✓ Bulk rolling tests passed!")
+
+def test_probability_engine():
+    """Test exact dice distributions."""
+    print("\nTesting probability engine...")
+    
+    two_d6 = dice_distribution('2d6')
+    assert abs(two_d6.probability(7) - 6 / 36) < 1e-12
+    assert abs(sum(two_d6.probs) - 1.0) < 1e-12
+    assert two_d6.percentile(50) == 7
+    assert abs(two_d6.prob_at_least(11) - 3 / 36) < 1e-12
+    
+    damage = dice_distribution('2d8+5')
+    assert (damage.minimum, damage.maximum) == (7, 21)
+    assert abs(damage.mean - 14.0) < 1e-9
+    assert abs(damage.variance - 2 * 63 / 12) < 1e-9
+    
+    # Keep-highest and advantage match their known means
+    assert abs(dice_distribution('4d6kh3').mean - 15869 / 1296) < 1e-9
+    assert abs(dice_distribution('1d20adv').mean - 13.825) < 1e-9
+    
+    # A critical hit rolls the damage dice twice
+    assert abs(critical_distribution('1d8+2').mean - 13.0) < 1e-9
+    
+    # Full attack: 1 in 20 crits, natural 1s and low rolls miss
+    attack = attack_distribution(2, 13, '1d6')
+    assert abs(sum(attack.probs) - 1.0) < 1e-12
+    assert abs(attack.probability(0) - 10 / 20) < 1e-12
+    assert attack.maximum == 14
+    
+    print("✓ Probability engine tests passed!")
+
+def test_rng_streams():
+    """Test per-session, seedable random streams."""
+    print("\nTesting RNG streams...")
+    
+    # Same seed, same rolls
+    first = [DiceRoller.roll_simple('2d8+5', RNGStream(42)) for _ in range(3)]
+    rng_a, rng_b = RNGStream(7), RNGStream(7)
+    assert [DiceRoller.roll_d20(rng_a) for _ in range(20)] == [DiceRoller.roll_d20(rng_b) for _ in range(20)]
+    assert first == [DiceRoller.roll_simple('2d8+5', RNGStream(42)) for _ in range(3)]
+    
+    # Spawned children are deterministic and independent of each other
+    children = RNGStream(1).spawn(3)
+    again = RNGStream(1).spawn(3)
+    assert [c.root_seed for c in children] == [c.root_seed for c in again]
+    assert len({c.root_seed for c in children}) == 3
+    
+    # State can be captured and restored, including bulk rolls
+    rng = RNGStream(99)
+    state = rng.getstate()
+    rolls = [DiceRoller.roll_simple('1d20', rng) for _ in range(10)]
+    bulk = list(DiceRoller.roll_many('1d6', 5, rng))
+    rng.setstate(state)
+    assert rolls == [DiceRoller.roll_simple('1d20', rng) for _ in range(10)]
+    assert bulk == list(DiceRoller.roll_many('1d6', 5, rng))
+    
+    # Encounters and combats draw from the stream they are given
+    encounter_a = generate_random_encounter(3, rng=RNGStream(5))
+    encounter_b = generate_random_encounter(3, rng=RNGStream(5))
+    assert [e.name for e in encounter_a] == [e.name for e in encounter_b]
+    player = Character("Seeded", RACES['human'], CLASSES['warrior'])
+    session_rng = spawn_rng()
+    assert Combat(player, encounter_a, rng=session_rng).rng is session_rng
+    
+    # Each thread gets its own default stream
+    import threading
+    streams = []
+    worker = threading.Thread(target=lambda: streams.append(default_rng()))
+    worker.start()
+    worker.join()
+    assert streams[0] is not default_rng()
+    
+    print("✓ RNG stream tests passed!")
+
+def test_secure_rng():
+    """Test the buffered cryptographically secure backend."""
+    print("\nTesting secure RNG...")
+    
+    rng = SecureRNG(block_size=256, refill_threshold=16)
+    
+    # Faces are in range and roughly uniform across several refills
+    counts = [0] * 7
+    for _ in range(6000):
+        counts[DiceRoller.roll_d6(rng)] += 1
+    assert counts[0] == 0
+    assert all(800 < c < 1200 for c in counts[1:])
+    
+    # Expressions, bulk rolls and larger ranges all work on secure streams
+    for _ in range(100):
+        assert 7 <= DiceRoller.roll_simple('2d8+5', rng) <= 21
+        assert 1 <= rng.randint(1, 1000) <= 1000
+        assert 0.0 <= rng.random() < 1.0
+    bulk = list(DiceRoller.roll_many('1d20adv', 500, rng))
+    assert len(bulk) == 500 and min(bulk) >= 1 and max(bulk) <= 20
+    
+    # Secure streams cannot be captured for replay, by design
+    try:
+        rng.getstate()
+        assert False, "SecureRNG state should not be capturable"
+    except TypeError:
+        pass
+    try:
+        rng.setstate(RNGStream(1).getstate())
+        assert False, "SecureRNG state should not be restorable"
+    except TypeError:
+        pass
+    
+    print("✓ Secure RNG tests passed!")
+
+def test_variance_reduction():
+    """Test opt-in variance-reduction sampling modes."""
+    print("\nTesting variance reduction...")
+    
+    def d20(rng):
+        return DiceRoller.roll_d20(rng)
+    
+    # Antithetic d20 pairs always sum to 21, so the mean is exact
+    estimate = SimulationContext('antithetic', seed=3).run(d20, 200)
+    assert estimate.mean == 10.5
+    assert estimate.std_error == 0.0
+    
+    # Stratified d20s deal every face once per block of 20
+    stratified = StratifiedRNG(11)
+    assert sorted(d20(stratified) for _ in range(20)) == list(range(1, 21))
+    assert SimulationContext('stratified', seed=3).run(d20, 400).mean == 10.5
+    
+    # Common random numbers: identical scenarios differ by exactly nothing
+    plain = SimulationContext('plain', seed=5)
+    difference = plain.compare(lambda rng: d20(rng) + 2, d20, 100)
+    assert difference.mean == 2.0 and difference.std_error == 0.0
+    low, high = plain.run(d20, 500).confidence_interval()
+    assert low < 10.5 < high
+    
+    # Live gameplay streams are untouched
+    assert not isinstance(default_rng(), StratifiedRNG)
+    
+    print("✓ Variance reduction tests passed!")
+
+def test_weighted_tables():
+    """Test alias-method weighted tables and the loot tables built on them."""
+    print("\nTesting weighted tables...")
+    
+    table = WeightedTable([('common', 6), ('rare', 3), ('legendary', 1), ('never', 0)])
+    assert len(table) == 4
+    assert abs(table.probability('rare') - 0.3) < 1e-12
+    
+    numpy_module = dice.np
+    try:
+        for backend in ([numpy_module, None] if numpy_module is not None else [None]):
+            dice.np = backend
+            draws = table.draw_many(20000, RNGStream(8))
+            assert 'never' not in draws
+            assert abs(draws.count('common') / 20000 - 0.6) < 0.02
+            assert abs(draws.count('legendary') / 20000 - 0.1) < 0.01
+    finally:
+        dice.np = numpy_module
+    
+    # Large tables still draw every positive-weight entry
+    big = WeightedTable({i: i + 1 for i in range(300)})
+    rng = RNGStream(9)
+    assert all(0 <= big.draw(rng) < 300 for _ in range(1000))
+    assert WeightedTable([('only', 1)]).draw() == 'only'
+    
+    # Loot tables keep the original drop chances
+    assert abs(VICTORY_LOOT.probability('health_potion') - 0.3) < 1e-12
+    assert abs(TREASURE_LOOT.probability(None) - 0.5) < 1e-12
+    loot = [roll_loot(TREASURE_LOOT, rng) for _ in range(200)]
+    assert all(item is None or item['name'] in ('Health Potion', 'Greater Health Potion') for item in loot)
+    
+    for bad in ([], [('a', -1)], [('a', 0)]):
+        try:
+            WeightedTable(bad)
+            assert False, f"{bad!r} should be rejected"
+        except ValueError:
+            pass
+    
+    print("✓ Weighted table tests passed!")
+
+def test_roll_telemetry():
+    """Test roll fairness telemetry."""
+    print("\nTesting roll telemetry...")
+    
+    # Only the web server records rolls; nothing else pays for it
+    assert not TELEMETRY.enabled
+    before = sum(TELEMETRY.histogram(20))
+    DiceRoller.roll_d20(RNGStream(20))
+    assert sum(TELEMETRY.histogram(20)) == before
+    
+    enabled = TELEMETRY.enabled
+    TELEMETRY.enabled = True
+    try:
+        rng = RNGStream(21)
+        rng.label = 'telemetry-test'
+        for _ in range(3000):
+            DiceRoller.roll_d20(rng)
+        DiceRoller.roll('4d6kh3', rng)
+        
+        histogram = TELEMETRY.histogram(20, session='telemetry-test')
+        assert sum(histogram) == 3000
+        assert sum(TELEMETRY.histogram(6, session='telemetry-test')) == 4
+        assert TELEMETRY.fairness(20, session='telemetry-test')['p_value'] > 1e-4
+        
+        report = TELEMETRY.export()
+        assert report['sessions']['telemetry-test']['d20']['rolls'] == 3000
+        assert report['dice']['d20']['rolls'] >= 3000
+        
+        # Turning telemetry off stops recording
+        TELEMETRY.enabled = False
+        DiceRoller.roll_d20(rng)
+        TELEMETRY.enabled = True
+        assert sum(TELEMETRY.histogram(20, session='telemetry-test')) == 3000
+        
+        # Forgetting a session keeps its rolls in the totals
+        total_before = sum(TELEMETRY.histogram(20))
+        TELEMETRY.forget_session('telemetry-test')
+        assert sum(TELEMETRY.histogram(20, session='telemetry-test')) == 0
+        assert sum(TELEMETRY.histogram(20)) == total_before
+        
+        # Streams that die have their logs folded in rather than kept around
+        for seed in range(200):
+            stream = RNGStream(seed)
+            DiceRoller.roll_d20(stream)
+        del stream
+        DiceRoller.roll_d20(rng)
+        assert len(TELEMETRY._logs) < 20
+        assert sum(TELEMETRY.histogram(20)) == total_before + 201
+    finally:
+        TELEMETRY.enabled = enabled
+    
+    # A loaded die is flagged
+    assert fairness_score([100] * 19 + [400])['p_value'] < 1e-6
+    assert abs(chi_square_survival(3.841, 1) - 0.05) < 1e-3
+    
+    print("✓ Roll telemetry tests passed!")
+
 def test_character_creation():
     """Test character creation."""
     print("\nTesting character creation...")
@@ -82,6 +409,45 @@ def test_character_creation():
     
     print("✓ Character creation tests passed!")
 
+def test_bulk_character_generation():
+    """Test batch character generation."""
+    print("\nTesting bulk character generation...")
+    
+    # The exact table matches 4d6 drop lowest
+    table = ability_score_table()
+    assert abs(table.probability(18) - 21 / 1296) < 1e-12
+    assert abs(table.probability(3) - 1 / 1296) < 1e-12
+    
+    score_sets = DiceRoller.roll_ability_scores_many(1000, RNGStream(4))
+    assert len(score_sets) == 1000
+    assert all(len(scores) == 6 and all(3 <= s <= 18 for s in scores) for scores in score_sets)
+    
+    stats = {}
+    heroes = generate_characters(300, rng=RNGStream(6), stats=stats)
+    assert len(heroes) == 300 and stats['count'] == 300 and stats['per_second'] > 0
+    for hero in heroes:
+        allowed = RACE_CLASS_MAPPING.get(hero.race.name.lower())
+        assert allowed is None or hero.char_class.name.lower() in allowed
+        assert hero.current_hp == hero.max_hp >= 1
+        assert hero.armor_class == 10 + hero.get_modifier('dexterity')
+    
+    # A fixed mix only produces the requested combinations
+    dwarves = generate_characters(50, mix=[('dwarf', 'warrior')], rng=RNGStream(7))
+    assert {(h.race.name, h.char_class.name) for h in dwarves} == {('Dwarf', 'Warrior')}
+    assert all(h.equipped_weapon['name'] == 'Longsword' for h in dwarves)
+    
+    # Racial bonus HP survives rerolled scores
+    vecna = generate_characters(1, mix={('vecna', 'wizard'): 1}, rng=RNGStream(8))[0]
+    assert vecna.max_hp > 150
+    
+    try:
+        generate_characters(1, mix=[('orc', 'warrior')])
+        assert False, "Unknown races should be rejected"
+    except ValueError:
+        pass
+    
+    print("✓ Bulk character generation tests passed!")
+
 def test_enemies():
     """Test enemy creation."""
     print("\nTesting enemy creation...")
@@ -161,6 +527,826 @@ def test_combat_mechanics():
     
     print("✓ Combat mechanics tests passed!")
 
+def test_headless_combat():
+    """Test combat resolution without terminal I/O."""
+    print("\nTesting headless combat...")
+    
+    def fight(seed, policy=None):
+        player = Character("Test Warrior", RACES['human'], CLASSES['warrior'])
+        player.equipped_weapon = WEAPONS['longsword'].to_dict()
+        enemies = [create_enemy('demobat', level=1), create_enemy('demodog', level=1)]
+        combat = Combat(player, enemies, rng=RNGStream(seed), policy=policy or AttackPolicy(), sink=NULL_SINK)
+        return combat, list(combat.rounds())
+    
+    # Rounds are reported in order and the last one carries the result
+    combat, reports = fight(7)
+    assert [r.number for r in reports] == list(range(1, len(reports) + 1))
+    assert reports[-1].result == combat.result
+    assert combat.result in ('victory', 'defeat')
+    assert all(r.result is None for r in reports[:-1])
+    assert sum(len(r.events) for r in reports) <= len(combat.combat_log)
+    
+    # Same seed, same fight
+    replay, replay_reports = fight(7)
+    assert replay.combat_log == combat.combat_log
+    assert replay_reports == reports
+    
+    # run_combat returns the result without blocking
+    player = Character("Test Warrior", RACES['human'], CLASSES['warrior'])
+    combat = Combat(player, [create_enemy('demobat', level=1)], rng=RNGStream(3),
+                    policy=AttackPolicy(), sink=NULL_SINK)
+    assert combat.run_combat() in ('victory', 'defeat')
+    
+    # A scripted flee keeps trying until it succeeds or the fight ends
+    combat, reports = fight(11, ScriptedPolicy(['flee'] * 50))
+    assert combat.result in ('fled', 'victory', 'defeat')
+    
+    # Healing policy drinks potions when low
+    player = Character("Test Warrior", RACES['human'], CLASSES['warrior'])
+    player.add_item(CONSUMABLES['health_potion'].to_dict())
+    player.current_hp = 1
+    combat = Combat(player, [create_enemy('demobat', level=1)], rng=RNGStream(5),
+                    policy=AttackPolicy(heal_below=0.5), sink=NULL_SINK)
+    potions = len(combat.usable_items())
+    combat.start_combat()
+    assert combat.player_turn() == 'item_used'
+    assert len(combat.usable_items()) == potions - 1
+    assert player.current_hp > 1
+    
+    print("✓ Headless combat tests passed!")
+
+def test_simulator():
+    """Test the Monte Carlo balance simulator."""
+    print("\nTesting simulator...")
+    
+    scenarios = [Scenario('human', 'warrior', 'demobat', 1), Scenario('elf', 'rogue', 'demodog', 3)]
+    assert set(scenarios) <= set(all_scenarios(levels=(1, 3)))
+    
+    # Same seed, same totals - serial or parallel, whatever the chunk order
+    serial = Simulator(scenarios, fights=60, seed=42, chunk_size=25, workers=0).run()
+    parallel = Simulator(scenarios, fights=60, seed=42, chunk_size=25, workers=2).run()
+    for scenario in scenarios:
+        assert vars(serial[scenario]) == vars(parallel[scenario])
+        stats = serial[scenario]
+        assert stats.fights == 60
+        assert stats.wins + stats.losses + stats.fled == 60
+        low, high = stats.win_interval()
+        assert low <= stats.win_rate <= high
+        assert stats.average_rounds().mean >= 1
+    
+    # Partial results stream in as chunks finish
+    partial = [stats.fights for _, stats in Simulator(scenarios[:1], fights=60, seed=1, chunk_size=25, workers=0).stream()]
+    assert partial == [25, 50, 60]
+    
+    # Wilson intervals stay inside [0, 1]
+    assert wilson_interval(0, 10)[0] == 0.0
+    assert wilson_interval(10, 10)[1] == 1.0
+    low, high = wilson_interval(50, 100)
+    assert abs((low + high) / 2 - 0.5) < 1e-9 and high - low < 0.2
+    
+    # Adaptive runs: lopsided matchups stop early, and workers don't change the totals
+    lopsided = Scenario('halfling', 'wizard', 'vecna', 1)
+    adaptive = [lopsided, scenarios[0]]
+    serial = Simulator(adaptive, fights=1000, seed=7, workers=0, threshold=0.5).run()
+    parallel = Simulator(adaptive, fights=1000, seed=7, workers=2, threshold=0.5).run()
+    for scenario in adaptive:
+        assert vars(serial[scenario]) == vars(parallel[scenario])
+    assert serial[lopsided].fights <= 50 and serial[lopsided].wins == 0
+    simulator = Simulator(adaptive, fights=1000, seed=7, workers=0, threshold=0.5)
+    assert simulator.verdict(serial[lopsided]) == 'below'
+    assert sequential_z(0.95, 40) > sequential_z(0.95, 1) > 1.95
+    
+    simulator = Simulator(scenarios[:1], fights=2000, seed=3, workers=0, precision=0.05)
+    stats = simulator.run()[scenarios[0]]
+    low, high = stats.win_interval(simulator.z)
+    assert stats.fights < 2000 and (high - low) / 2 <= 0.05
+    
+    print("✓ Simulator tests passed!")
+
+def test_batch_combat():
+    """Test the vectorized batch combat resolver."""
+    print("\nTesting batch combat...")
+    
+    player = Character("Test Warrior", RACES['human'], CLASSES['warrior'])
+    player.equipped_weapon = WEAPONS['longsword'].to_dict()
+    enemy = create_enemy('demobat', level=1)
+    batch = FightBatch.from_fights([(player, enemy)] * 200)
+    assert len(batch) == 200
+    assert enemy.current_hp == enemy.max_hp  # Inputs are only read
+    
+    for numpy_module in (dice.np, None):
+        batch_module = sys.modules['batch_combat']
+        saved = batch_module.np
+        batch_module.np = numpy_module
+        try:
+            won, rounds, player_hp = batch.resolve(RNGStream(9))
+            assert len(won) == len(rounds) == len(player_hp) == 200
+            assert all(r >= 1 for r in rounds)
+            assert all((hp > 0) == bool(w) for w, hp in zip(won, player_hp))
+            assert all(0 <= hp <= player.max_hp for hp in player_hp)
+            
+            # A 1 HP target with no armour dies to the first attack that isn't a natural 1
+            sure = FightBatch.from_columns(**{**batch.columns, 'enemy_ac': [-100] * 200,
+                                              'enemy_hp': [1] * 200, 'player_initiative': [100] * 200})
+            assert all(sure.resolve(RNGStream(1)).won)
+            assert list(sure.resolve(RNGStream(1)).rounds).count(1) > 150
+        finally:
+            batch_module.np = saved
+    
+    # Same seed, same batch
+    assert list(batch.resolve(RNGStream(4)).rounds) == list(batch.resolve(RNGStream(4)).rounds)
+    
+    # Plain NdS+M damage dice only
+    fancy = create_enemy('demobat', level=1)
+    fancy.damage_dice = compile_dice('2d6kh1')
+    try:
+        FightBatch.from_fights([(player, fancy)])
+        assert False, "Should reject keep-highest damage"
+    except ValueError:
+        pass
+    
+    # Agrees with the Combat engine on win rate
+    scenario = Scenario('human', 'warrior', 'demobat', 1)
+    stats = batch_scenario(scenario, 4000, RNGStream(2))
+    assert stats.fights == 4000 and stats.wins + stats.losses == 4000
+    reference = Simulator([scenario], fights=1000, seed=3, workers=0).run()[scenario]
+    assert abs(stats.win_rate - reference.win_rate) < 0.06
+    batched = Simulator([scenario], fights=500, seed=3, workers=0, engine='batch').run()[scenario]
+    assert batched.fights == 500
+    
+    print("✓ Batch combat tests passed!")
+
+def test_cluster():
+    """Test the TCP coordinator/worker simulation cluster."""
+    print("\nTesting simulation cluster...")
+    
+    scenarios = [Scenario('human', 'warrior', 'demobat', 1), Scenario('elf', 'rogue', 'demodog', 3)]
+    expected = Simulator(scenarios, fights=60, seed=42, chunk_size=25, workers=0).run()
+    stats = expected[scenarios[0]]
+    assert vars(ScenarioStats.from_record(stats.record())) == vars(stats)
+    
+    # Worker processes on localhost give the same totals as a local run
+    with Coordinator(Simulator(scenarios, fights=60, seed=42, chunk_size=25), port=0) as coordinator:
+        coordinator.start()
+        workers = start_workers(*coordinator.address, processes=2)
+        assert coordinator.wait(timeout=60)
+        for worker in workers:
+            worker.join(10)
+        results = coordinator.totals()
+    for scenario in scenarios:
+        assert vars(results[scenario]) == vars(expected[scenario])
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'sweep.ckpt')
+        
+        # A crash after two chunks, mid-write of a third record
+        with Coordinator(Simulator(scenarios, fights=60, seed=42, chunk_size=25), port=0, checkpoint=path) as coordinator:
+            coordinator.start()
+            assert run_worker(*coordinator.address, limit=2) == 2
+        with open(path, 'a') as f:
+            f.write('[3, 25, ')
+        assert checkpoint_seed(path) == 42
+        
+        # Resuming skips the saved chunks; an abandoned lease is handed out again
+        with Coordinator(Simulator(scenarios, fights=60, seed=42, chunk_size=25), port=0, checkpoint=path,
+                         lease=0) as coordinator:
+            assert len(coordinator.results) == 2
+            coordinator.start()
+            assert coordinator.handle({'op': 'next'})['chunk'] == 2  # Taken and never returned
+            assert run_worker(*coordinator.address) == len(coordinator.work) - 2
+            assert coordinator.handle({'op': 'next'}) == {'done': True}
+            results = coordinator.totals()
+        for scenario in scenarios:
+            assert vars(results[scenario]) == vars(expected[scenario])
+        
+        # A checkpoint from another sweep is refused, as are bad results
+        try:
+            Coordinator(Simulator(scenarios, fights=60, seed=43, chunk_size=25), port=0, checkpoint=path)
+            assert False, "Should refuse a foreign checkpoint"
+        except ValueError:
+            pass
+        
+        # A header torn by a crash is reported, not half-parsed
+        torn = os.path.join(directory, 'torn.ckpt')
+        with open(torn, 'w') as f:
+            f.write('{"seed": 4')
+        assert checkpoint_seed(torn) is None
+        try:
+            Coordinator(Simulator(scenarios, fights=60, seed=42, chunk_size=25), port=0, checkpoint=torn)
+            assert False, "Should refuse an unreadable checkpoint"
+        except ValueError as e:
+            assert 'header unreadable' in str(e)
+    with Coordinator(Simulator(scenarios, fights=60, seed=42, chunk_size=25), port=0) as coordinator:
+        for request in ({'op': 'result', 'chunk': 0, 'stats': [1] * 8}, {'op': 'shutdown'}):
+            try:
+                coordinator.handle(request)
+                assert False, "Should refuse a bad request"
+            except ValueError:
+                pass
+    
+    print("✓ Cluster tests passed!")
+
+def test_result_cache():
+    """Test the content-addressed simulation result cache."""
+    print("\nTesting result cache...")
+    
+    scenarios = [Scenario('human', 'warrior', 'demobat', 1), Scenario('elf', 'rogue', 'demodog', 3)]
+    expected = Simulator(scenarios, fights=60, seed=42, chunk_size=25, workers=0).run()
+    assert fingerprint({'a': 1, 'b': [2]}) == fingerprint({'b': [2], 'a': 1})
+    
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResultCache(directory)
+        first = Simulator(scenarios, fights=60, seed=42, chunk_size=25, workers=0, cache=cache).run()
+        assert cache.hits == 0 and cache.misses == 2
+        again = Simulator(scenarios, fights=60, seed=42, chunk_size=25, workers=0, cache=cache).run()
+        assert cache.hits == 2
+        for scenario in scenarios:
+            assert vars(first[scenario]) == vars(expected[scenario]) == vars(again[scenario])
+        
+        # Another seed or sample count is another entry
+        Simulator(scenarios[:1], fights=50, seed=42, chunk_size=25, workers=0, cache=cache).run()
+        Simulator(scenarios[:1], fights=60, seed=7, chunk_size=25, workers=0, cache=cache).run()
+        assert cache.hits == 2 and cache.misses == 4
+        
+        # The batch engine ignores traits and effects, so it never shares the combat entries
+        batch = Simulator(scenarios[:1], fights=60, seed=42, chunk_size=25, engine='batch', cache=cache)
+        assert batch.cache_key(scenarios[0]) != Simulator(scenarios[:1], fights=60, seed=42,
+                                                          chunk_size=25).cache_key(scenarios[0])
+        
+        # Editing one enemy template only recomputes that enemy's rows
+        saved = ENEMY_TEMPLATES['demodog']['hp']
+        ENEMY_TEMPLATES['demodog']['hp'] = saved + 5
+        try:
+            Simulator(scenarios, fights=60, seed=42, chunk_size=25, workers=0, cache=cache).run()
+        finally:
+            ENEMY_TEMPLATES['demodog']['hp'] = saved
+        assert cache.hits == 3 and cache.misses == 5
+        
+        # Unseeded runs share entries; a torn file is just a miss
+        Simulator(scenarios[:1], fights=30, workers=0, cache=cache).run()
+        assert cache.misses == 6
+        assert Simulator(scenarios[:1], fights=30, workers=0, cache=cache).run()[scenarios[0]].fights == 30
+        assert cache.hits == 4
+        key = Simulator(scenarios[:1], fights=30, cache=cache).cache_key(scenarios[0])
+        with open(os.path.join(directory, key[:2], key[2:] + '.json'), 'w') as f:
+            f.write('[30, ')
+        assert cache.get(key) is None
+    
+    print("✓ Result cache tests passed!")
+
+def test_encounter_calibration():
+    """Test offline encounter calibration and the table the generator reads."""
+    print("\nTesting encounter calibration...")
+    
+    assert calibration_races('warrior') == calibration_races('creature') == ['human', 'elf', 'dwarf', 'halfling']
+    data = calibrate(['warrior'], levels=(1, 2), gear_levels=(1,), fights=20, workers=0)
+    assert data == calibrate(['warrior'], levels=(1, 2), gear_levels=(1,), fights=20, workers=0)
+    cells = data['classes']['Warrior']
+    assert len(cells) == 2 and all(len(row) == 1 and row[0] for row in cells)
+    for enemy, count, level, win_percent in cells[1][0]:
+        assert enemy in ENEMY_TEMPLATES and 1 <= count <= 3 and level >= 1 and 0 <= win_percent <= 100
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'encounters.json')
+        write_table(data, path)
+        table = EncounterTable.load(path)
+        assert EncounterTable.load(os.path.join(directory, 'missing.json')) is None
+    
+    # Lookups clamp to the calibrated levels; encounters come from the cell
+    assert table.lookup('Warrior', 9, 4) == table.lookup('Warrior', 2, 1)
+    assert table.lookup('Wizard', 1, 1) is None
+    mixes = table.lookup('Warrior', 2, 1)
+    for seed in range(10):
+        enemies = generate_random_encounter(2, 1, rng=RNGStream(seed), char_class='Warrior', table=table)
+        names = {enemy.name for enemy in enemies}
+        assert any(len(enemies) == count and names == {ENEMY_TEMPLATES[enemy]['name']}
+                   and enemies[0].level == level for enemy, count, level in mixes)
+    
+    # Uncalibrated classes keep the hand-tuned tiers
+    assert generate_random_encounter(2, 1, rng=RNGStream(3), char_class='Wizard', table=table)
+    try:
+        EncounterTable(dict(data, version=0))
+        assert False, "Should refuse an old table"
+    except ValueError:
+        pass
+    
+    print("✓ Encounter calibration tests passed!")
+
+def test_adaptive_difficulty():
+    """Test streaming player statistics and the encounter bias they drive."""
+    print("\nTesting adaptive difficulty...")
+    
+    player = Character("Tracked", RACES['human'], CLASSES['warrior'])
+    player.max_hp = player.current_hp = 50
+    
+    def fight(stats, damage_per_round, potions=0, end_hp=40):
+        player.current_hp = player.max_hp
+        for round_damage in damage_per_round:
+            stats.observe(player, CombatEvent('round', None, None, (1,), None))
+            stats.observe(player, CombatEvent('hit', 'Demobat', "Tracked", (), round_damage))
+            stats.observe(player, CombatEvent('hit', "Tracked", 'Demobat', (), 30))  # Dealt, not taken
+        for _ in range(potions):
+            stats.observe(player, CombatEvent('item', "Tracked", 'Health Potion', (), 20))
+        stats.observe(player, CombatEvent('item', "Tracked", 'Antidote', (), None))  # Not a potion
+        player.current_hp = end_hp
+        stats.observe(player, CombatEvent('hit', 'Demobat', "Tracked", (), 1))
+        stats.observe(player, CombatEvent('victory', None, None, (), None))
+    
+    # Exact EWMAs: the first value is taken as is, later ones blend in
+    stats = PlayerStats()
+    fight(stats, [10, 0], potions=1)
+    assert stats.fights == 1 and stats.difficulty() == 0.0  # Still warming up
+    assert abs(stats.damage_share - (0.2 + 0.2 * (0.02 - 0.2))) < 1e-9
+    assert stats.potions == 1 and stats.near_deaths == 0
+    fight(stats, [5], potions=0, end_hp=5)
+    assert abs(stats.potions - 0.7) < 1e-9 and abs(stats.near_deaths - 0.3) < 1e-9
+    
+    # Breezing through pushes the bias up; scraping by pushes it down
+    easy, hard = PlayerStats(), PlayerStats()
+    for _ in range(5):
+        fight(easy, [1, 0, 1])
+        fight(hard, [15, 20], potions=2, end_hp=3)
+    assert easy.difficulty() > 0.5 and hard.difficulty() < -0.5
+    assert -1 <= hard.difficulty() <= easy.difficulty() <= 1
+    
+    # Real fights feed the stats through a sink; the state stays a few slots
+    stats = PlayerStats()
+    for seed in range(3):
+        player = Character("Tracked", RACES['human'], CLASSES['warrior'])
+        Combat(player, [create_enemy('demobat')], rng=RNGStream(seed), policy=AttackPolicy(),
+               sink=stats.watch(player)).run_combat()
+    assert stats.fights == 3 and stats.damage_share >= 0 and not hasattr(stats, '__dict__')
+    
+    # The bias moves encounters a level and leans within calibrated cells
+    assert {e.level for e in generate_random_encounter(3, rng=RNGStream(1), bias=1)} == {4}
+    assert {e.level for e in generate_random_encounter(3, rng=RNGStream(1), bias=-1)} == {2}
+    table = EncounterTable({'version': 1, 'target': 0.8, 'levels': [1, 2], 'gear': [0, 0], 'classes': {
+        'Warrior': [[[['demobat', 1, 1, 90], ['demodog', 1, 1, 70]]],
+                    [[['soldier', 1, 2, 80]]]]}})
+    picks = {bias: [generate_random_encounter(1, 0, RNGStream(seed), 'Warrior', table, bias)[0].name
+                    for seed in range(200)] for bias in (-0.4, 0, 0.4)}
+    assert picks[0.4].count('Demodog') > picks[0].count('Demodog') > picks[-0.4].count('Demodog')
+    assert generate_random_encounter(1, 0, RNGStream(0), 'Warrior', table, bias=0.9)[0].name == 'Russian Soldier'
+    
+    print("✓ Adaptive difficulty tests passed!")
+
+def test_duel_solver():
+    """Test the exact 1-vs-1 combat solver."""
+    print("\nTesting duel solver...")
+    
+    # Ties go to the player
+    assert initiative_chance(0, 0) == 210 / 400
+    assert initiative_chance(100, 0) == 1.0
+    
+    # An enemy that cannot hurt back dies to the first hit that isn't a natural 1
+    outcome = duel_outcome(10, 10, 0, 100, '1d6', 100, 1, -100, -100, '1d4', 0)
+    assert abs(outcome.win - 1) < 1e-12
+    assert abs(outcome.rounds - 20 / 19) < 1e-12
+    
+    # Below the flee threshold the player always escapes on their turn
+    outcome = duel_outcome(5, 10, 0, 10, '1d6', 100, 20, 0, 10, '1d6', 0, flee_below=0.6)
+    assert outcome.flee == 1.0 and outcome.rounds == 1.0
+    
+    # Neither side can ever deal damage
+    try:
+        duel_outcome(10, 10, -100, 10, '1d4', 0, 10, -100, 10, '1d4', 0)
+        assert False, "Should reject an endless fight"
+    except ValueError:
+        pass
+    
+    # Probabilities add up and agree with simulated fights
+    player = Character("Test Warrior", RACES['human'], CLASSES['warrior'])
+    player.equipped_weapon = WEAPONS['longsword'].to_dict()
+    enemy = create_enemy('demobat', level=1)
+    for policy in (None, AttackPolicy(heal_below=0.5, flee_below=0.2)):
+        outcome = solve_duel(player, enemy, policy)
+        assert abs(outcome.win + outcome.lose + outcome.flee - 1) < 1e-9
+        assert outcome.rounds >= 1
+    
+    exact = solve_duel(player, enemy)
+    simulated = FightBatch.from_fights([(player, enemy)] * 20000).resolve(RNGStream(8))
+    assert abs(sum(simulated.won) / 20000 - exact.win) < 0.02
+    assert abs(sum(simulated.rounds) / 20000 - exact.rounds) < 0.2
+    assert solve_duel(player, enemy) is exact  # Cached by stat tuple
+    
+    print("✓ Duel solver tests passed!")
+
+def test_enemy_ai():
+    """Test the expectimax enemy policy."""
+    print("\nTesting enemy AI...")
+    
+    # Two copies of the damage dice double the average roll
+    single = attack_distribution(100, 0, '1d6', 0)
+    double = attack_distribution(100, 0, '1d6', 0, copies=2)
+    assert abs(double.mean - 2 * single.mean) < 0.2
+    
+    player = Character("Test Warrior", RACES['human'], CLASSES['warrior'])
+    player.equipped_weapon = WEAPONS['longsword'].to_dict()
+    enemy = create_enemy('demogorgon', level=1)
+    combat = Combat(player, [enemy], rng=RNGStream(4), policy=AttackPolicy(), sink=NULL_SINK)
+    
+    # No time at all: fall back to a plain attack
+    hurried = ExpectimaxPolicy(budget=0)
+    assert hurried.choose_action(combat, enemy) == 'attack'
+    assert hurried.last_depth == 0
+    
+    ai = ExpectimaxPolicy(max_depth=2, budget=10)
+    assert ai.choose_action(combat, enemy) in ENEMY_ACTIONS
+    assert ai.last_depth == 2
+    entries = len(ai.table)
+    ai.choose_action(combat, enemy)
+    assert len(ai.table) == entries  # Same position: answered from the table
+    
+    # A whole fight with the AI runs to a result and logs any heavy blows
+    combat = Combat(player, [enemy], rng=RNGStream(4), policy=AttackPolicy(), sink=NULL_SINK,
+                    enemy_policy=ExpectimaxPolicy(budget=10, actions=['heavy']))
+    assert combat.run_combat() in ('victory', 'defeat')
+    assert any(e.type == 'heavy' for e in combat.combat_log)
+    assert "winds up a heavy blow" in combat.get_combat_log()
+    
+    print("✓ Enemy AI tests passed!")
+
+def test_auto_battle():
+    """Test the auto-battle player policy."""
+    print("\nTesting auto-battle...")
+    
+    # The turn-order tables average back to duel_outcome
+    first, _ = duel_tables(10, 0, 10, '1d6', 8, 0, 10, '1d6', player_first=True)
+    second, _ = duel_tables(10, 0, 10, '1d6', 8, 0, 10, '1d6', player_first=False)
+    outcome = duel_outcome(10, 10, 0, 10, '1d6', 0, 8, 0, 10, '1d6', 0)
+    chance = initiative_chance(0, 0)
+    assert abs(chance * first[0][10][8][0] + (1 - chance) * second[0][10][8][0] - outcome.win) < 1e-12
+    
+    def fight(enemy_names, policy, seed):
+        player = Character("Test Warrior", RACES['human'], CLASSES['warrior'])
+        player.equipped_weapon = WEAPONS['longsword'].to_dict()
+        enemies = [create_enemy(name, level=1) for name in enemy_names]
+        combat = Combat(player, enemies, rng=RNGStream(seed), policy=policy, sink=NULL_SINK)
+        return combat, combat.run_combat()
+    
+    # A hopeless fight: escaping beats dying
+    auto = AutoBattlePolicy(budget=10)
+    _, result = fight(['demogorgon'], auto, 3)
+    assert result == 'fled'
+    
+    # An easy fight is fought out
+    _, result = fight(['demobat'], AutoBattlePolicy(budget=10), 3)
+    assert result == 'victory'
+    
+    # Several enemies: rollouts, kept apart from the fight's own stream
+    auto = AutoBattlePolicy(budget=10, rollouts=20, rng=RNGStream(5))
+    combat, result = fight(['demobat', 'demobat'], auto, 3)
+    assert result in ('victory', 'defeat', 'fled')
+    
+    # No time at all: plain attacking
+    combat, result = fight(['demobat'], AutoBattlePolicy(budget=0), 3)
+    _, plain = fight(['demobat'], AttackPolicy(), 3)
+    assert result == plain
+    
+    # Rollouts carry status effects over with the rounds they have left
+    player = Character("Test Warrior", RACES['human'], CLASSES['warrior'])
+    enemy = create_enemy('demogorgon', level=1)
+    combat = Combat(player, [enemy], rng=RNGStream(3), sink=NULL_SINK)
+    combat.add_effect(enemy, 'stun', 1)
+    combat.add_effect(enemy, 'poison', 2, 3)
+    rollout = AutoBattlePolicy()._rollout_combat(combat, 'attack', RNGStream(5))
+    copied = rollout.enemies[0]
+    assert set(copied.status_effects) == {'stun', 'poison'} and set(enemy.status_effects) == {'stun', 'poison'}
+    rollout.start_combat()
+    rollout.start_round()
+    assert copied.current_hp == copied.max_hp - 3
+    rollout.start_round()
+    rollout.start_round()
+    assert copied.status_effects == {}
+    assert copied.current_hp == copied.max_hp - 6
+    
+    # A duel too big to solve in one decision stays near the budget
+    player = Character("Test Warrior", RACES['human'], CLASSES['warrior'])
+    player.max_hp = player.current_hp = 300
+    enemy = create_enemy('demogorgon', level=1)
+    enemy.max_hp = enemy.current_hp = 300
+    auto = AutoBattlePolicy(rng=RNGStream(5))
+    combat = Combat(player, [enemy], rng=RNGStream(3), policy=auto, sink=NULL_SINK)
+    start = time.perf_counter()
+    assert auto.choose_action(combat) in ('attack', 'item', 'flee')
+    assert time.perf_counter() - start < auto.budget * 2
+    
+    print("✓ Auto-battle tests passed!")
+
+def test_status_effects():
+    """Test status effects and their timer heap."""
+    print("\nTesting status effects...")
+    
+    enemy = create_enemy('demobat', level=1)
+    timers = EffectTimers()
+    timers.apply(enemy, 'poison', 3, 2, 0)
+    timers.apply(enemy, 'stun', 1, 0, 2)
+    fired = {r: sorted((effect.name, ended) for _, effect, ended in timers.due(r)) for r in range(1, 6)}
+    assert fired == {1: [('poison', False)], 2: [('poison', False)], 3: [('poison', False)],
+                     4: [('poison', True), ('stun', True)], 5: []}
+    assert enemy.status_effects == {}
+    
+    # Re-applying replaces the effect; its old heap entry never fires
+    timers.apply(enemy, 'poison', 5, 1, 5)
+    timers.apply(enemy, 'poison', 1, 1, 5)
+    assert len(list(timers.due(6))) == 1
+    
+    # Long-lasting quiet effects cost nothing until they wear off
+    timers = EffectTimers()
+    crowd = [create_enemy('demobat', level=1) for _ in range(500)]
+    for target in crowd:
+        timers.apply(target, 'stun', 100, 0, 6)
+    assert list(timers.due(7)) == []
+    timers.clear()
+    assert all(not target.status_effects for target in crowd)
+    
+    try:
+        timers.apply(enemy, 'petrify', 1, 0, 0)
+        assert False, "Should reject unknown effects"
+    except ValueError:
+        pass
+    
+    # Vine creatures poison on a damaging hit; effects end with the fight
+    player = Character("Test Warrior", RACES['human'], CLASSES['warrior'])
+    player.current_hp = player.max_hp = 500
+    combat = Combat(player, [create_enemy('vine', level=1)], rng=RNGStream(2), policy=AttackPolicy(),
+                    sink=NULL_SINK, log_size=None)
+    combat.run_combat()
+    types = [event.type for event in combat.combat_log]
+    assert 'effect' in types and 'effect_damage' in types
+    assert player.status_effects == {}
+    
+    # Items cure, apply and inflict effects
+    player = Character("Test Warrior", RACES['human'], CLASSES['warrior'])
+    enemies = [create_enemy('demobat', level=1), create_enemy('demobat', level=1)]
+    combat = Combat(player, enemies, rng=RNGStream(2), policy=AttackPolicy(), sink=NULL_SINK)
+    combat.start_combat()
+    combat.add_effect(player, 'poison', 3, 1)
+    antidote = CONSUMABLES['antidote'].to_dict()
+    player.add_item(antidote)
+    assert antidote in combat.usable_items() and antidote not in combat.healing_items()
+    combat.player_use_item(antidote)
+    assert 'poison' not in player.status_effects and antidote not in player.inventory
+    
+    combat.player_use_item(CONSUMABLES['flash_bang'].to_dict())
+    assert all('stun' in e.status_effects for e in enemies)
+    hp = player.current_hp
+    combat.enemy_turn(enemies[0])
+    assert player.current_hp == hp and combat.combat_log[-1].type == 'stunned'
+    
+    player.current_hp = 1
+    combat.player_use_item(CONSUMABLES['regeneration_tonic'].to_dict())
+    combat.start_round()
+    assert player.current_hp == 4
+    assert "regenerates 3 HP" in combat.get_combat_log()
+    
+    # Demogorgons regenerate in every fight
+    creature = Character("Test Creature", RACES['demogorgon'], CLASSES['creature'])
+    creature.current_hp = 10
+    combat = Combat(creature, [create_enemy('demobat', level=1)], rng=RNGStream(2), policy=AttackPolicy(),
+                    sink=NULL_SINK)
+    combat.start_combat()
+    assert creature.status_effects['regeneration'].ends is None
+    combat.start_round()
+    assert creature.current_hp == 12
+    
+    print("✓ Status effect tests passed!")
+
+def test_traits():
+    """Test race, class and item traits and their compiled hooks."""
+    print("\nTesting traits...")
+    
+    # No traits: the shared empty hooks
+    assert compile_hooks(()) is NO_HOOKS
+    warrior = Character("Test Warrior", RACES['human'], CLASSES['warrior'])
+    assert warrior.hooks is NO_HOOKS
+    assert create_enemy('demobat', level=1).hooks is NO_HOOKS
+    
+    halfling = Character("Test Halfling", RACES['halfling'], CLASSES['rogue'])
+    assert halfling.hooks.on_attack_roll == (TRAITS['lucky'].hooks['on_attack_roll'],)
+    assert halfling.hooks.on_damage == (TRAITS['sneak_attack'].hooks['on_damage'],)
+    assert halfling.hooks.on_turn_start == ()
+    
+    for bad in (lambda: compile_hooks(['flight']), lambda: register_trait('x', 'X', 'x', on_sneeze=print)):
+        try:
+            bad()
+            assert False, "Should reject unknown traits and events"
+        except ValueError:
+            pass
+    
+    # Equipment changes recompile the hooks
+    warrior.equipped_weapon = WEAPONS['nail_bat'].to_dict()
+    assert warrior.hooks.on_damage == (TRAITS['brutal'].hooks['on_damage'],)
+    warrior.equipped_weapon = WEAPONS['longsword'].to_dict()
+    assert warrior.hooks is NO_HOOKS
+    
+    enemy = create_enemy('demobat', level=1)
+    combat = Combat(halfling, [enemy], rng=RNGStream(6), policy=AttackPolicy(), sink=NULL_SINK)
+    
+    # Lucky rerolls natural 1s only
+    lucky = TRAITS['lucky'].hooks['on_attack_roll']
+    assert lucky(combat, halfling, 7) == 7
+    assert 1 <= lucky(combat, halfling, 1) <= 20
+    assert combat.combat_log[-1].type == 'trait'
+    
+    # Sneak attack only against an unhurt enemy
+    sneak = TRAITS['sneak_attack'].hooks['on_damage']
+    assert 5 <= sneak(combat, halfling, enemy, 4) <= 10
+    enemy.take_damage(1)
+    assert sneak(combat, halfling, enemy, 4) == 4
+    
+    # Keen senses: initiative with advantage averages about 13.8
+    elf = Character("Test Elf", RACES['elf'], CLASSES['rogue'])
+    rolls = [combat.roll_initiative(elf) - elf.get_modifier('dexterity') for _ in range(2000)]
+    assert 13 < sum(rolls) / len(rolls) < 14.6
+    
+    # Healing touch fires as the cleric's turn starts
+    cleric = Character("Test Cleric", RACES['human'], CLASSES['cleric'])
+    cleric.current_hp = 1
+    combat = Combat(cleric, [create_enemy('demobat', level=1)], rng=RNGStream(6), policy=AttackPolicy(),
+                    sink=NULL_SINK)
+    combat.start_combat()
+    combat.player_turn()
+    assert cleric.current_hp == 2
+    assert any(e.type == 'effect_heal' and e.target == 'Healing Touch' for e in combat.combat_log)
+    
+    print("✓ Trait tests passed!")
+
+def test_replays():
+    """Test recording, replaying and verifying fights."""
+    print("\nTesting replays...")
+    
+    def recorded_fight(seed):
+        player = Character("Test Halfling", RACES['halfling'], CLASSES['rogue'])
+        player.equip_starting_weapon()
+        player.max_hp = player.current_hp = 40
+        enemies = [create_enemy('vine', level=1), create_enemy('demobat', level=1)]
+        combat = Combat(player, enemies, rng=RNGStream(seed), policy=AttackPolicy(heal_below=0.5),
+                        sink=NULL_SINK, log_size=None, record=True)
+        combat.run_combat()
+        return combat
+    
+    combat = recorded_fight(12)
+    replay = combat.replay()
+    data = replay.to_bytes()
+    assert Replay.from_bytes(data) == replay
+    # A few bytes per turn on top of the fixed header
+    turns = sum(1 for e in combat.combat_log if e.type == 'turn')
+    assert len(replay.decisions) <= 2 * turns
+    
+    # Re-running gives the same fight, event for event
+    again, checksum = replay_combat(data)
+    assert checksum == replay.checksum
+    assert list(again.combat_log) == list(combat.combat_log)
+    assert verify_replay(data)
+    
+    # Fast-forward: stop as turn 3 starts
+    paused, _ = replay_combat(replay, stop_at_turn=3)
+    assert paused.result is None
+    assert sum(1 for e in paused.combat_log if e.type == 'turn') == 3
+    assert paused.combat_log[-1].type == 'turn'
+    
+    # Bulk verification flags replays that no longer match
+    replays = [recorded_fight(seed).replay() for seed in range(20)]
+    replays[4] = replays[4]._replace(checksum=replays[4].checksum ^ 1)
+    replays[7] = replays[7]._replace(decisions=b'')
+    assert verify_replays(replays) == [4, 7]
+    
+    # A corrupt result byte is a ReplayError, and just a failed check in bulk
+    data = replays[0].to_bytes()
+    corrupt = bytearray(data)
+    corrupt[-FOOTER.size] = 0xFF
+    try:
+        Replay.from_bytes(bytes(corrupt))
+        assert False, "Should reject an unknown result"
+    except ReplayError:
+        pass
+    assert verify_replays([data, bytes(corrupt)]) == [1]
+    
+    # A snapshot the current rules can't rebuild is a failed check too
+    setup = json.loads(json.dumps(replays[0].setup))
+    setup['player']['race'] = 'atlantean'
+    assert verify_replays([replays[0], replays[0]._replace(setup=setup)]) == [1]
+    try:
+        replay_combat(replays[0]._replace(setup=setup))
+        assert False, "Should reject an unknown race"
+    except ReplayError:
+        pass
+    
+    try:
+        Replay.from_bytes(b'not a replay')
+        assert False, "Should reject garbage"
+    except ReplayError:
+        pass
+    try:
+        Combat(Character("Test", RACES['human'], CLASSES['warrior']), [], sink=NULL_SINK).replay()
+        assert False, "Should need record=True"
+    except ValueError:
+        pass
+    
+    print("✓ Replay tests passed!")
+
+def test_combat_log():
+    """Test structured combat events and the bounded log."""
+    print("\nTesting combat log...")
+    
+    event = CombatEvent('hit', 'Hero', 'Demobat', (15, 3, 14), 7)
+    assert render_event(event) == ["Hero attacks Demobat!", "  Attack roll: 15 + 3 = 18 vs AC 14", "  Hit! 7 damage!"]
+    assert render_event(CombatEvent('turn', 'Demobat')) == ["\nDemobat's turn!"]
+    
+    def fight(log_size):
+        player = Character("Test Warrior", RACES['human'], CLASSES['warrior'])
+        enemies = [create_enemy('demogorgon', level=1)]
+        combat = Combat(player, enemies, rng=RNGStream(21), policy=AttackPolicy(),
+                        sink=NULL_SINK, log_size=log_size)
+        reports = list(combat.rounds())
+        return combat, reports
+    
+    full, full_reports = fight(None)
+    assert full.combat_log[0].type == 'begin'
+    assert full.combat_log[-1].type == full.result
+    assert "COMBAT BEGINS!" in full.get_combat_log()
+    attacks = [e for e in full.combat_log if e.type in ('hit', 'critical_hit')]
+    assert all(e.damage is not None and len(e.rolls) == 3 for e in attacks)
+    
+    # A small ring buffer keeps only the newest events
+    short, short_reports = fight(5)
+    assert len(short.combat_log) == 5
+    assert list(short.combat_log) == list(full.combat_log)[-5:]
+    assert full.get_combat_log().endswith(short.get_combat_log())
+    assert [r.events for r in short_reports][-1] == [r.events for r in full_reports][-1][-5:]
+    
+    print("✓ Combat log tests passed!")
+
+def test_battle():
+    """Test multi-combatant battles and the turn scheduler."""
+    print("\nTesting battles...")
+    
+    # Highest initiative first; ties keep the order added
+    scheduler = TurnScheduler()
+    for key, initiative in enumerate([12, 18, 12, 5]):
+        scheduler.add(key, initiative)
+    scheduler.set_initiative(3, 20)
+    scheduler.remove(1)
+    assert [scheduler.pop()[1] for _ in range(3)] == [3, 0, 2]
+    assert scheduler.next_round() is None
+    scheduler.add(0, 10, round_number=2)
+    scheduler.add(2, 10, round_number=3)
+    assert scheduler.next_round() == 2
+    
+    def party(count, seed):
+        players = generate_characters(count, mix=[('human', 'warrior')], rng=RNGStream(seed))
+        for player in players:
+            player.equip_starting_weapon()
+        return players
+    
+    players = party(3, 1)
+    enemies = [create_enemy('demobat', level=1) for _ in range(4)]
+    battle = Battle(players, enemies, rng=RNGStream(2), policy=AttackPolicy(), sink=NULL_SINK)
+    reports = list(battle.rounds())
+    assert battle.result in ('victory', 'defeat')
+    assert len(reports[-1].player_hp) == 3
+    assert len(battle.standing_enemies) == sum(e.is_alive() for e in enemies)
+    assert len(battle.standing_players) == sum(p.is_alive() for p in players)
+    turns = [e.actor for e in battle.combat_log if e.type == 'turn']
+    assert set(turns) <= {c.name for c in players + enemies}
+    
+    # Weakest-target picking matches a linear scan
+    battle = Battle(party(2, 3), [create_enemy('demobat', level=1) for _ in range(5)],
+                    rng=RNGStream(4), policy=AttackPolicy(), sink=NULL_SINK)
+    battle.enemies[2].take_damage(10)
+    battle.hp_changed(battle.enemies[2])
+    assert battle.weakest_enemy() is battle.enemies[2]
+    battle.enemies[4].take_damage(12)
+    battle.hp_changed(battle.enemies[4])
+    battle.enemies[2].take_damage(100)
+    battle.defeated(battle.enemies[2])
+    assert battle.weakest_enemy() is min(battle.living_enemies(), key=lambda e: e.current_hp)
+    
+    # Poison and regeneration re-file the enemies they hit
+    battle = Battle(party(2, 3), [create_enemy('demobat', level=1) for _ in range(5)],
+                    rng=RNGStream(4), policy=AttackPolicy(), sink=NULL_SINK)
+    healer, poisoned = battle.enemies[0], battle.enemies[3]
+    healer.take_damage(healer.max_hp - 2)
+    battle.hp_changed(healer)
+    battle.add_effect(healer, 'regeneration', None, 10)
+    battle.add_effect(poisoned, 'poison', 3, poisoned.max_hp - 1)
+    battle.start_round()
+    assert poisoned.current_hp == 1 and healer.current_hp > 2
+    assert battle.weakest_enemy() is poisoned
+    
+    # Everyone running away ends the battle
+    battle = Battle(party(2, 5), [create_enemy('demogorgon', level=1)], rng=RNGStream(6),
+                    policy=ScriptedPolicy(['flee'] * 100), sink=NULL_SINK)
+    assert battle.run_combat() in ('fled', 'defeat')
+    
+    # Raid-sized battles finish quickly
+    battle = Battle(party(300, 7), [create_enemy('demodog', level=1) for _ in range(300)],
+                    rng=RNGStream(8), policy=AttackPolicy(), sink=NULL_SINK)
+    assert battle.run_combat() in ('victory', 'defeat')
+    
+    print("✓ Battle tests passed!")
+
 def test_level_up():
     """Test leveling system."""
     print("\nTesting level up system...")
@@ -189,10 +1375,34 @@ def run_all_tests():
     
     try:
         test_dice_rolling()
+        test_dice_expressions()
+        test_bulk_rolling()
+        test_probability_engine()
+        test_rng_streams()
+        test_secure_rng()
+        test_variance_reduction()
+        test_weighted_tables()
+        test_roll_telemetry()
         test_character_creation()
+        test_bulk_character_generation()
         test_enemies()
         test_items()
         test_combat_mechanics()
+        test_headless_combat()
+        test_combat_log()
+        test_battle()
+        test_simulator()
+        test_batch_combat()
+        test_cluster()
+        test_result_cache()
+        test_encounter_calibration()
+        test_adaptive_difficulty()
+        test_duel_solver()
+        test_enemy_ai()
+        test_auto_battle()
+        test_status_effects()
+        test_traits()
+        test_replays()
         test_level_up()
         
         print("\n" + "="*50)
@@ -0,0 +1,86 @@
+"""
+Traits for the D&D-style game: race, class and item abilities that hook
+into combat events.
+
+A trait maps events in HOOK_EVENTS to functions. Races, classes and item
+dicts list trait names; compile_hooks() turns a character's list into one
+Hooks tuple holding, for each event, a flat tuple of functions to call in
+order. Combat just loops over those tuples, so a character with no traits
+shares NO_HOOKS and pays nothing but an empty loop.
+"""
+
+from collections import namedtuple
+
+from dice import DiceRoller
+
+# Events traits can hook. Each hook is called as
+#   on_initiative(combat, combatant, roll) -> new d20 roll
+#   on_attack_roll(combat, attacker, roll) -> new d20 roll
+#   on_damage(combat, attacker, target, damage) -> new damage
+#   on_turn_start(combat, combatant) -> None
+HOOK_EVENTS = ('on_initiative', 'on_attack_roll', 'on_damage', 'on_turn_start')
+
+# Per-event tuples of hook functions for one combatant
+Hooks = namedtuple('Hooks', HOOK_EVENTS)
+
+# What every combatant without traits uses
+NO_HOOKS = Hooks(*[()] * len(HOOK_EVENTS))
+
+# A named ability: description for display, {event: function} for combat
+Trait = namedtuple('Trait', ['name', 'description', 'hooks'])
+
+TRAITS = {}
+
+def register_trait(key, name, description, **hooks):
+    """Add a trait to TRAITS under key; hooks are keyword arguments named after HOOK_EVENTS."""
+    unknown = set(hooks) - set(HOOK_EVENTS)
+    if unknown:
+        raise ValueError(f"Unknown trait events: {', '.join(sorted(unknown))}")
+    TRAITS[key] = Trait(name, description, hooks)
+    return TRAITS[key]
+
+def compile_hooks(trait_keys):
+    """Flatten the named traits into one Hooks tuple (NO_HOOKS for none)."""
+    if not trait_keys:
+        return NO_HOOKS
+    traits = []
+    for key in trait_keys:
+        if key not in TRAITS:
+            raise ValueError(f"Unknown trait: {key}")
+        traits.append(TRAITS[key])
+    return Hooks(*[tuple(trait.hooks[event] for trait in traits if event in trait.hooks)
+                   for event in HOOK_EVENTS])
+
+def _lucky(combat, attacker, roll):
+    if roll != 1:
+        return roll
+    combat.log('trait', attacker.name, 'Lucky')
+    return DiceRoller.roll_d20(combat.rng)
+
+def _keen_senses(combat, combatant, roll):
+    # Advantage: roll again and keep the better die
+    return max(roll, DiceRoller.roll_d20(combat.rng))
+
+def _sneak_attack(combat, attacker, target, damage):
+    # Strikes an unhurt foe before it has its guard up
+    if target.current_hp < target.max_hp:
+        return damage
+    combat.log('trait', attacker.name, 'Sneak Attack')
+    return damage + DiceRoller.roll_d6(combat.rng)
+
+def _healing_touch(combat, combatant):
+    if combatant.current_hp * 2 < combatant.max_hp:
+        healed = combatant.heal(1)
+        if healed:
+            combat.log('effect_heal', combatant.name, 'Healing Touch', damage=healed)
+            combat.hp_changed(combatant)
+
+def _brutal(combat, attacker, target, damage):
+    return damage + 1 if damage > 0 else damage
+
+register_trait('lucky', 'Lucky', 'Reroll a natural 1 on an attack roll', on_attack_roll=_lucky)
+register_trait('keen_senses', 'Keen Senses', 'Roll initiative with advantage', on_initiative=_keen_senses)
+register_trait('sneak_attack', 'Sneak Attack', '+1d6 damage against an unhurt enemy', on_damage=_sneak_attack)
+register_trait('healing_touch', 'Healing Touch', 'Recover 1 HP at the start of each turn below half HP',
+               on_turn_start=_healing_touch)
+register_trait('brutal', 'Brutal', '+1 damage on every hit', on_damage=_brutal)
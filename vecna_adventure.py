@@ -1,16 +1,20 @@
 """Vecna Adventure Mode - Play as the villain."""
 
-import random
 from dice import DiceRoller
+from rng import spawn_rng
 from enemies import generate_random_encounter, create_enemy
-from combat import Combat
+from combat import Combat, PacedPrinter
+from enemy_ai import ExpectimaxPolicy
 from items import Shop
+from player_stats import PlayerStats
 
 class VecnaAdventure:
     """Play as Vecna trying to conquer both worlds."""
     
-    def __init__(self, player):
+    def __init__(self, player, rng=None):
         self.player = player
+        # Independent random stream for this session
+        self.rng = rng if rng is not None else spawn_rng()
         self.current_location = 'dark_citadel'
         self.missions_completed = 0
         self.power_level = 0  # Power level: 0-100
@@ -19,6 +23,8 @@ class VecnaAdventure:
         self.mind_flayers_recruited = 0
         self.final_conquest_available = False
         self.shop = Shop()
+        # How the player's fights have gone, to adapt encounter difficulty
+        self.stats = PlayerStats()
     
     def get_status(self):
         """Get current game status."""
@@ -90,10 +96,14 @@ class VecnaAdventure:
         defenders = []
         if self.gates_opened > 2:
             # Stronger resistance
-            defenders = generate_random_encounter(self.player.level + 1, self.player.get_gear_level())
+            defenders = generate_random_encounter(self.player.level + 1, self.player.get_gear_level(), rng=self.rng,
+                                                  char_class=self.player.char_class.name,
+                                                  bias=self.stats.difficulty())
             print("\nHawkins fighters try to stop you!")
         else:
-            defenders = generate_random_encounter(max(1, self.player.level - 1), 0)
+            defenders = generate_random_encounter(max(1, self.player.level - 1), 0, rng=self.rng,
+                                                  char_class=self.player.char_class.name,
+                                                  bias=self.stats.difficulty())
             print("\nSome townspeople try to interfere!")
         
         for enemy in defenders:
@@ -102,7 +112,7 @@ class VecnaAdventure:
         
         input("Press Enter to begin combat...")
         
-        combat = Combat(self.player, defenders)
+        combat = Combat(self.player, defenders, rng=self.rng, sink=self.stats.watch(self.player, PacedPrinter()))
         result = combat.run_combat()
         
         if result == 'victory':
@@ -138,7 +148,9 @@ class VecnaAdventure:
         # Multiple waves of combat
         for wave in range(2):
             print(f"\n--- Wave {wave + 1} ---")
-            enemies = generate_random_encounter(self.player.level, self.player.get_gear_level())
+            enemies = generate_random_encounter(self.player.level, self.player.get_gear_level(), rng=self.rng,
+                                                char_class=self.player.char_class.name,
+                                                bias=self.stats.difficulty())
             
             # These are actually defenders
             print("\nHawkins defenders appear!")
@@ -148,7 +160,7 @@ class VecnaAdventure:
             
             input("Press Enter to begin combat...")
             
-            combat = Combat(self.player, enemies)
+            combat = Combat(self.player, enemies, rng=self.rng, sink=self.stats.watch(self.player, PacedPrinter()))
             result = combat.run_combat()
             
             if result != 'victory':
@@ -186,11 +198,11 @@ class VecnaAdventure:
         
         input("\nPress Enter to perform the ritual...")
         
-        success_roll = random.randint(1, 100)
+        success_roll = self.rng.randint(1, 100)
         intelligence_bonus = self.player.get_modifier('intelligence') * 5
         
         if success_roll + intelligence_bonus > 40:
-            corruption = random.randint(10, 20)
+            corruption = self.rng.randint(10, 20)
             self.hawkins_controlled += corruption
             self.power_level += 10
             print(f"\n✓ Success! You corrupted {corruption}% of the town!")
@@ -221,11 +233,11 @@ class VecnaAdventure:
         
         input("Press Enter to begin combat...")
         
-        combat = Combat(self.player, [flayer])
+        combat = Combat(self.player, [flayer], rng=self.rng, sink=self.stats.watch(self.player, PacedPrinter()))
         result = combat.run_combat()
         
         if result == 'victory':
-            recruited = random.randint(1, 3)
+            recruited = self.rng.randint(1, 3)
             self.mind_flayers_recruited += recruited
             self.power_level += 12
             print(f"\n✓ You recruited {recruited} mind flayer(s)!")
@@ -245,19 +257,19 @@ class VecnaAdventure:
         print("="*50)
         print("\nYou meditate on dark energies and hone your powers...")
         
-        power_gain = random.randint(8, 15)
+        power_gain = self.rng.randint(8, 15)
         self.power_level += power_gain
         
         # Heal
-        healing = random.randint(15, 30)
+        healing = self.rng.randint(15, 30)
         self.player.heal(healing)
         
         print(f"\nPower gained: +{power_gain} (Total: {self.power_level})")
         print(f"HP restored: +{healing}")
         
         # Small chance to gain gold
-        if random.randint(1, 100) <= 25:
-            gold = random.randint(30, 80)
+        if self.rng.randint(1, 100) <= 25:
+            gold = self.rng.randint(30, 80)
             self.player.gold += gold
             print(f"\nYou found dark treasures worth {gold} gold!")
         
@@ -289,7 +301,8 @@ class VecnaAdventure:
         
         input("Press Enter to begin combat...")
         
-        combat = Combat(self.player, [eleven_boss])
+        combat = Combat(self.player, [eleven_boss], rng=self.rng, sink=self.stats.watch(self.player, PacedPrinter()),
+                        enemy_policy=ExpectimaxPolicy())
         result = combat.run_combat()
         
         if result == 'victory':
@@ -11,6 +11,10 @@ import os
 from character import Character, RACES, CLASSES, RACE_CLASS_MAPPING
 from adventure import Adventure, UpsideDownAdventure
 from vecna_adventure import VecnaAdventure
+from telemetry import TELEMETRY
+
+# /api/dice-fairness reports on every roll the server makes
+TELEMETRY.enabled = True
 
 app = Flask(__name__)
 app.secret_key = 'dnd_adventure_secret_key_' + os.urandom(16).hex()
@@ -75,6 +79,8 @@ def create_character():
     else:
         adventure = Adventure(character)
     
+    # Group this session's rolls for the dice fairness report
+    adventure.rng.label = request.sid if hasattr(request, 'sid') else session.get('session_id', 'default')
     set_game(adventure)
     
     return jsonify({
@@ -158,7 +164,9 @@ def start_encounter():
     
     try:
         from enemies import generate_random_encounter
-        enemies = generate_random_encounter(game.player.level, game.player.get_gear_level())
+        enemies = generate_random_encounter(game.player.level, game.player.get_gear_level(), rng=game.rng,
+                                            char_class=game.player.char_class.name,
+                                            bias=game.stats.difficulty())
         enemy = enemies[0]
         
         # Store enemy in game session for combat
@@ -205,12 +213,12 @@ def combat_action():
             # Roll attack
             from dice import DiceRoller
             roller = DiceRoller()
-            attack_roll = roller.roll_d20() + character.get_attack_bonus()
+            attack_roll = roller.roll_d20(game.rng) + character.get_attack_bonus()
             
             if attack_roll >= enemy.armor_class:
                 # Hit!
                 damage_dice = character.get_attack_damage()
-                damage = roller.roll_simple(damage_dice) + character.get_attack_bonus()
+                damage = roller.roll_simple(damage_dice, game.rng) + character.get_attack_bonus()
                 enemy.take_damage(damage)
                 message = f"You hit {enemy.name} for {damage} damage! ({enemy.current_hp}/{enemy.max_hp} HP left)"
                 
@@ -225,9 +233,9 @@ def combat_action():
                     message = f"Victory! {enemy.name} defeated! Gained {xp_gain} XP and {gold_gain} gold!"
                 else:
                     # Enemy attacks back
-                    enemy_attack = roller.roll_d20() + enemy.get_attack_bonus()
+                    enemy_attack = roller.roll_d20(game.rng) + enemy.get_attack_bonus()
                     if enemy_attack >= character.armor_class:
-                        enemy_damage = roller.roll_simple(enemy.get_attack_damage()) + enemy.get_attack_bonus()
+                        enemy_damage = roller.roll_simple(enemy.get_attack_damage(), game.rng) + enemy.get_attack_bonus()
                         character.take_damage(enemy_damage)
                         message += f"\n{enemy.name} hits you for {enemy_damage} damage! ({character.current_hp}/{character.max_hp} HP left)"
                     else:
@@ -238,9 +246,9 @@ def combat_action():
                 # Enemy attacks back
                 from dice import DiceRoller
                 roller = DiceRoller()
-                enemy_attack = roller.roll_d20() + enemy.get_attack_bonus()
+                enemy_attack = roller.roll_d20(game.rng) + enemy.get_attack_bonus()
                 if enemy_attack >= character.armor_class:
-                    enemy_damage = roller.roll_simple(enemy.get_attack_damage()) + enemy.get_attack_bonus()
+                    enemy_damage = roller.roll_simple(enemy.get_attack_damage(), game.rng) + enemy.get_attack_bonus()
                     character.take_damage(enemy_damage)
                     message += f"\n{enemy.name} hits you for {enemy_damage} damage! ({character.current_hp}/{character.max_hp} HP left)"
                 else:
@@ -251,9 +259,9 @@ def combat_action():
             # Enemy attacks with disadvantage (lower damage)
             from dice import DiceRoller
             roller = DiceRoller()
-            enemy_attack = roller.roll_d20() + enemy.get_attack_bonus() - 5
+            enemy_attack = roller.roll_d20(game.rng) + enemy.get_attack_bonus() - 5
             if enemy_attack >= character.armor_class:
-                enemy_damage = max(1, roller.roll_simple(enemy.get_attack_damage()) + enemy.get_attack_bonus() - 3)
+                enemy_damage = max(1, roller.roll_simple(enemy.get_attack_damage(), game.rng) + enemy.get_attack_bonus() - 3)
                 character.take_damage(enemy_damage)
                 message += f"\n{enemy.name} hits you for {enemy_damage} damage! ({character.current_hp}/{character.max_hp} HP left)"
             else:
@@ -263,6 +271,27 @@ def combat_action():
             message = f"You fled from {enemy.name}!"
             combat_over = True
         
+        elif action == 'auto':
+            # Resolve the whole encounter here instead of one request per action
+            from auto_battle import AutoBattlePolicy
+            from combat import Combat, NULL_SINK
+            combat = Combat(character, [enemy], rng=game.rng, policy=AutoBattlePolicy(),
+                            sink=game.stats.watch(character, NULL_SINK))
+            result = combat.run_combat()
+            message = combat.get_combat_log()
+            combat_over = True
+            
+            if result == 'victory':
+                victory = True
+                xp_gain = enemy.xp_value
+                gold_gain = enemy.gold_drop
+                character.add_experience(xp_gain)
+                character.gold += gold_gain
+                game.encounters_completed += 1
+                message += f"\nVictory! {enemy.name} defeated! Gained {xp_gain} XP and {gold_gain} gold!"
+            elif result == 'fled':
+                message += f"\nYou fled from {enemy.name}!"
+        
         elif action == 'useitem':
             # Use healing item if available
             healed = False
@@ -281,9 +310,9 @@ def combat_action():
                 # Enemy attacks back
                 from dice import DiceRoller
                 roller = DiceRoller()
-                enemy_attack = roller.roll_d20() + enemy.get_attack_bonus()
+                enemy_attack = roller.roll_d20(game.rng) + enemy.get_attack_bonus()
                 if enemy_attack >= character.armor_class:
-                    enemy_damage = roller.roll_simple(enemy.get_attack_damage()) + enemy.get_attack_bonus()
+                    enemy_damage = roller.roll_simple(enemy.get_attack_damage(), game.rng) + enemy.get_attack_bonus()
                     character.take_damage(enemy_damage)
                     message += f"\n{enemy.name} attacks for {enemy_damage} damage! ({character.current_hp}/{character.max_hp} HP left)"
         
@@ -393,6 +422,17 @@ def rest():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/dice-fairness', methods=['GET'])
+def dice_fairness():
+    """Report roll histograms and chi-square fairness scores."""
+    report = TELEMETRY.export()
+    game = get_game()
+    label = getattr(getattr(game, 'rng', None), 'label', None)
+    return jsonify({
+        'dice': report['dice'],
+        'session': report['sessions'].get(str(label), {}) if label is not None else {}
+    })
+
 @app.route('/api/new-game', methods=['POST'])
 def new_game():
     """Start a new game."""